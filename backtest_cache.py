@@ -0,0 +1,136 @@
+# backtest_cache.py
+import hashlib, json, os, shutil, threading, time
+from startup import lazy_import
+
+pd = lazy_import('pandas')
+pa = lazy_import('pyarrow')
+feather = lazy_import('pyarrow.feather')
+
+DEFAULT_CACHE_DIR = os.path.join('data', 'backtest_cache')
+
+_module_versions = {}
+
+
+def module_version(path):
+    """ Hash of a module's source, so editing the strategy (or the code it backtests with) invalidates its cached results. """
+    mtime = os.path.getmtime(path)
+    cached = _module_versions.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            cached = _module_versions[path] = (mtime, hashlib.sha256(f.read()).hexdigest()[:16])
+    return cached[1]
+
+
+def cache_key(bars, **inputs):
+    """ Content hash of the input bars (values and dates) and every other input of the backtest. """
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(bars, index=True).to_numpy().tobytes())
+    digest.update(",".join(map(str, bars.columns)).encode())
+    digest.update(json.dumps(inputs, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class BacktestCache:
+    """
+    Backtest results by content: the return series (<key>.arrow) and the rendered report
+    (<key>.html) of every distinct combination of input bars, parameters and module version.
+
+    index.json tracks each entry's size and last use. Once the entries exceed max_bytes, the
+    least recently used ones are deleted.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=256 * 2**20):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.index_path = os.path.join(root, 'index.json')
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(self.index_path) as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def returns_path(self, key):
+        return os.path.join(self.root, f"{key}.arrow")
+
+    def report_path(self, key):
+        return os.path.join(self.root, f"{key}.html")
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.index_path)
+
+    def get(self, key, report=True):
+        """ The cached return series (DataFrame indexed by date), or None. With report=True the report must be cached too. """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (report and not entry.get('report')) or not os.path.exists(self.returns_path(key)):
+                self.misses += 1
+                return None
+            entry['last_used'] = time.time()
+            self.hits += 1
+            self._save_index()
+        return feather.read_table(self.returns_path(key)).to_pandas().set_index('date')
+
+    def put(self, key, returns, report=None, **meta):
+        """ Store the return series and, if given, move the rendered report file into the cache. """
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.returns_path(key) + '.tmp'
+        feather.write_feather(pa.Table.from_pandas(returns.rename_axis('date').reset_index(), preserve_index=False), tmp_path)
+        os.replace(tmp_path, self.returns_path(key))
+        size = os.path.getsize(self.returns_path(key))
+        if report is not None:
+            shutil.move(report, self.report_path(key))
+            size += os.path.getsize(self.report_path(key))
+        with self.lock:
+            self.entries[key] = {'size': size, 'report': report is not None, 'created': time.time(),
+                                 'last_used': time.time(), **meta}
+            self._evict()
+            self._save_index()
+
+    def has_report(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            return bool(entry and entry.get('report')) and os.path.exists(self.report_path(key))
+
+    def add_report(self, key, report):
+        """ Move a report rendered later (see report_worker) into an existing entry. """
+        shutil.move(report, self.report_path(key))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            entry['size'] += os.path.getsize(self.report_path(key))
+            entry['report'] = True
+            entry['last_used'] = time.time()
+            self._evict()
+            self._save_index()
+
+    def copy_report(self, key, output):
+        """ Put the cached report where the caller expects it. """
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        shutil.copyfile(self.report_path(key), output)
+        return output
+
+    def _evict(self):
+        total = sum(entry['size'] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda k: self.entries[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            total -= self.entries.pop(key)['size']
+            for path in (self.returns_path(key), self.report_path(key)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    @property
+    def size(self):
+        return sum(entry['size'] for entry in self.entries.values())
+
+
+# Shared by the strategies' create_bt_summary and the report worker callbacks
+backtest_cache = BacktestCache()
@@ -0,0 +1,101 @@
+# backtest_engine.py
+from startup import lazy_import
+
+# Imported on first use, so strategies can import this module without slowing start-up
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+def monthly_moving_averages(monthly_close, trendfilter=10, structural=50):
+    """ 10M / 50M style moving averages over month-end closes (Series or DataFrame of closes). """
+    return (monthly_close.rolling(window=trendfilter).mean(),
+            monthly_close.rolling(window=structural).mean())
+
+
+def map_previous_month_end(daily_index, monthly):
+    """
+    Values of the previous calendar month end for every daily date.
+
+    This is an exact-key join on date - MonthEnd(1): a daily row gets NaN when that
+    month end is missing from monthly, as the per-row .at lookup did.
+    """
+    prev_month_end = daily_index - pd.offsets.MonthEnd(1)
+    mapped = monthly.reindex(prev_month_end)
+    mapped.index = daily_index
+    return mapped
+
+
+def _shift(a, periods):
+    """ np equivalent of pandas shift along axis 0 for float arrays. """
+    out = np.full(a.shape, np.nan)
+    if periods < len(a):
+        out[periods:] = a[:len(a) - periods]
+    return out
+
+
+def _ffill(a):
+    """ Forward-fill NaNs along axis 0, as pct_change pads missing closes. """
+    mask = np.isnan(a)
+    if not mask.any():
+        return a
+    rows = np.where(mask, 0, np.arange(len(a)).reshape((-1,) + (1,) * (a.ndim - 1)))
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return np.take_along_axis(a, rows, axis=0)
+
+
+def signals_and_returns(close, ma_trend, ma_struct=None, signal2=False):
+    """
+    Array version of the Strategy1 rules on warmed-up data (1D, or 2D with one column per symbol).
+
+    Returns (signal1, signal, strategy_returns, benchmark_returns), where signal is Signal2
+    if signal2 is set and Signal1 otherwise.
+    """
+    close = np.asarray(close, dtype=float)
+    ma_trend = np.asarray(ma_trend, dtype=float)
+    c1 = _shift(close, 1)
+
+    with np.errstate(invalid='ignore'):
+        # Bullish if the previous day's close was above the previous day's 10M MA
+        signal1 = (c1 > _shift(ma_trend, 1)).astype(np.int64)
+        if signal2:
+            # Re-enter on a crossover of the 50M MA from below, or stay in while Signal1 is bullish
+            ma_struct = np.asarray(ma_struct, dtype=float)
+            crossover = (c1 > _shift(ma_struct, 1)) & (_shift(close, 2) < _shift(ma_struct, 2))
+            signal = ((crossover & (signal1 == 0)) | (signal1 == 1)).astype(np.int64)
+        else:
+            signal = signal1
+
+        filled = _ffill(close)
+        benchmark = filled / _shift(filled, 1) - 1
+    benchmark = np.where(np.isnan(benchmark), 0.0, benchmark)
+    strategy = _shift(signal.astype(float), 1) * benchmark
+    return signal1, signal, strategy, benchmark
+
+
+def backtest_panel(closes, trendfilter=10, structural=50, signal2=False):
+    """
+    Backtest Strategy1 for every column of a daily close panel (index: dates, columns: symbols).
+
+    Monthly MAs use calendar month-end closes, as in the Yahoo Finance backtest. Each symbol
+    starts once its trendfilter MA is warmed up and ends with its last close; the symbols are
+    expected to share one trading calendar in between. Returns (strategy_returns, benchmark_returns)
+    as DataFrames shaped like closes, NaN before each symbol's start and after its end.
+    """
+    closes = closes.sort_index()
+    ma_trend, ma_struct = monthly_moving_averages(closes.resample('M').last(), trendfilter, structural)
+    ma_trend = map_previous_month_end(closes.index, ma_trend).to_numpy(dtype=float)
+    ma_struct = map_previous_month_end(closes.index, ma_struct).to_numpy(dtype=float)
+
+    close = closes.to_numpy(dtype=float)
+    _, _, strategy, benchmark = signals_and_returns(close, ma_trend, ma_struct, signal2)
+
+    # Rows before the MA is warmed up are dropped in the single-symbol backtest; mask them here
+    started = np.maximum.accumulate(~np.isnan(ma_trend), axis=0)
+    # ... and so are the rows after a symbol's last close (e.g. delisted)
+    started &= np.flip(np.maximum.accumulate(np.flip(~np.isnan(close), axis=0), axis=0), axis=0)
+    first = started & ~np.vstack([np.zeros((1,) + started.shape[1:], dtype=bool), started[:-1]])
+    benchmark = np.where(started, np.where(first, 0.0, benchmark), np.nan)
+    strategy = np.where(started & ~first, strategy, np.nan)
+
+    return (pd.DataFrame(strategy, index=closes.index, columns=closes.columns),
+            pd.DataFrame(benchmark, index=closes.index, columns=closes.columns))
@@ -0,0 +1,165 @@
+# batch_backtest.py
+import hashlib, importlib.util, json, math, multiprocessing, os, threading, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import metrics
+from price_store import get_store, IB_TRADES
+
+RESULTS_DIR = os.path.join('reports', 'batch')
+
+# Strategy1 needs more than its structural window (50 month ends by default, so 4+ years) of daily
+# bars per symbol. ib_trades holds the 30 years Strategy.fetch_data and the live bars download;
+# ib_adjusted only has the 1 year update_prices.py keeps, too short for any result.
+DEFAULT_STORE = IB_TRADES
+
+# Row statuses that are kept for a resumed run; errors are retried
+FINAL_STATUSES = ('ok', 'no data', 'too short')
+
+# Primary key of the backtests table: one row per strategy variant and symbol
+BACKTESTS_CONFLICT = 'strategy,symbol,signal2,params_hash'
+
+# Worker state, set once per process by _load_strategy
+_strategy_module = None
+
+
+def _load_strategy(strategy_file):
+    """ Pool initializer: load the strategy module once per worker. """
+    global _strategy_module
+    module_name = os.path.splitext(strategy_file)[0]
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join('strategies', strategy_file))
+    _strategy_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(_strategy_module)
+
+
+def _clean(value):
+    return None if isinstance(value, float) and not math.isfinite(value) else value
+
+
+def params_hash(params, signal2):
+    """ Short hash of the backtest inputs besides the bars, so other params or signal2 never share results. """
+    inputs = json.dumps({'params': params, 'signal2': bool(signal2)}, sort_keys=True, default=str)
+    return hashlib.sha256(inputs.encode()).hexdigest()[:12]
+
+
+def backtest_symbol(symbol, strategy_symbol, store_name, params, signal2):
+    """ Backtest one symbol from the local price store and return its summary row. """
+    row = {'strategy': strategy_symbol, 'symbol': symbol, 'signal2': bool(signal2),
+           'params_hash': params_hash(params, signal2), 'status': 'ok'}
+    try:
+        bars = get_store(store_name).read(symbol)
+        if bars is None or bars.empty:
+            row['status'] = 'no data'
+            return row
+        results = _strategy_module.run_backtest(bars, params, signal2) if params else \
+            _strategy_module.run_backtest(bars, signal2=signal2)
+        if results.empty:
+            row['status'] = 'too short'
+            return row
+        row.update({key: _clean(float(value)) for key, value in metrics.summary(results['Strategy_Returns']).items()})
+        row['start_date'] = results.index[0].strftime('%Y-%m-%d')
+        row['end_date'] = results.index[-1].strftime('%Y-%m-%d')
+    except Exception as e:
+        row['status'] = f"error: {e}"
+    return row
+
+
+def get_universe_symbols(client, strategy_symbol):
+    """ Symbols of the universe table whose strategies array contains strategy_symbol. """
+    rows = client.table("universe").select("symbol").contains("strategies", [strategy_symbol]).execute().data
+    return sorted({row['symbol'] for row in rows})
+
+
+def results_path(strategy_symbol, store_name, params=None, signal2=False):
+    return os.path.join(RESULTS_DIR, f"{strategy_symbol}_{store_name}_{params_hash(params, signal2)}.jsonl")
+
+
+def load_results(path):
+    """ Summary rows with a final status written by previous (possibly interrupted) runs, by symbol. """
+    results = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                    if row.get('status') in FINAL_STATUSES:
+                        results[row['symbol']] = row
+                except ValueError:
+                    pass  # a line cut short by a crash
+    except FileNotFoundError:
+        pass
+    return results
+
+
+def run_batch(client, strategy_file, strategy_symbol, params=None, signal2=False, store_name=DEFAULT_STORE,
+              symbols=None, processes=None, restart=False, writer=None, on_progress=None, stop_event=None):
+    """
+    Backtest a strategy module over every universe symbol tagged with strategy_symbol.
+
+    Each symbol runs in a worker process on bars from the local price store store_name (see
+    DEFAULT_STORE for the history it needs) and yields one summary row (CAGR, Sharpe, max
+    drawdown, exposure). Rows with a final status are appended to
+    reports/batch/<strategy>_<store>_<params_hash>.jsonl as they finish, so an interrupted run
+    with the same params and signal2 resumes with the symbols that are still missing or
+    failed with an error; restart=True starts over. Rows are also handed to writer (a supabase_writer.UpsertBuffer
+    for the backtests table, upserting on BACKTESTS_CONFLICT) if one is given.
+    on_progress(done, total, row, symbols_per_sec) is called after every symbol. Returns the new rows.
+    """
+    symbols = symbols if symbols is not None else get_universe_symbols(client, strategy_symbol)
+    path = results_path(strategy_symbol, store_name, params, signal2)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    if restart and os.path.exists(path):
+        os.remove(path)
+
+    done = load_results(path)
+    pending = [symbol for symbol in symbols if symbol not in done]
+    total, completed, rows = len(symbols), len(symbols) - len(pending), []
+    if not pending:
+        return rows
+
+    started = time.monotonic()
+    # Spawned workers don't inherit the UI's threads, curses state or IB connection
+    context = multiprocessing.get_context('spawn')
+    with open(path, 'a') as out, ProcessPoolExecutor(max_workers=processes or os.cpu_count(), mp_context=context,
+                                                     initializer=_load_strategy, initargs=(strategy_file,)) as pool:
+        futures = [pool.submit(backtest_symbol, symbol, strategy_symbol, store_name, params, signal2) for symbol in pending]
+        for future in as_completed(futures):
+            row = future.result()
+            if row['status'] in FINAL_STATUSES:
+                out.write(json.dumps(row) + "\n")
+                out.flush()
+            rows.append(row)
+            completed += 1
+            if writer is not None and row['status'] == 'ok':
+                writer.add([row])
+            if on_progress:
+                on_progress(completed, total, row, completed / max(time.monotonic() - started, 1e-9))
+            if stop_event is not None and stop_event.is_set():
+                for other in futures:
+                    other.cancel()
+                break
+    return rows
+
+
+def start_batch(client, strategy_file, strategy_symbol, log, **kwargs):
+    """ Run run_batch on a background thread, logging progress through log(message); a writer
+        is closed when the run ends. Returns (thread, stop_event). """
+    stop_event = threading.Event()
+
+    def progress(done, total, row, rate):
+        if done == total or done % 25 == 0 or row['status'] != 'ok':
+            log(f"Batch {strategy_symbol}: {done}/{total} symbols ({rate:.1f}/sec), last {row['symbol']}: {row['status']}")
+
+    def target():
+        try:
+            rows = run_batch(client, strategy_file, strategy_symbol, on_progress=progress, stop_event=stop_event, **kwargs)
+            path = results_path(strategy_symbol, kwargs.get('store_name', DEFAULT_STORE), kwargs.get('params'), kwargs.get('signal2', False))
+            log(f"Batch {strategy_symbol} finished: {len(rows)} symbols backtested. Results in {path}")
+        except Exception as e:
+            log(f"Batch {strategy_symbol} failed: {e}")
+        finally:
+            if kwargs.get('writer') is not None:
+                kwargs['writer'].close()
+
+    thread = threading.Thread(target=target, name=f"batch-{strategy_symbol}", daemon=True)
+    thread.start()
+    return thread, stop_event
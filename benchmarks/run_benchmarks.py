@@ -0,0 +1,223 @@
+# benchmarks/run_benchmarks.py
+"""
+Offline benchmarks of the hot paths, on synthetic OHLCV data (no IB, Supabase or Yahoo needed).
+
+    python benchmarks/run_benchmarks.py            # run, compare with baselines.json, exit 1 on regressions
+    python benchmarks/run_benchmarks.py --save     # run and store the results as the new baselines
+    python benchmarks/run_benchmarks.py --only backtest_ib,backtest_yf
+
+Times are the median of --repeat runs after one warm-up run. A metric regresses when it is more
+than --tolerance (default 25%) worse than its baseline; *_per_sec metrics are higher-is-better,
+all others lower-is-better. Baselines are machine specific: save them on the machine you compare on.
+"""
+import argparse, asyncio, importlib.util, json, os, platform, statistics, sys, tempfile, time
+from types import SimpleNamespace
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+BASELINE_PATH = os.path.join(HERE, 'baselines.json')
+LAST_RUN_PATH = os.path.join(HERE, 'last_run.json')
+
+BENCHMARKS = {}
+
+
+def benchmark(function):
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+def timed(function, repeat):
+    """ Median and best wall time of function() over repeat runs, after a warm-up run. """
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'median_ms': statistics.median(times) * 1000, 'best_ms': min(times) * 1000}
+
+
+def load_strategy1():
+    spec = importlib.util.spec_from_file_location('strategy1', os.path.join(ROOT, 'strategies', 'strategy1.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def offline_strategy(module, signal2=False):
+    """ A Strategy1 instance without the IB and Supabase lookups of __init__. """
+    strategy = module.Strategy.__new__(module.Strategy)
+    strategy.strategy_symbol, strategy.symbol, strategy.signal2, strategy.ib_client = 'BENCH', 'SYN', signal2, None
+    return strategy
+
+
+@benchmark
+def backtest_ib(context, repeat):
+    """ Strategy.backtest on 30 years of IB-shaped bars (after fetch_data), signal2 on. """
+    strategy = offline_strategy(context.strategy1, signal2=True)
+    strategy.fetch_data()
+    return timed(strategy.backtest, repeat)
+
+
+@benchmark
+def backtest_yf(context, repeat):
+    """ Strategy.backtest on 30 years of yfinance-shaped bars, signal2 on. """
+    strategy = offline_strategy(context.strategy1, signal2=True)
+    frame = context.synthetic.yf_frame()
+    strategy.load_yf_data = lambda *args, **kwargs: frame.copy()
+    return timed(lambda: strategy.backtest(yf_symbol='SYN'), repeat)
+
+
+@benchmark
+def fetch_data(context, repeat):
+    """ fetch_data from the local price store: read, 50D MA, month-end detection and monthly MAs. """
+    strategy = offline_strategy(context.strategy1)
+    return timed(strategy.fetch_data, repeat)
+
+
+@benchmark
+def month_end_detection(context, repeat):
+    """ fetch_data's month-end filter alone, on 30 years of daily bars. """
+    df = context.bars
+    last_day_of_month = context.strategy1.Strategy.last_day_of_month
+    return timed(lambda: df[df.index.day == df.index.map(last_day_of_month)], repeat)
+
+
+@benchmark
+def update_prices_transform(context, repeat):
+    """ update_prices.py's per-symbol work: indicators over a year of bars, then NaN->None and to_dict. """
+    from indicators import IndicatorEngine
+    from supabase_writer import frame_to_records
+    engine = IndicatorEngine(path=os.path.join(context.workdir, 'indicator_state.json'))
+    year = context.bars.iloc[-252:].copy()
+    year['symbol'] = 'SYN'
+
+    def transform():
+        engine.reset('SYN')
+        return frame_to_records(engine.update('SYN', year))
+    return timed(transform, repeat)
+
+
+@benchmark
+def update_prices_incremental(context, repeat):
+    """ The incremental path: one new bar through warm indicator state, then to records. """
+    from indicators import IndicatorEngine, IndicatorState
+    from supabase_writer import frame_to_records
+    engine = IndicatorEngine(path=os.path.join(context.workdir, 'indicator_state.json'))
+    history = context.bars.iloc[-253:-1]
+    engine.update('SYN', history)
+    warm_state = engine.get('SYN').to_dict()
+    new_bar = context.bars.iloc[-1:].copy()
+    new_bar['symbol'] = 'SYN'
+
+    def transform():
+        engine.states['SYN'] = IndicatorState.from_dict(warm_state)
+        return frame_to_records(engine.update('SYN', new_bar))
+    return timed(transform, repeat)
+
+
+@benchmark
+def strategy_log_load(context, repeat, strategies=20, interval=0.01, seconds=2.0):
+    """ 20 strategy coroutines woken every 10 ms that each log a line: timer lag and add_log latency. """
+    from strategy_runtime import StrategyRuntime
+    from shared_resources import add_log
+    runtime = StrategyRuntime()
+    lags, log_times = [], []
+
+    async def run(ctx):
+        ctx.every(interval)
+        async for event in ctx:
+            lags.append(time.time() - event[1])
+            start = time.perf_counter()
+            add_log(f"{ctx.name}: tick")
+            log_times.append(time.perf_counter() - start)
+
+    for n in range(strategies):
+        runtime.start(f"B{n}", SimpleNamespace(run=run))
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        runtime.pump(timeout=0.1)
+    elapsed = time.perf_counter() - started
+    runtime.stop()
+    asyncio.set_event_loop(None)
+
+    lags.sort()
+    log_times.sort()
+    return {'events_per_sec': len(lags) / elapsed,
+            'timer_lag_p99_ms': lags[int(len(lags) * 0.99)] * 1000,
+            'add_log_p99_us': log_times[int(len(log_times) * 0.99)] * 1e6}
+
+
+def compare(results, baselines, tolerance):
+    """ Lines describing each metric against its baseline, and whether any regressed. """
+    lines, regressed = [], False
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            baseline = baselines.get(name, {}).get(metric)
+            if baseline is None:
+                lines.append(f"{name:<28} {metric:<18} {value:12.3f}   (no baseline)")
+                continue
+            higher_is_better = metric.endswith('_per_sec')
+            change = (value - baseline) / baseline if baseline else 0.0
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > tolerance:
+                flag, regressed = "  REGRESSION", True
+            lines.append(f"{name:<28} {metric:<18} {value:12.3f}   baseline {baseline:12.3f}  {change:+7.1%}{flag}")
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the ATS hot paths.")
+    parser.add_argument('--only', default=None, help="comma separated benchmark names")
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--save', action='store_true', help="store the results as the new baselines")
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"Unknown benchmarks: {', '.join(unknown)}. Available: {', '.join(BENCHMARKS)}")
+
+    # The price store, indicator state and logs are written to a scratch directory
+    workdir = tempfile.mkdtemp(prefix='ats-bench-')
+    os.chdir(workdir)
+    import synthetic
+    from price_store import get_store, IB_TRADES
+    bars = synthetic.ohlcv()
+    get_store(IB_TRADES).write('SYN', bars)
+    context = SimpleNamespace(workdir=workdir, synthetic=synthetic, bars=bars, strategy1=load_strategy1())
+
+    results = {}
+    for name in names:
+        results[name] = BENCHMARKS[name](context, args.repeat)
+        print(f"ran {name}", file=sys.stderr)
+
+    run = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+           'machine': platform.platform(), 'results': results}
+    with open(LAST_RUN_PATH, 'w') as f:
+        json.dump(run, f, indent=2)
+
+    try:
+        with open(BASELINE_PATH) as f:
+            baselines = json.load(f)['results']
+    except FileNotFoundError:
+        baselines = {}
+    lines, regressed = compare(results, baselines, args.tolerance)
+    print("\n".join(lines))
+
+    if args.save:
+        baselines.update(results)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({**run, 'results': baselines}, f, indent=2)
+        print(f"Baselines saved to {BASELINE_PATH}")
+    elif regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# benchmarks/synthetic.py
+import numpy as np
+import pandas as pd
+
+
+def ohlcv(days=7560, seed=0, start='1994-01-03'):
+    """ Deterministic daily OHLCV bars (a geometric random walk) indexed by business day, like IB's bars. """
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(start, periods=days, name='date')
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.012, days)))
+    open_ = close * np.exp(rng.normal(0, 0.004, days))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.006, days)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.006, days)))
+    volume = rng.integers(100_000, 5_000_000, days).astype(float)
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}, index=index)
+
+
+def yf_frame(days=7560, seed=0):
+    """ The same bars shaped like yfinance.download output. """
+    bars = ohlcv(days, seed)
+    frame = pd.DataFrame({'Open': bars['open'], 'High': bars['high'], 'Low': bars['low'], 'Close': bars['close'],
+                          'Adj Close': bars['close'], 'Volume': bars['volume']})
+    frame.index.name = 'Date'
+    return frame
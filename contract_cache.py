@@ -0,0 +1,132 @@
+# contract_cache.py
+import datetime as dt, json, os, threading
+from contextlib import contextmanager
+from startup import lazy_import
+
+ib_insync = lazy_import('ib_insync')
+
+DEFAULT_CACHE_PATH = os.path.join('data', 'contracts.json')
+
+# IB's answer for a symbol it doesn't know: "No security definition has been found for the request"
+NO_SECURITY_DEFINITION = 200
+
+
+def cache_key(symbol, exchange, currency):
+    return f"{symbol}|{exchange}|{currency}"
+
+
+class ContractCache:
+    """
+    Local index of qualified contracts: {'SYMBOL|EXCHANGE|CURRENCY': {'conId': 265598,
+    'primaryExchange': 'NASDAQ', 'qualified': 'YYYY-MM-DD'}}.
+
+    qualify() fills conId and primaryExchange from the index and only sends contracts that are
+    new or older than ttl_days to IB. Symbols IB has no security definition for (error 200) are
+    stored with conId 0, so delisted tickers are not asked for again for negative_ttl_days.
+    Contracts that stay unqualified for any other reason (a timeout, a lost connection, an
+    ambiguous symbol) are not stored and are asked for again next time.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_days=30, negative_ttl_days=7):
+        self.path = path
+        self.ttl_days = ttl_days
+        self.negative_ttl_days = negative_ttl_days
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def _fresh(self, entry, today):
+        if entry is None:
+            return False
+        ttl_days = self.ttl_days if entry['conId'] else self.negative_ttl_days
+        return (today - dt.date.fromisoformat(entry['qualified'])).days < ttl_days
+
+    def contract(self, symbol, exchange='SMART', currency='USD'):
+        """ A Stock with conId and primaryExchange filled in if they are cached. """
+        contract = ib_insync.Stock(symbol, exchange, currency)
+        self.apply(contract)
+        return contract
+
+    def apply(self, contract):
+        """ Fill in the cached conId and primary exchange; returns False if the contract is not cached. """
+        with self.lock:
+            entry = self.entries.get(cache_key(contract.symbol, contract.exchange, contract.currency))
+        if not entry or not entry['conId']:
+            return False
+        contract.conId = entry['conId']
+        contract.primaryExchange = entry['primaryExchange']
+        return True
+
+    def _missing(self, contracts):
+        """ Fill in the fresh cache entries; returns the contracts IB has to qualify. """
+        today = dt.date.today()
+        missing = []
+        with self.lock:
+            for contract in contracts:
+                entry = self.entries.get(cache_key(contract.symbol, contract.exchange, contract.currency))
+                if not self._fresh(entry, today):
+                    missing.append(contract)
+                elif entry['conId']:
+                    contract.conId, contract.primaryExchange = entry['conId'], entry['primaryExchange']
+        return missing
+
+    @contextmanager
+    def _undefined(self, ib):
+        """ Collects the keys of the contracts IB reports error 200 for while the block runs. """
+        keys = set()
+
+        def on_error(reqId, errorCode, errorString, contract):
+            if errorCode == NO_SECURITY_DEFINITION and contract is not None:
+                keys.add(cache_key(contract.symbol, contract.exchange, contract.currency))
+
+        ib.errorEvent += on_error
+        try:
+            yield keys
+        finally:
+            ib.errorEvent -= on_error
+
+    def _store(self, contracts, undefined):
+        today = dt.date.today().isoformat()
+        with self.lock:
+            for contract in contracts:
+                key = cache_key(contract.symbol, contract.exchange, contract.currency)
+                if contract.conId or key in undefined:
+                    self.entries[key] = {'conId': contract.conId or 0, 'primaryExchange': contract.primaryExchange or '',
+                                         'qualified': today}
+        self.save()
+
+    def qualify(self, ib, contracts):
+        """ The contracts IB knows, qualified from the cache where possible. """
+        missing = self._missing(contracts)
+        if missing:
+            with self._undefined(ib) as undefined:
+                ib.qualifyContracts(*missing)
+            self._store(missing, undefined)
+        return [contract for contract in contracts if contract.conId]
+
+    async def qualify_async(self, ib, contracts):
+        missing = self._missing(contracts)
+        if missing:
+            with self._undefined(ib) as undefined:
+                await ib.qualifyContractsAsync(*missing)
+            self._store(missing, undefined)
+        return [contract for contract in contracts if contract.conId]
+
+    def save(self):
+        """ Write the index atomically so a crash never leaves a truncated file. """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with self.lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# Shared by update_prices.py and the strategies
+contract_cache = ContractCache()
@@ -0,0 +1,420 @@
+# fake_ib.py
+import asyncio, datetime as dt, math, random, time, zlib
+from dataclasses import dataclass, field
+
+ACCOUNT = 'DU0000000'
+ORIGIN = dt.date(1990, 1, 1)      # day 0 of the synthetic price paths
+PACING_MESSAGE = 'Historical Market Data Service error message:API historical data query cancelled: pacing violation'
+
+
+class Event:
+    """ The part of ib_insync's Event used here: += / -= handlers and emit(). """
+
+    def __init__(self, name=''):
+        self.name = name
+        self.handlers = []
+
+    def __iadd__(self, handler):
+        self.handlers.append(handler)
+        return self
+
+    def __isub__(self, handler):
+        if handler in self.handlers:
+            self.handlers.remove(handler)
+        return self
+
+    def __len__(self):
+        return len(self.handlers)
+
+    def emit(self, *args):
+        for handler in list(self.handlers):
+            handler(*args)
+
+
+@dataclass
+class BarData:
+    date: dt.date
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    average: float
+    barCount: int
+
+
+class BarDataList(list):
+    """ Bars of one request; keepUpToDate requests keep receiving updates through updateEvent. """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.reqId = 0
+        self.contract = None
+        self.keepUpToDate = False
+        self.updateEvent = Event('updateEvent')
+
+    def __hash__(self):
+        return id(self)
+
+    def __eq__(self, other):
+        return self is other
+
+
+@dataclass
+class PortfolioItem:
+    contract: object
+    position: float
+    marketPrice: float
+    marketValue: float
+    averageCost: float
+    unrealizedPNL: float
+    realizedPNL: float
+    account: str = ACCOUNT
+
+
+@dataclass
+class Position:
+    account: str
+    contract: object
+    position: float
+    avgCost: float
+
+
+@dataclass
+class AccountValue:
+    account: str
+    tag: str
+    value: str
+    currency: str = 'USD'
+    modelCode: str = ''
+
+
+@dataclass
+class Execution:
+    execId: str
+    time: dt.datetime
+    acctNumber: str
+    exchange: str
+    side: str
+    shares: float
+    price: float
+    permId: int
+    clientId: int
+    orderId: int
+    cumQty: float
+    avgPrice: float
+
+
+@dataclass
+class Fill:
+    contract: object
+    execution: Execution
+    commissionReport: object
+    time: dt.datetime
+
+
+@dataclass
+class OrderStatus:
+    orderId: int = 0
+    status: str = 'PendingSubmit'
+    filled: float = 0.0
+    remaining: float = 0.0
+    avgFillPrice: float = 0.0
+
+
+@dataclass
+class Trade:
+    contract: object
+    order: object
+    orderStatus: OrderStatus
+    fills: list = field(default_factory=list)
+    fillEvent: Event = field(default_factory=lambda: Event('fillEvent'))
+    filledEvent: Event = field(default_factory=lambda: Event('filledEvent'))
+    statusEvent: Event = field(default_factory=lambda: Event('statusEvent'))
+
+    def isDone(self):
+        return self.orderStatus.status in ('Filled', 'Cancelled')
+
+
+def _noise(symbol, day, salt):
+    """ Deterministic value in [-1, 1) for a symbol, day and purpose. """
+    return zlib.crc32(f"{symbol}:{day}:{salt}".encode()) / 2**31 - 1.0
+
+
+def synthetic_bar(symbol, date):
+    """
+    The daily bar of symbol on date. A closed-form path (drift, two cycles and daily noise)
+    instead of a random walk, so every request returns the same bar for the same day no
+    matter which window it covers.
+    """
+    seed = zlib.crc32(symbol.encode())
+    day = (date - ORIGIN).days
+    base = 10 + seed % 190
+    phase = (seed % 628) / 100
+    drift = ((seed >> 8) % 7 - 2) * 0.00004
+    log_price = drift * day + 0.25 * math.sin(day / 97 + phase) + 0.08 * math.sin(day / 19 + 2 * phase) \
+        + 0.01 * _noise(symbol, day, 'c')
+    close = round(base * math.exp(log_price), 2)
+    open_ = round(close * (1 + 0.006 * _noise(symbol, day, 'o')), 2)
+    high = round(max(open_, close) * (1 + 0.004 * (1 + _noise(symbol, day, 'h'))), 2)
+    low = round(min(open_, close) * (1 - 0.004 * (1 + _noise(symbol, day, 'l'))), 2)
+    volume = float(100_000 + zlib.crc32(f"{symbol}:{day}:v".encode()) % 5_000_000)
+    return BarData(date, open_, high, low, close, volume, round((open_ + high + low + close) / 4, 2), int(volume // 100))
+
+
+def last_weekday(day=None):
+    day = day or dt.date.today()
+    while day.weekday() >= 5:
+        day -= dt.timedelta(days=1)
+    return day
+
+
+def duration_days(duration):
+    """ Calendar days covered by an IB durationStr such as '30 D', '2 W', '6 M' or '1 Y'. """
+    amount, unit = duration.split()
+    return int(amount) * {'S': 1 / 86400, 'D': 1, 'W': 7, 'M': 31, 'Y': 366}[unit.upper()]
+
+
+class FakeIB:
+    """
+    Offline stand-in for ib_insync.IB, for load tests without TWS or IB Gateway.
+
+    Historical requests return deterministic daily bars (synthetic_bar) after `latency`
+    seconds (jittered by +-50%) and fail with error 162 (pacing violation, empty result) at
+    pacing_error_rate, or whenever more than max_requests_per_sec are made in one second.
+    keepUpToDate requests receive an update of the forming bar every bar_update_interval
+    seconds. Market orders fill completely at the day's close after fill_latency seconds and
+    update the portfolio and the EquityWithLoanValue account value, firing the same events
+    as ib_insync. Contracts of unknown_symbols fail qualification with error 200 (no security
+    definition). Enable it with IB_BACKEND=fake in .env (see shared_resources.create_ib).
+    """
+
+    def __init__(self, latency=0.05, pacing_error_rate=0.0, max_requests_per_sec=None, fill_latency=0.05,
+                 bar_update_interval=None, equity=1_000_000.0, seed=0, unknown_symbols=()):
+        self.latency = latency
+        self.pacing_error_rate = pacing_error_rate
+        self.max_requests_per_sec = max_requests_per_sec
+        self.fill_latency = fill_latency
+        self.bar_update_interval = bar_update_interval
+        self.unknown_symbols = set(unknown_symbols)
+        self.cash = float(equity)
+        self.random = random.Random(seed)
+        self.connected = False
+        self.client_id = None
+        self.next_req_id = 1
+        self.next_order_id = 1
+        self.recent_requests = []
+        self.subscriptions = []
+        self.trades = []
+        self.holdings = {}          # conId -> [contract, position, average cost]
+        self.requests_made = 0
+        self.pacing_errors = 0
+
+        self.errorEvent = Event('errorEvent')
+        self.barUpdateEvent = Event('barUpdateEvent')
+        self.execDetailsEvent = Event('execDetailsEvent')
+        self.updatePortfolioEvent = Event('updatePortfolioEvent')
+        self.accountValueEvent = Event('accountValueEvent')
+        self.connectedEvent = Event('connectedEvent')
+        self.disconnectedEvent = Event('disconnectedEvent')
+
+    # Connection
+    def connect(self, host='127.0.0.1', port=7497, clientId=1, timeout=4, readonly=False, account=''):
+        self.connected, self.client_id = True, clientId
+        self.connectedEvent.emit()
+        return self
+
+    async def connectAsync(self, *args, **kwargs):
+        return self.connect(*args, **kwargs)
+
+    def isConnected(self):
+        return self.connected
+
+    def disconnect(self):
+        if self.connected:
+            self.connected = False
+            for bars in list(self.subscriptions):
+                self.cancelHistoricalData(bars)
+            self.disconnectedEvent.emit()
+
+    @staticmethod
+    def run(*awaitables, timeout=None):
+        loop = asyncio.get_event_loop()
+        if not awaitables:
+            return loop.run_forever()
+        if len(awaitables) == 1:
+            return loop.run_until_complete(awaitables[0])
+        return loop.run_until_complete(asyncio.gather(*awaitables))
+
+    @staticmethod
+    def sleep(seconds=0.02):
+        asyncio.get_event_loop().run_until_complete(asyncio.sleep(seconds))
+        return True
+
+    # Contracts
+    def qualifyContracts(self, *contracts):
+        qualified = []
+        for contract in contracts:
+            if contract.symbol in self.unknown_symbols:
+                req_id, self.next_req_id = self.next_req_id, self.next_req_id + 1
+                self.errorEvent.emit(req_id, 200, 'No security definition has been found for the request', contract)
+                continue
+            contract.conId = contract.conId or zlib.crc32(contract.symbol.encode()) & 0x7FFFFFFF
+            contract.primaryExchange = getattr(contract, 'primaryExchange', '') or 'NASDAQ'
+            qualified.append(contract)
+        return qualified
+
+    async def qualifyContractsAsync(self, *contracts):
+        return self.qualifyContracts(*contracts)
+
+    # Historical data
+    def _pacing_violation(self):
+        now = time.monotonic()
+        self.recent_requests = [t for t in self.recent_requests if now - t < 1.0]
+        self.recent_requests.append(now)
+        if self.max_requests_per_sec is not None and len(self.recent_requests) > self.max_requests_per_sec:
+            return True
+        return self.random.random() < self.pacing_error_rate
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime='', durationStr='1 Y', barSizeSetting='1 day',
+                                     whatToShow='TRADES', useRTH=True, formatDate=1, keepUpToDate=False,
+                                     chartOptions=None, timeout=60):
+        req_id, self.next_req_id = self.next_req_id, self.next_req_id + 1
+        self.requests_made += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * (0.5 + self.random.random()))
+        if self._pacing_violation():
+            self.pacing_errors += 1
+            self.errorEvent.emit(req_id, 162, PACING_MESSAGE, contract)
+            return BarDataList()
+
+        if endDateTime:
+            end = endDateTime.date() if isinstance(endDateTime, dt.datetime) else \
+                endDateTime if isinstance(endDateTime, dt.date) else dt.datetime.strptime(str(endDateTime)[:8], '%Y%m%d').date()
+        else:
+            end = last_weekday()
+        start = end - dt.timedelta(days=max(1, math.ceil(duration_days(durationStr))) - 1)
+        days = (start + dt.timedelta(days=n) for n in range((end - start).days + 1))
+        bars = BarDataList(synthetic_bar(contract.symbol, day) for day in days if day.weekday() < 5)
+        bars.reqId, bars.contract, bars.keepUpToDate = req_id, contract, keepUpToDate
+        if keepUpToDate:
+            self.subscriptions.append(bars)
+            if self.bar_update_interval:
+                asyncio.get_event_loop().call_later(self.bar_update_interval, self._update_forming_bar, bars)
+        return bars
+
+    def reqHistoricalData(self, contract, *args, **kwargs):
+        return self.run(self.reqHistoricalDataAsync(contract, *args, **kwargs))
+
+    def cancelHistoricalData(self, bars):
+        if bars in self.subscriptions:
+            self.subscriptions.remove(bars)
+
+    def _update_forming_bar(self, bars):
+        if bars not in self.subscriptions or not bars:
+            return
+        bar = bars[-1]
+        bar.close = round(bar.close * (1 + 0.001 * self.random.uniform(-1, 1)), 2)
+        bar.high, bar.low = max(bar.high, bar.close), min(bar.low, bar.close)
+        self._emit_bar_update(bars, False)
+        asyncio.get_event_loop().call_later(self.bar_update_interval, self._update_forming_bar, bars)
+
+    def _emit_bar_update(self, bars, has_new_bar):
+        bars.updateEvent.emit(bars, has_new_bar)
+        self.barUpdateEvent.emit(bars, has_new_bar)
+
+    def advance_day(self, day=None):
+        """ Start the next daily bar on every keepUpToDate subscription, completing the previous one. """
+        for bars in list(self.subscriptions):
+            next_day = day or bars[-1].date + dt.timedelta(days=1)
+            while next_day.weekday() >= 5:
+                next_day += dt.timedelta(days=1)
+            bars.append(synthetic_bar(bars.contract.symbol, next_day))
+            self._emit_bar_update(bars, True)
+
+    # Account and portfolio
+    def _market_price(self, contract):
+        return synthetic_bar(contract.symbol, last_weekday()).close
+
+    def _portfolio_item(self, contract, position, average_cost):
+        price = self._market_price(contract)
+        return PortfolioItem(contract, position, price, position * price, average_cost,
+                             position * (price - average_cost), 0.0)
+
+    def portfolio(self, account=''):
+        return [self._portfolio_item(contract, position, cost)
+                for contract, position, cost in self.holdings.values() if position]
+
+    def positions(self, account=''):
+        return [Position(ACCOUNT, contract, position, cost) for contract, position, cost in self.holdings.values() if position]
+
+    def _equity(self):
+        return self.cash + sum(item.marketValue for item in self.portfolio())
+
+    def accountValues(self, account=''):
+        equity = self._equity()
+        return [AccountValue(ACCOUNT, tag, f"{value:.2f}") for tag, value in
+                (('EquityWithLoanValue', equity), ('NetLiquidation', equity), ('TotalCashValue', self.cash),
+                 ('BuyingPower', max(0.0, equity * 4)))]
+
+    def accountSummary(self, account=''):
+        return self.accountValues(account)
+
+    async def accountSummaryAsync(self, account=''):
+        return self.accountValues(account)
+
+    # Orders
+    def placeOrder(self, contract, order):
+        if not getattr(order, 'orderId', 0):
+            order.orderId, self.next_order_id = self.next_order_id, self.next_order_id + 1
+        trade = Trade(contract, order, OrderStatus(order.orderId, 'Submitted', 0.0, order.totalQuantity))
+        self.trades.append(trade)
+        asyncio.get_event_loop().call_later(self.fill_latency, self._fill, trade)
+        return trade
+
+    def cancelOrder(self, order):
+        for trade in self.trades:
+            if trade.order is order and not trade.isDone():
+                trade.orderStatus.status = 'Cancelled'
+                trade.statusEvent.emit(trade)
+                return trade
+
+    def openTrades(self):
+        return [trade for trade in self.trades if not trade.isDone()]
+
+    def _fill(self, trade):
+        if trade.isDone():
+            return
+        contract, order = trade.contract, trade.order
+        if not contract.conId:
+            self.qualifyContracts(contract)
+        shares = float(order.totalQuantity)
+        sign = 1 if order.action == 'BUY' else -1
+        price = self._market_price(contract)
+
+        _, held, cost = self.holdings.get(contract.conId, (contract, 0.0, 0.0))
+        position = held + sign * shares
+        if not position:
+            cost = 0.0
+        elif held * sign >= 0:
+            cost = (held * cost + sign * shares * price) / position
+        elif held * position < 0:
+            cost = price
+        self.holdings[contract.conId] = [contract, position, cost]
+        self.cash -= sign * shares * price
+
+        now = dt.datetime.now(dt.timezone.utc)
+        execution = Execution(f"{order.orderId:08d}.01", now, ACCOUNT, 'SMART', 'BOT' if sign > 0 else 'SLD',
+                              shares, price, order.orderId, self.client_id or 0, order.orderId, shares, price)
+        fill = Fill(contract, execution, None, now)
+        trade.fills.append(fill)
+        trade.orderStatus.status, trade.orderStatus.filled = 'Filled', shares
+        trade.orderStatus.remaining, trade.orderStatus.avgFillPrice = 0.0, price
+
+        self.execDetailsEvent.emit(trade, fill)
+        trade.fillEvent.emit(trade, fill)
+        trade.statusEvent.emit(trade)
+        trade.filledEvent.emit(trade)
+        self.updatePortfolioEvent.emit(self._portfolio_item(contract, position, cost))
+        for value in self.accountValues():
+            self.accountValueEvent.emit(value)
@@ -0,0 +1,237 @@
+# fake_supabase.py
+import json, sqlite3, threading
+from contextlib import contextmanager
+
+# Columns Postgres would resolve an upsert on when no on_conflict is given
+DEFAULT_CONFLICT_KEYS = {'prices': ('symbol', 'date'), 'backtests': ('strategy', 'symbol', 'signal2', 'params_hash')}
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeSupabase:
+    """
+    Offline stand-in for the Supabase client, backed by one SQLite file.
+
+    Covers the part of the postgrest query builder this project uses: table().select / insert /
+    update / upsert / delete with eq, neq, gt, gte, lt, lte, in_, contains, order, limit and range.
+    Rows are stored as JSON documents, so any table accepts any columns without a schema;
+    every row gets an integer id like the SERIAL columns of setup.py. Columns used in eq
+    filters or upsert keys are indexed on first use. Enable it with SUPABASE_BACKEND=sqlite
+    (and optionally SUPABASE_SQLITE_PATH) in .env.
+    """
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.lock = threading.Lock()
+        self.tables = set()
+        self.indexes = set()
+
+    def table(self, name):
+        return Query(self, name)
+
+    def _ensure_table(self, name):
+        if name not in self.tables:
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS "{name}" (id INTEGER PRIMARY KEY AUTOINCREMENT, doc TEXT NOT NULL)')
+            self.tables.add(name)
+
+    def _ensure_index(self, name, columns):
+        key = (name, tuple(columns))
+        if key not in self.indexes:
+            expressions = ", ".join(f"json_extract(doc, '$.{column}')" for column in columns)
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{name}__{"__".join(columns)}" ON "{name}" ({expressions})')
+            self.indexes.add(key)
+
+
+class Query:
+    """ One table().<operation>()...execute() chain. """
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.operation = 'select'
+        self.columns = None
+        self.payload = None
+        self.on_conflict = None
+        self.filters = []           # (sql, parameters)
+        self.eq_columns = []
+        self.ordering = []
+        self.row_limit = None
+        self.row_offset = 0
+
+    # Operations
+    def select(self, columns="*", **kwargs):
+        self.operation = 'select'
+        self.columns = None if columns.strip() == "*" else [column.strip() for column in columns.split(",")]
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.operation, self.payload = 'insert', rows
+        return self
+
+    def update(self, values, **kwargs):
+        self.operation, self.payload = 'update', values
+        return self
+
+    def upsert(self, rows, on_conflict=None, **kwargs):
+        self.operation, self.payload = 'upsert', rows
+        self.on_conflict = on_conflict
+        return self
+
+    def delete(self, **kwargs):
+        self.operation = 'delete'
+        return self
+
+    # Filters
+    def _compare(self, column, operator, value):
+        if column == 'id':
+            self.filters.append((f"id {operator} ?", [value]))
+        else:
+            self.filters.append((f"json_extract(doc, '$.{column}') {operator} ?", [_sql_value(value)]))
+        return self
+
+    def eq(self, column, value):
+        self.eq_columns.append(column)
+        return self._compare(column, "=", value)
+
+    def neq(self, column, value):
+        return self._compare(column, "!=", value)
+
+    def gt(self, column, value):
+        return self._compare(column, ">", value)
+
+    def gte(self, column, value):
+        return self._compare(column, ">=", value)
+
+    def lt(self, column, value):
+        return self._compare(column, "<", value)
+
+    def lte(self, column, value):
+        return self._compare(column, "<=", value)
+
+    def in_(self, column, values):
+        values = [_sql_value(value) for value in values]
+        placeholders = ", ".join("?" * len(values)) or "NULL"
+        self.filters.append((f"json_extract(doc, '$.{column}') IN ({placeholders})", values))
+        return self
+
+    def contains(self, column, values):
+        for value in values:
+            self.filters.append((f"EXISTS (SELECT 1 FROM json_each(doc, '$.{column}') WHERE value = ?)", [_sql_value(value)]))
+        return self
+
+    def order(self, column, desc=False, **kwargs):
+        self.ordering.append(f"json_extract(doc, '$.{column}') {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, count, **kwargs):
+        self.row_limit = int(count)
+        return self
+
+    def range(self, start, end, **kwargs):
+        self.row_offset, self.row_limit = int(start), int(end) - int(start) + 1
+        return self
+
+    # Execution
+    def _where(self):
+        if not self.filters:
+            return "", []
+        return " WHERE " + " AND ".join(sql for sql, _ in self.filters), [p for _, parameters in self.filters for p in parameters]
+
+    def _rows(self, connection, suffix=""):
+        where, parameters = self._where()
+        cursor = connection.execute(f'SELECT id, doc FROM "{self.table}"{where}{suffix}', parameters)
+        return [(row_id, json.loads(doc)) for row_id, doc in cursor]
+
+    def execute(self):
+        client = self.client
+        with client.lock:
+            client._ensure_table(self.table)
+            connection = client.connection
+            if self.eq_columns:
+                client._ensure_index(self.table, self.eq_columns)
+
+            if self.operation == 'select':
+                suffix = (" ORDER BY " + ", ".join(self.ordering) if self.ordering else " ORDER BY id") + \
+                         (f" LIMIT {self.row_limit} OFFSET {self.row_offset}" if self.row_limit is not None else "")
+                rows = [doc for _, doc in self._rows(connection, suffix)]
+                if self.columns:
+                    rows = [{column: row.get(column) for column in self.columns} for row in rows]
+                return Response(rows)
+
+            if self.operation == 'delete':
+                rows = [doc for _, doc in self._rows(connection)]
+                where, parameters = self._where()
+                connection.execute(f'DELETE FROM "{self.table}"{where}', parameters)
+                return Response(rows)
+
+            if self.operation == 'update':
+                updated = []
+                with _transaction(connection):
+                    for row_id, doc in self._rows(connection):
+                        doc.update(self.payload)
+                        connection.execute(f'UPDATE "{self.table}" SET doc = ? WHERE id = ?', (json.dumps(doc, default=str), row_id))
+                        updated.append(doc)
+                return Response(updated)
+
+            rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            keys = None
+            if self.operation == 'upsert':
+                keys = tuple(self.on_conflict.split(",")) if self.on_conflict else DEFAULT_CONFLICT_KEYS.get(self.table, ('id',))
+                keys = tuple(key.strip() for key in keys)
+                client._ensure_index(self.table, keys)
+            written = []
+            with _transaction(connection):
+                for row in rows:
+                    doc = dict(row)
+                    row_id = None
+                    if keys is not None:
+                        row_id = self._find(connection, keys, doc)
+                    if row_id is not None:
+                        existing = json.loads(connection.execute(f'SELECT doc FROM "{self.table}" WHERE id = ?', (row_id,)).fetchone()[0])
+                        existing.update(doc)
+                        doc = existing
+                        connection.execute(f'UPDATE "{self.table}" SET doc = ? WHERE id = ?', (json.dumps(doc, default=str), row_id))
+                    else:
+                        cursor = connection.execute(f'INSERT INTO "{self.table}" (id, doc) VALUES (?, ?)', (doc.get('id'), "{}"))
+                        doc.setdefault('id', cursor.lastrowid)
+                        connection.execute(f'UPDATE "{self.table}" SET doc = ? WHERE id = ?', (json.dumps(doc, default=str), cursor.lastrowid))
+                    written.append(doc)
+            return Response(written)
+
+    def _find(self, connection, keys, doc):
+        if keys == ('id',):
+            if doc.get('id') is None:
+                return None
+            found = connection.execute(f'SELECT id FROM "{self.table}" WHERE id = ?', (doc['id'],)).fetchone()
+            return found[0] if found else None
+        conditions = " AND ".join(f"json_extract(doc, '$.{key}') = ?" for key in keys)
+        found = connection.execute(f'SELECT id FROM "{self.table}" WHERE {conditions} LIMIT 1',
+                                   [_sql_value(doc.get(key)) for key in keys]).fetchone()
+        return found[0] if found else None
+
+
+@contextmanager
+def _transaction(connection):
+    """ BEGIN ... COMMIT on the autocommit connection; a failed write rolls back, so the shared client stays usable. """
+    connection.execute("BEGIN")
+    try:
+        yield
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+def _sql_value(value):
+    """ Compare the way the values were stored: JSON scalars, with booleans as 0/1 and dates as ISO strings. """
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return str(value)
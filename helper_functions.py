@@ -1,13 +1,18 @@
-from supabase import create_client
-from dotenv import load_dotenv
-import os
+from supabase_client import supabase
+from table_cache import TableCache
+from portfolio_state import portfolio
 
-load_dotenv()
+# Cached views of the small, read-mostly tables; writers must call invalidate()
+strategies_cache = TableCache(supabase, "strategies", key="symbol", ttl=60)
+settings_cache = TableCache(supabase, "settings", key="setting_key", ttl=60)
 
-# Initialize Supabase client
-url = os.getenv("SUPABASE_URL")
-key = os.getenv("SUPABASE_KEY")
-supabase = create_client(url, key)
+def get_setting(setting_key, default=None, cast=None):
+    """ Returns a value from the settings table, or default if the key is not set. """
+    try:
+        value = settings_cache.get(setting_key)['setting_value']
+        return cast(value) if cast else value
+    except:
+        return default
 
 def get_allocation_allowance(strategy_symbol):
     '''Function returns allocation allowance stored in Supabase:
@@ -15,14 +20,19 @@ def get_allocation_allowance(strategy_symbol):
        - min_weight
        - max_weight
     '''
-    strat_data = supabase.table("strategies").select("*").execute().data
-    target_weight = [s['target_weight'] for s in strat_data if s['symbol'] == strategy_symbol][0]
-    min_weight = [s['min_weight'] for s in strat_data if s['symbol'] == strategy_symbol][0]
-    max_weight = [s['max_weight'] for s in strat_data if s['symbol'] == strategy_symbol][0]
-    return target_weight, min_weight, max_weight
+    strategy = strategies_cache.get(strategy_symbol)
+    return strategy['target_weight'], strategy['min_weight'], strategy['max_weight']
+
+def get_universe(strategy_symbol):
+    """ Returns the universe rows (symbol, exchange, currency) tagged with the given strategy. """
+    return supabase.table("universe").select("symbol,exchange,currency").contains("strategies", [strategy_symbol]).execute().data
 
 def get_investment_weight(ib,symbol):
     """ Returns the investment weight in percent for the given symbol. """
+    # Constant-time read once the shared portfolio state follows this client's events
+    if ib is not None and portfolio.ib is ib:
+        return portfolio.weight(symbol)
+
     try:
         positions = ib.portfolio()
 
@@ -0,0 +1,224 @@
+# indicators.py
+import json, math, os
+from collections import deque
+
+DEFAULT_STATE_PATH = os.path.join('data', 'indicator_state.json')
+
+NAN = float('nan')
+
+
+class RollingSMA:
+    """
+    Simple moving average from a running sum; NaN until period values were seen (as talib.SMA).
+    The sum is recomputed from the window once every period updates, so the rounding errors of
+    adding and subtracting don't add up over years of daily bars.
+    """
+
+    def __init__(self, period, window=None, total=0.0):
+        self.period = period
+        self.window = deque(window or (), maxlen=period)
+        self.total = total
+        self.updates = 0
+
+    def update(self, value):
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(value)
+        self.total += value
+        self.updates += 1
+        if self.updates % self.period == 0:
+            self.total = math.fsum(self.window)
+        return self.total / self.period if len(self.window) == self.period else NAN
+
+    @property
+    def value(self):
+        return self.total / self.period if len(self.window) == self.period else NAN
+
+    def to_dict(self):
+        return {'period': self.period, 'window': list(self.window), 'total': self.total}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['period'], d['window'], d['total'])
+
+
+class WilderATR:
+    """
+    Average True Range with Wilder smoothing, seeded like talib.ATR: the first value is the
+    mean of the first period true ranges (from the second bar on), then
+    ATR = (ATR * (period - 1) + TR) / period.
+    """
+
+    def __init__(self, period=14, prev_close=None, count=0, seed_total=0.0, atr=NAN):
+        self.period = period
+        self.prev_close = prev_close
+        self.count = count
+        self.seed_total = seed_total
+        self.atr = atr
+
+    def update(self, high, low, close):
+        if self.prev_close is None:
+            self.prev_close = close
+            return NAN
+        true_range = max(high, self.prev_close) - min(low, self.prev_close)
+        self.prev_close = close
+        self.count += 1
+        if self.count < self.period:
+            self.seed_total += true_range
+        elif self.count == self.period:
+            self.atr = (self.seed_total + true_range) / self.period
+        else:
+            self.atr = (self.atr * (self.period - 1) + true_range) / self.period
+        return self.atr
+
+    @property
+    def value(self):
+        return self.atr
+
+    def to_dict(self):
+        return {'period': self.period, 'prev_close': self.prev_close, 'count': self.count,
+                'seed_total': self.seed_total, 'atr': None if math.isnan(self.atr) else self.atr}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['period'], d['prev_close'], d['count'], d['seed_total'], NAN if d['atr'] is None else d['atr'])
+
+
+class RollingMax:
+    """ Rolling maximum over window values with min_periods=1, kept in a monotonic deque. """
+
+    def __init__(self, window, candidates=None, seen=0):
+        self.window = window
+        self.candidates = deque(tuple(c) for c in candidates or ())  # (position, value), values decreasing
+        self.seen = seen
+
+    def update(self, value):
+        while self.candidates and self.candidates[-1][1] <= value:
+            self.candidates.pop()
+        self.candidates.append((self.seen, value))
+        if self.candidates[0][0] <= self.seen - self.window:
+            self.candidates.popleft()
+        self.seen += 1
+        return self.candidates[0][1]
+
+    @property
+    def value(self):
+        return self.candidates[0][1] if self.candidates else NAN
+
+    def to_dict(self):
+        return {'window': self.window, 'candidates': [list(c) for c in self.candidates], 'seen': self.seen}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['window'], d['candidates'], d['seen'])
+
+
+class IndicatorState:
+    """ The indicators update_prices.py stores for one symbol, updated bar by bar in O(1). """
+
+    COLUMNS = ('50D_MA', '200D_MA', 'ATR', '52W_High')
+
+    def __init__(self, sma50=None, sma200=None, atr=None, high52w=None, last_date=None):
+        self.sma50 = sma50 or RollingSMA(50)
+        self.sma200 = sma200 or RollingSMA(200)
+        self.atr = atr or WilderATR(14)                   # Using 14-day ATR by convention
+        self.high52w = high52w or RollingMax(52*5)        # Assuming 5 trading days in a week
+        self.last_date = last_date
+
+    def update(self, date, high, low, close):
+        """ Add one bar and return its indicator values in COLUMNS order. """
+        self.last_date = str(date)[:10]
+        return (self.sma50.update(close), self.sma200.update(close),
+                self.atr.update(high, low, close), self.high52w.update(close))
+
+    def to_dict(self):
+        return {'sma50': self.sma50.to_dict(), 'sma200': self.sma200.to_dict(), 'atr': self.atr.to_dict(),
+                'high52w': self.high52w.to_dict(), 'last_date': self.last_date}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(RollingSMA.from_dict(d['sma50']), RollingSMA.from_dict(d['sma200']), WilderATR.from_dict(d['atr']),
+                   RollingMax.from_dict(d['high52w']), d['last_date'])
+
+
+class IndicatorEngine:
+    """
+    Per-symbol IndicatorState, persisted as JSON so daily runs only feed in the new bars.
+    """
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.states = {symbol: IndicatorState.from_dict(d) for symbol, d in json.load(f).items()}
+        except (FileNotFoundError, ValueError):
+            self.states = {}
+
+    def get(self, symbol):
+        return self.states.get(symbol)
+
+    def reset(self, symbol):
+        self.states[symbol] = IndicatorState()
+        return self.states[symbol]
+
+    def drop(self, symbol):
+        self.states.pop(symbol, None)
+
+    def update(self, symbol, df):
+        """
+        Feed the bars of df (indexed by date, with high/low/close) into the symbol's state and
+        add the indicator columns to df. Starts a fresh state if the symbol has none.
+        """
+        state = self.states.get(symbol) or self.reset(symbol)
+        values = [state.update(date, high, low, close)
+                  for date, high, low, close in zip(df.index, df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy())]
+        df = df.copy()
+        for i, column in enumerate(IndicatorState.COLUMNS):
+            df[column] = [row[i] for row in values]
+        return df
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({symbol: state.to_dict() for symbol, state in self.states.items()}, f)
+        os.replace(tmp_path, self.path)
+
+
+class MonthlyMovingAverages:
+    """
+    Moving averages of month-end closes (Strategy1's 10M / 50M filters), updated from daily bars.
+    A month's close is final once a bar of the next month arrives; value() covers completed
+    months only, so the running month never moves the averages before its month end.
+    """
+
+    def __init__(self, windows=(10, 50)):
+        self.smas = {window: RollingSMA(window) for window in windows}
+        self.month = None
+        self.month_close = None
+
+    def update(self, date, close):
+        """ Add a daily close; returns True when it started a new month (the previous one closed). """
+        month = (date.year, date.month)
+        rolled = self.month is not None and month != self.month
+        if rolled:
+            for sma in self.smas.values():
+                sma.update(self.month_close)
+        self.month, self.month_close = month, close
+        return rolled
+
+    def value(self, window):
+        """ MA over completed months only, as of the last month end. """
+        return self.smas[window].value
+
+    def to_dict(self):
+        return {'smas': [sma.to_dict() for sma in self.smas.values()],
+                'month': None if self.month is None else list(self.month), 'month_close': self.month_close}
+
+    @classmethod
+    def from_dict(cls, d):
+        averages = cls(())
+        averages.smas = {sma['period']: RollingSMA.from_dict(sma) for sma in d['smas']}
+        averages.month = None if d['month'] is None else tuple(d['month'])
+        averages.month_close = d['month_close']
+        return averages
@@ -0,0 +1,172 @@
+# instrumentation.py
+import bisect, functools, os, re, threading, time
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_EXPORT_PATH = os.path.join('data', 'metrics.prom')
+
+# Upper bounds in seconds, from a dictionary lookup to a 30 year download
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """ Prometheus-style cumulative buckets plus the last `recent` samples for quantiles on screen. """
+    __slots__ = ('counts', 'count', 'sum', 'max', 'samples')
+
+    def __init__(self, recent=1024):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=recent)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        self.samples.append(value)
+
+    def quantile(self, q):
+        samples = sorted(self.samples)
+        return samples[min(int(len(samples) * q), len(samples) - 1)] if samples else 0.0
+
+
+class Registry:
+    """
+    Counters and duration histograms of the hot paths (IB requests, Supabase round trips,
+    strategy loops, backtests), keyed by metric name and labels.
+
+    Recording takes one lock and a few list updates, so it can stay on in production.
+    export() writes everything in the Prometheus text format to a file that a node_exporter
+    textfile collector (or anything else) can pick up; the Reports > Performance screen
+    shows the same numbers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}       # (name, labels) -> value
+        self.histograms = {}     # (name, labels) -> Histogram
+        self.help = {}
+        self.started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """ Time the block into the histogram name; failures also count in <name>_errors. """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(name + '_errors', **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """ Decorator form of span(). """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def snapshot(self):
+        """ ([(name, labels, value)], [(name, labels, count, mean, p50, p95, max)]) sorted by name, for display. """
+        with self.lock:
+            counters = [(name, dict(labels), value) for (name, labels), value in self.counters.items()]
+            histograms = [(name, dict(labels), h.count, h.sum / h.count if h.count else 0.0,
+                           h.quantile(0.5), h.quantile(0.95), h.max)
+                          for (name, labels), h in self.histograms.items()]
+        return sorted(counters, key=lambda row: (row[0], sorted(row[1].items()))), \
+            sorted(histograms, key=lambda row: (row[0], sorted(row[1].items())))
+
+    def render(self):
+        """ All metrics in the Prometheus text exposition format. """
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, list(h.counts), h.count, h.sum) for key, h in self.histograms.items())
+        for name in sorted({key[0] for key, _ in counters}):
+            metric = _metric_name(name) + '_total'
+            if name in self.help:
+                lines.append(f"# HELP {metric} {self.help[name]}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f"{metric}{_labels(labels)} {value}" for (n, labels), value in counters if n == name)
+        for name in sorted({key[0] for key, *_ in histograms}):
+            metric = _metric_name(name) + '_seconds'
+            if name in self.help:
+                lines.append(f"# HELP {metric} {self.help[name]}")
+            lines.append(f"# TYPE {metric} histogram")
+            for (n, labels), counts, count, total in histograms:
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS + ('+Inf',), counts):
+                    cumulative += bucket
+                    lines.append(f"{metric}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{metric}_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"{metric}_count{_labels(labels)} {count}")
+        lines.append(f"process_start_time_seconds {self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path=DEFAULT_EXPORT_PATH):
+        """ Write render() atomically, so a scraper never reads half a file. """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_exporter(self, interval=15.0, path=DEFAULT_EXPORT_PATH, log=print):
+        """ Export every interval seconds from a daemon thread; failures are reported through log(message). """
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.export(path)
+                except OSError as e:
+                    log(f"Could not export metrics: {e}")
+        thread = threading.Thread(target=run, name="metrics-exporter", daemon=True)
+        thread.start()
+        return thread
+
+
+def _metric_name(name):
+    return 'ats_' + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+# Shared by every module
+registry = Registry()
+registry.describe('ib_connect', "Time to connect to TWS / IB Gateway.")
+registry.describe('ib_historical_request', "Duration of historical data requests to IB.")
+registry.describe('supabase_query', "Round trip of supabase.table(...).execute() calls.")
+registry.describe('strategy_fetch_data', "Strategy.fetch_data: price store read and top-up from IB.")
+registry.describe('backtest_phase', "Phases of Strategy.backtest.")
+registry.describe('strategy_iteration', "Time a strategy spends handling one runtime event.")
+registry.describe('table_cache', "Lookups of the cached Supabase tables (strategies, settings) by result.")
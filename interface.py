@@ -1,14 +1,21 @@
-import curses, time
-import threading
+import curses
+from concurrent.futures import ThreadPoolExecutor
 
 from setup import setup_database
-from menu_handler import  manage_settings, draw_menu, load_strategy, get_strategies, manage_reports
-from shared_resources import add_log, log_buffer, log_lock, start_event, connect_to_IB, disconnect_from_IB
+from menu_handler import  manage_settings, render_menu, load_strategy, get_strategies, manage_reports, wait_key
+from shared_resources import add_log, log_pipeline, start_event, connect_to_IB, disconnect_from_IB
+from log_pipeline import format_record
+from startup import profile
+from strategy_runtime import StrategyRuntime
+from portfolio_state import portfolio
+from order_aggregator import orders
+from instrumentation import registry
 
 def main(stdscr):
     # Run the database setup check
-    if not setup_database(stdscr):
-        return  # Exit if setup needed
+    with profile.phase("database check"):
+        if not setup_database(stdscr):
+            return  # Exit if setup needed
     
     # Set up the main window
     stdscr.nodelay(True)
@@ -22,32 +29,56 @@ def main(stdscr):
      # Create a separate window for logs at the bottom of the screen
     log_win = curses.newwin(9, width, height - 9, 0)
 
-    strategies = get_strategies()
-    strategy_threads = []
+    with profile.phase("strategies table"):
+        strategies = get_strategies()
+    # Strategy modules are independent of each other, so they are loaded side by side
+    with profile.phase("strategy modules"), ThreadPoolExecutor(max_workers=max(len(strategies), 1)) as pool:
+        strategy_modules = list(pool.map(lambda strategy: load_strategy(strategy['filename']), strategies))
 
-    for strategy in strategies:
-        strategy_module = load_strategy(strategy['filename'])
-        t = threading.Thread(target=strategy_module.run)
-        t.daemon = True
-        t.start()
-        strategy_threads.append(t)
+    # Strategies run as coroutines on the event loop the UI pumps below
+    runtime = StrategyRuntime()
+    for strategy, strategy_module in zip(strategies, strategy_modules):
+        runtime.start(strategy['symbol'], strategy_module)
+
+    # Hot-path timings are written in the Prometheus text format to data/metrics.prom
+    registry.start_exporter(log=lambda message: add_log(message, level='ERROR'))
 
     CONNECTED = False
+    log_source = None  # show the records of every source
+
+    # Only what changed is redrawn: the menu when its state changes or a key was handled,
+    # the log panel when records arrive. Between frames the loop sleeps until a key is
+    # pressed, a record is logged or a second has passed.
+    menu_drawn = None
+    log_drawn = None
+    log_pipeline.listener = runtime.wake_up
+    runtime.watch_input(0)
 
     while True:
         # Draw the main menu
-        if not CONNECTED:
-            choice = draw_menu(stdscr,width,menu_title="Main Menu",menu_options=["Settings", "Go Live" ,"Reports", "Quit ATS"],lastinput_key="q")
-        else:
-            choice = draw_menu(stdscr,width,menu_title="Main Menu",menu_options=["Settings", "Disconnect","Reports", "Quit ATS"],lastinput_key="q")
-
-        if start_event.is_set():
+        if menu_drawn != CONNECTED:
+            if not CONNECTED:
+                render_menu(stdscr,width,menu_title="Main Menu",menu_options=["Settings", "Go Live" ,"Reports", "Quit ATS"],lastinput_key="q")
+            else:
+                render_menu(stdscr,width,menu_title="Main Menu",menu_options=["Settings", "Disconnect","Reports", "Quit ATS"],lastinput_key="q")
+            menu_drawn = CONNECTED
+            log_drawn = None
+            log_win.touchwin()
+        profile.finish(log=add_log)  # only the first call counts: the menu is up
+
+        log_state = (log_pipeline.version, log_source, start_event.is_set())
+        if log_state != log_drawn:
             log_win.erase()
-            with log_lock:
-                for i, log_line in enumerate(list(log_buffer)[-5:]):
-                    log_win.addstr(0, 2, f"Recent Logs:".ljust(width))
-                    log_win.addstr(i+1, 2, log_line[:width])
-        log_win.refresh()
+            if start_event.is_set():
+                log_win.addstr(0, 2, f"Recent Logs ({log_source or 'all'}, f to filter):".ljust(width - 4))
+                for i, record in enumerate(log_pipeline.tail(5, log_source)):
+                    log_win.addstr(i+1, 2, format_record(record)[:width - 4])
+            log_win.refresh()
+            log_drawn = log_state
+
+        choice = stdscr.getch()
+        if choice != -1:
+            menu_drawn = None  # prompts and sub menus draw over the main menu
 
         # Manage Settings Menu
         if choice == ord('0'):
@@ -56,10 +87,9 @@ def main(stdscr):
         # Going Live & Disconnecting
         elif choice == ord('1'):
             if not CONNECTED:
-                stdscr.nodelay(False)
                 stdscr.addstr(13, 0, "Are you sure you want to go live? (y/n)".ljust(width))
                 stdscr.refresh()
-                confirmation = stdscr.getch()
+                confirmation = wait_key(stdscr)
 
                 if confirmation == ord('y'):
                     stdscr.addstr(13, 0, "System is Live".ljust(width))
@@ -67,26 +97,34 @@ def main(stdscr):
                     ib = connect_to_IB()
                     if ib is not None:
                         start_event.set()
+                        portfolio.attach(ib)
+                        orders.attach(ib)
+                        runtime.attach(ib)
                         CONNECTED = True
                 elif confirmation == ord('n'):
                     stdscr.addstr(13, 0, "".ljust(width))  # Clear the quit message
-                stdscr.nodelay(True)  # Make getch() non-blocking again
             
             else:
                 # Disconnect from IB
-                stdscr.nodelay(False)
                 stdscr.addstr(13, 0, "Are you sure you want to disconnect? (y/n)".ljust(width))
                 stdscr.refresh()
-                confirmation = stdscr.getch()
+                confirmation = wait_key(stdscr)
 
                 if confirmation == ord('y'):
+                    runtime.detach()
+                    portfolio.detach()
+                    orders.detach()
                     disconnect_from_IB(ib)
                     ib = None  # Reset the IB connection object
                     CONNECTED = False
                     start_event.clear()
                 elif confirmation == ord('n'):
                     stdscr.addstr(13, 0, "".ljust(width))  # Clear the message
-                stdscr.nodelay(True)  # Make getch() non-blocking again
+
+        # Cycle the log panel through the sources that have logged so far
+        elif choice == ord('f'):
+            sources = [None] + sorted(log_pipeline.sources)
+            log_source = sources[(sources.index(log_source) + 1) % len(sources)] if log_source in sources else None
 
         # Showing Performance Statistics (not full yimplemented)
         elif choice == ord('2'):
@@ -94,18 +132,19 @@ def main(stdscr):
         
         # Quit the Application
         elif choice == ord('q'):
-            stdscr.nodelay(False)  # Make getch() blocking temporarily
             stdscr.addstr(13, 0, "Are you sure you want to quit? (y/n)".ljust(width))
             stdscr.refresh()
-            confirmation = stdscr.getch()
+            confirmation = wait_key(stdscr)
             if confirmation == ord('y'):
+                runtime.stop()
+                registry.export()
                 break
             elif confirmation == ord('n'):
                 stdscr.addstr(13, 0, "".ljust(width))  # Clear the quit message
-            stdscr.nodelay(True)  # Make getch() non-blocking again
-        
-        stdscr.refresh()
-        time.sleep(0.1)  # To prevent high CPU usage
+
+        # Handles IB and strategy events until there is something to draw; at most 30 frames a second.
+        # After a key the next one may already be in curses' buffer, so don't wait for the terminal.
+        runtime.pump(timeout=1.0 if choice == -1 else 0.03, min_wait=0.03)
 
 def start_ui():
     # Run the program
@@ -0,0 +1,114 @@
+# job_runner.py
+import json, os, threading, time
+
+DEFAULT_JOBS_DIR = os.path.join('data', 'jobs')
+
+DONE, SKIPPED, FAILED = 'done', 'skipped', 'failed'
+FINAL = (DONE, SKIPPED)     # items a resumed run does not process again
+
+
+class JobRun:
+    """
+    Persisted per-item progress of one run of a long job, e.g. the universe price update.
+
+    The checkpoint file data/jobs/<name>.json holds the status of every finished item. A run
+    with the same target (e.g. the trading day being updated) that did not finish resumes from
+    it: pending() leaves out items that are done or skipped, failed items are tried again.
+    mark() may be called from any thread and only updates counters. checkpoint() runs the
+    on_checkpoint callback to save the job's own state, then writes the file, so it must be
+    called from the thread that owns that state.
+    """
+
+    def __init__(self, name, target, jobs_dir=DEFAULT_JOBS_DIR, checkpoint_interval=30.0, restart=False, on_checkpoint=None):
+        self.name = name
+        self.target = str(target)
+        self.path = os.path.join(jobs_dir, f"{name}.json")
+        self.checkpoint_interval = checkpoint_interval
+        self.on_checkpoint = on_checkpoint
+        self.lock = threading.Lock()
+        self.items = {}
+        self.counts = {DONE: 0, SKIPPED: 0, FAILED: 0}
+        self.retries = 0
+        self.total = 0
+        self.resumed = 0
+        self.started = time.monotonic()
+        self.last_checkpoint = self.started
+        self.summary_line = None
+
+        previous = None if restart else self._load()
+        if previous and previous.get('target') == self.target and not previous.get('finished'):
+            self.items = {item: status for item, status in previous['items'].items() if status in FINAL}
+            self.resumed = len(self.items)
+            self.retries = previous.get('retries', 0)
+            for status in self.items.values():
+                self.counts[status] += 1
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def pending(self, items, key=str):
+        """ The items this run still has to process; sets the run's total. """
+        pending = [item for item in items if key(item) not in self.items]
+        self.total = len(pending) + self.resumed
+        return pending
+
+    def mark(self, item, status=DONE):
+        """ Record an item's outcome; a later mark replaces an earlier one (e.g. failed, then done on retry). """
+        with self.lock:
+            previous = self.items.get(item)
+            if previous is not None:
+                self.counts[previous] -= 1
+            self.items[item] = status
+            self.counts[status] += 1
+
+    def retried(self, count=1):
+        with self.lock:
+            self.retries += count
+
+    @property
+    def finished_items(self):
+        return self.counts[DONE] + self.counts[SKIPPED] + self.counts[FAILED]
+
+    def progress(self):
+        """ 'n out of total', without scanning anything. """
+        return f"{self.finished_items} out of {self.total}"
+
+    def maybe_checkpoint(self):
+        if time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def checkpoint(self, finished=False):
+        """ Save the job's state (on_checkpoint), then the item statuses, atomically. """
+        # Statuses are taken before the state is saved, so no item is recorded ahead of its state
+        with self.lock:
+            record = {'name': self.name, 'target': self.target, 'finished': finished, 'retries': self.retries,
+                      'counts': dict(self.counts), 'items': dict(self.items),
+                      'updated': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        if self.on_checkpoint is not None:
+            self.on_checkpoint()
+        if self.summary_line:
+            record['summary'] = self.summary_line
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, self.path)
+        self.last_checkpoint = time.monotonic()
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        processed = self.finished_items - self.resumed
+        resumed = f", resumed after {self.resumed}" if self.resumed else ""
+        return (f"{self.name} {self.target}: {self.counts[DONE]} done, {self.counts[SKIPPED]} skipped, "
+                f"{self.counts[FAILED]} failed of {self.total} in {elapsed:.1f}s "
+                f"({processed / elapsed if elapsed > 0 else 0.0:.2f}/sec), {self.retries} retries{resumed}")
+
+    def finish(self):
+        """ Final checkpoint; the run only counts as finished if every item is done or skipped. Returns the summary. """
+        self.summary_line = self.summary()
+        self.checkpoint(finished=self.counts[DONE] + self.counts[SKIPPED] >= self.total)
+        return self.summary_line
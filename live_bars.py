@@ -0,0 +1,109 @@
+# live_bars.py
+import datetime as dt
+from startup import lazy_import
+from indicators import MonthlyMovingAverages
+from price_store import get_store, IB_TRADES
+from instrumentation import registry
+
+pd = lazy_import('pandas')
+ib_insync = lazy_import('ib_insync')
+
+
+class LiveDailyBars:
+    """
+    Daily bars of one contract for a live strategy.
+
+    hydrate() replays the local price store once into month-end moving averages
+    (indicators.MonthlyMovingAverages). subscribe() then requests only the days missing since
+    the store's last bar, with keepUpToDate=True, so IB keeps pushing updates of the forming
+    bar. When a new bar starts, the previous one is complete: on_bar_update() appends it to
+    the store and the averages, and the strategy can evaluate its signal right away instead
+    of downloading 30 years of history again. If a split changed the close of the last stored
+    day, the full history is requested instead and replaces the store and the averages.
+    """
+
+    def __init__(self, symbol, contract, store_name=IB_TRADES, windows=(10, 50)):
+        self.symbol = symbol
+        self.contract = contract
+        self.store = get_store(store_name)
+        self.monthly = MonthlyMovingAverages(windows)
+        self.last_date = None     # date of the last completed bar
+        self.last_close = None
+        self.bars = None          # the keepUpToDate BarDataList, its last bar is still forming
+
+    def hydrate(self):
+        """ Feed every stored bar into the averages; returns the number of bars. """
+        stored = self.store.read(self.symbol, columns=['close'])
+        if stored is None:
+            return 0
+        for date, close in zip(stored.index, stored['close'].to_numpy()):
+            self._add(date, close)
+        return len(stored)
+
+    def _add(self, date, close):
+        self.monthly.update(date, close)
+        self.last_date, self.last_close = date, close
+
+    async def subscribe(self, ib):
+        """ Request the missing days with keepUpToDate=True and store the completed ones. """
+        if self.last_date is None:
+            duration = '30 Y'
+        else:
+            days = (pd.Timestamp(dt.date.today()) - self.last_date).days + 1
+            duration = f"{max(days, 2)} D" if days <= 365 else f"{days // 365 + 1} Y"
+        self.bars = await self._request(ib, duration)
+        if self.last_date is not None and len(self.bars) > 1 and \
+                self.store.is_adjusted(self.symbol, self._frame(self.bars[:-1])):
+            # A split re-adjusted the history: start over from the full history, which replaces the store
+            ib.cancelHistoricalData(self.bars)
+            self.monthly = MonthlyMovingAverages(tuple(self.monthly.smas))
+            self.last_date = self.last_close = None
+            self.bars = await self._request(ib, '30 Y')
+        self._complete(self.bars[:-1])
+        return self.bars
+
+    async def _request(self, ib, duration):
+        with registry.span('ib_historical_request', source='live_bars'):
+            return await ib.reqHistoricalDataAsync(
+                self.contract,
+                endDateTime='',
+                durationStr=duration,
+                barSizeSetting='1 day',
+                whatToShow='TRADES',
+                useRTH=True,
+                formatDate=1,
+                keepUpToDate=True
+            )
+
+    @staticmethod
+    def _frame(bars):
+        frame = ib_insync.util.df(bars)
+        frame['date'] = pd.to_datetime(frame['date'])
+        return frame
+
+    def on_bar_update(self, has_new_bar):
+        """ Call on every update of self.bars; returns True when it completed a bar. """
+        if not has_new_bar or self.bars is None or len(self.bars) < 2:
+            return False
+        return self._complete(self.bars[-2:-1])
+
+    def _complete(self, bars):
+        bars = [bar for bar in bars if self.last_date is None or pd.Timestamp(bar.date) > self.last_date]
+        if not bars:
+            return False
+        frame = self._frame(bars)
+        # Without a last bar the store is empty or being replaced after a split
+        (self.store.write if self.last_date is None else self.store.append)(self.symbol, frame)
+        for date, close in zip(frame['date'], frame['close']):
+            self._add(date, close)
+        return True
+
+    @property
+    def current_close(self):
+        """ Close of the forming bar, or of the last completed one before the subscription. """
+        return self.bars[-1].close if self.bars else self.last_close
+
+    def cancel(self, ib):
+        if self.bars is not None:
+            ib.cancelHistoricalData(self.bars)
+            self.bars = None
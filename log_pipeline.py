@@ -0,0 +1,150 @@
+# log_pipeline.py
+import asyncio, json, os, queue, threading, time
+from collections import deque
+
+DEFAULT_LOG_PATH = os.path.join('data', 'logs', 'ats.log')
+
+
+def current_source():
+    """ Name of the strategy task or thread that is logging, 'main' for the UI thread. """
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return task.get_name()
+    name = threading.current_thread().name
+    return 'main' if name == 'MainThread' else name
+
+
+def format_record(record):
+    """ One line for the log panel; multi-line messages (tracebacks) show their last line. """
+    timestamp, level, source, message = record
+    lines = message.strip().splitlines() or ['']
+    return f"{time.ctime(timestamp)}: {lines[-1]}"
+
+
+class LogPipeline:
+    """
+    Structured log records from every strategy, kept in memory for the UI and on disk.
+
+    emit() only appends a (timestamp, level, source, message) tuple to the in-memory tails and a
+    queue, so producers never wait on a lock or on disk. A background thread drains the queue in
+    batches into a JSON-lines file that rotates at max_bytes, keeping `backups` old files.
+    The tails hold the last tail_size records overall and per source, for the log panel.
+    """
+
+    def __init__(self, path=DEFAULT_LOG_PATH, max_bytes=5_000_000, backups=5, tail_size=500):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.tail_size = tail_size
+        self.records = deque(maxlen=tail_size)
+        self.sources = {}
+        self.version = 0          # bumped on every record, so readers can tell when to redraw
+        self.listener = None      # called after every record, e.g. to wake the UI; must be cheap
+        self.written = 0
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._thread = threading.Thread(target=self._drain, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, message, source=None, level='INFO'):
+        record = (time.time(), level, source or current_source(), str(message))
+        self._remember(record)
+        self._queue.put(record)
+        if self.listener is not None:
+            self.listener()
+
+    def _remember(self, record):
+        self.records.append(record)
+        tail = self.sources.get(record[2])
+        if tail is None:
+            tail = self.sources.setdefault(record[2], deque(maxlen=self.tail_size))
+        tail.append(record)
+        self.version += 1
+
+    def tail(self, n, source=None):
+        """ The last n records, of one source or of all. """
+        records = self.records if source is None else self.sources.get(source, ())
+        return list(records)[-n:]
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+        self._open()
+
+    def _drain(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            records = [record for record in batch if record is not None]
+            try:
+                if self._file is None:
+                    self._open()
+                self._file.write("".join(json.dumps({'ts': timestamp, 'level': level, 'source': source, 'message': message}) + "\n"
+                                         for timestamp, level, source, message in records))
+                self._file.flush()
+                self.written += len(records)
+                if self._file.tell() >= self.max_bytes:
+                    self._rotate()
+            except OSError as e:
+                # Printing would draw over the curses UI and the file is what failed: show it in the log panel only
+                self._remember((time.time(), 'ERROR', 'log-writer', f"Could not write log records: {e}"))
+                if self.listener is not None:
+                    self.listener()
+            if stop:
+                return
+
+    def close(self, timeout=5.0):
+        """ Write out everything queued so far and stop the writer thread. """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def measure_producer_latency(pipeline, threads=8, records_per_thread=20000):
+    """ Emit as fast as possible from several threads; returns producer-side latency percentiles in microseconds. """
+    latencies = [[] for _ in range(threads)]
+
+    def produce(samples):
+        for i in range(records_per_thread):
+            start = time.perf_counter()
+            pipeline.emit(f"load test record {i}", source=threading.current_thread().name)
+            samples.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=produce, args=(samples,), name=f"producer-{n}") for n, samples in enumerate(latencies)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    samples = sorted(latency for thread_samples in latencies for latency in thread_samples)
+    percentile = lambda p: samples[min(int(len(samples) * p), len(samples) - 1)] * 1e6
+    return {'records': len(samples), 'records_per_sec': len(samples) / elapsed,
+            'p50_us': percentile(0.50), 'p99_us': percentile(0.99), 'max_us': samples[-1] * 1e6}
+
+
+if __name__ == "__main__":
+    import tempfile
+    pipeline = LogPipeline(os.path.join(tempfile.mkdtemp(), 'load_test.log'))
+    result = measure_producer_latency(pipeline)
+    pipeline.close()
+    print(", ".join(f"{key}: {value:,.1f}" for key, value in result.items()))
+    print(f"{pipeline.written:,} records written")
@@ -1,7 +1,13 @@
 # main.py
-import interface
+import sys
+from startup import profile
 
 def main():
+    # python main.py --profile-startup also times every module imported before the menu appears
+    if '--profile-startup' in sys.argv:
+        profile.track_imports()
+    with profile.phase("imports"):
+        import interface
     # Run the UI
     interface.start_ui()
 
@@ -1,16 +1,13 @@
 # menu_handler.py
-import curses, textwrap, importlib.util
-from supabase import create_client
-from dotenv import load_dotenv
+import curses, textwrap, importlib.util, time
+from supabase_client import supabase
 import os, traceback
-from shared_resources import connect_to_IB
+from shared_resources import get_IB, add_log
+from helper_functions import strategies_cache, settings_cache
+from supabase_writer import UpsertBuffer
+from instrumentation import registry
+from strategy_runtime import idle
 
-load_dotenv()
-
-# Initialize Supabase client
-url = os.getenv("SUPABASE_URL")
-key = os.getenv("SUPABASE_KEY")
-supabase = create_client(url, key)
 
 def load_strategy(strategy_file):
     """
@@ -26,11 +23,18 @@ def load_strategy(strategy_file):
     return module
 
 def get_strategies(): 
-    strategies = supabase.table("strategies").select("*").execute().data
+    strategies = strategies_cache.rows()
     return strategies
 
 def draw_menu(stdscr, width,menu_title:str,menu_options: list, lastinput_key:str="b"):
     stdscr.clear()
+    render_menu(stdscr, width, menu_title, menu_options, lastinput_key)
+    choice = stdscr.getch()
+    return choice
+
+def render_menu(stdscr, width,menu_title:str,menu_options: list, lastinput_key:str="b"):
+    """ Draws a menu without waiting for input; erase() lets curses send only the cells that changed. """
+    stdscr.erase()
     # Header
     stdscr.addstr(0, 0, "=" * width)
     title = "Multi Strategy Automated Trading System by Lange Invest"
@@ -59,9 +63,6 @@ def draw_menu(stdscr, width,menu_title:str,menu_options: list, lastinput_key:str
     stdscr.addstr(7+ len(menu_options), menu_start_x, bottom_bar)
     stdscr.refresh()
 
-    choice = stdscr.getch()
-    return choice
-
 def draw_main_menu(stdscr, width):
     draw_menu(stdscr,width,menu_title="Settings Menu",
     menu_options=[
@@ -70,6 +71,41 @@ def draw_main_menu(stdscr, width):
     "Add a Strategy", 
     "Back to Main Menu"])
 
+def wait_key(win, timeout=None):
+    """ getch() that keeps the event loop (IB, timers, strategies) running while it waits; -1 after timeout seconds. """
+    win.nodelay(True)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        key = win.getch()
+        if key != -1:
+            return key
+        left = 1.0 if deadline is None else deadline - time.monotonic()
+        if left <= 0:
+            return -1
+        idle(min(left, 1.0))
+
+def read_line(win, y, x, max_length=100):
+    """ getstr() at (y, x) built on wait_key: echoes the typed characters and handles backspace. """
+    curses.noecho()
+    text = ''
+    win.move(y, x)
+    win.refresh()
+    while True:
+        key = wait_key(win)
+        if key in (curses.KEY_ENTER, 10, 13):
+            return text
+        if key in (curses.KEY_BACKSPACE, 8, 127):
+            text = text[:-1]
+            win.addstr(y, x + len(text), ' ')
+        elif 32 <= key < 127 and len(text) < max_length:
+            text += chr(key)
+        win.addstr(y, x, text)
+        win.refresh()
+
+def pause(seconds):
+    """ curses.napms() that keeps the event loop running. """
+    idle(seconds, wake_on_input=False)
+
 def prompt_user(win, prompt, y, input_x, visible_length, total_length, width):
     # Display the prompt at a fixed position
     win.addstr(y, 2, prompt)  # 2 to offset from the window border
@@ -80,12 +116,12 @@ def prompt_user(win, prompt, y, input_x, visible_length, total_length, width):
     while not input_str:
         win.move(y, input_x)  # Move cursor to the input position
         win.clrtoeol()  # Clear the line where the input is to be entered
-        input_str = win.getstr().decode().strip()  # Get input from the user
+        input_str = read_line(win, y, input_x, total_length).strip()  # Get input from the user
         if not input_str:
             # If input is empty, prompt the user again
             win.addstr(y + 1, 2, "Input cannot be empty. Please enter a value.")
             win.refresh()
-            curses.napms(1000)  # Wait a second before allowing to enter again
+            pause(1.0)  # Wait a second before allowing to enter again
             win.move(y + 1, 2)  # Move cursor away from the error message
             win.clrtoeol()  # Clear the error message
 
@@ -102,12 +138,12 @@ def prompt_yes_no(win, prompt, y, input_x, width):
     while response not in valid_responses:
         win.addstr(y, input_x, prompt + " (y/n): ")
         win.refresh()
-        response = win.getkey()  # getkey() waits for a key press and returns the pressed character
+        response = chr(wait_key(win))  # waits for a key press and returns the pressed character
 
         if response not in valid_responses:
             win.addstr(y + 1, 2, "Invalid input. Please enter 'y' or 'n'.")
             win.refresh()
-            curses.napms(1000)  # Wait for 1 second
+            pause(1.0)  # Wait for 1 second
             win.move(y + 1, 2)
             win.clrtoeol()  # Clear the error message
 
@@ -142,28 +178,22 @@ def add_strategy(stdscr):
         if not 0 <= allocation_int <= 100:
             win.addstr(16, 2, "Allocation must be between 0 and 100.".ljust(width))
             win.refresh()
-            stdscr.nodelay(False) 
-            stdscr.getch()
-            stdscr.nodelay(True) 
+            wait_key(stdscr)
             raise ValueError("Allocation must be between 0 and 100.")
     except ValueError as e:
         win.addstr(22, 2, f"Error: {e}. Press any key to continue...".ljust(width))
         win.refresh()
-        stdscr.nodelay(False) 
-        stdscr.getch()
-        stdscr.nodelay(True) 
+        wait_key(stdscr)
         return  # Exit the function if validation fails
 
     # Confirmation before saving
     win.addstr(15, 2, "Save this information? (y/n): ")
     win.refresh()
-    confirmation = win.getch()
+    confirmation = wait_key(win)
     if confirmation in [ord('n'), ord('N')]:
         win.addstr(16, 2, "Operation cancelled. Press any key to continue...")
         win.refresh()
-        stdscr.nodelay(False) 
-        stdscr.getch()
-        stdscr.nodelay(True) 
+        wait_key(stdscr)
         return  # Return without saving
     
     if confirmation in [ord('y'), ord('Y')]:
@@ -186,6 +216,7 @@ def add_strategy(stdscr):
                 supabase.table("strategies").update(strategy_details).eq("symbol", strategy_abbreviation).execute()
         except:
             pass
+        strategies_cache.invalidate()
         
         # Success message
         success_msg = f"{strategy_name} strategy added successfully! Press any key to continue..."
@@ -193,15 +224,13 @@ def add_strategy(stdscr):
         win.addstr(17, success_msg_x, success_msg)
         win.refresh()
 
-        stdscr.nodelay(False) 
-        stdscr.getch()  # Wait for user input before continuing
-        stdscr.nodelay(True)
+        wait_key(stdscr)  # Wait for user input before continuing
         win.clear() # Clear the window and return to the main screen
         win.refresh()
 
 def manage_backtests(stdscr,width):
     # Fetch strategies from Supabase
-    strategies = supabase.table("strategies").select("*").execute()
+    strategies = strategies_cache.rows()
     stdscr.clear()
     # header
     stdscr.addstr(0, 0, "=" * width)
@@ -213,11 +242,11 @@ def manage_backtests(stdscr,width):
     stdscr.addstr(6, (width // 2) - len(header) // 2, "-" * len(header))
     
     # if no strategy in Supabase
-    if len(strategies.data) == 0:
+    if len(strategies) == 0:
         stdscr.addstr(8,(width // 2) - len(header) // 2, "No Strategy in Database")
     else:
         line = 8
-        for strat,i in zip(strategies.data,range(1,len(strategies.data)+1)):
+        for strat,i in zip(strategies,range(1,len(strategies)+1)):
             stdscr.addstr(line, (width // 2) - len(header) // 2, f"{i}. {strat['name']} ({strat['symbol']})".ljust(40))
             line += 1
 
@@ -226,12 +255,12 @@ def manage_backtests(stdscr,width):
 
     # Sub Menu for individual Strategies
     while True:
-        sub_choice = stdscr.getch()
+        sub_choice = wait_key(stdscr)
         if sub_choice == ord('b'):
             break
-        elif sub_choice in [ord(str(i)) for i in range(1, len(strategies.data) + 1)]:
+        elif sub_choice in [ord(str(i)) for i in range(1, len(strategies) + 1)]:
             strategy_num = int(chr(sub_choice))
-            selected_strategy = strategies.data[strategy_num - 1]
+            selected_strategy = strategies[strategy_num - 1]
 
              # Load the strategy module
             strategy_module = load_strategy(selected_strategy['filename'])
@@ -262,58 +291,203 @@ def manage_backtests(stdscr,width):
              # Confirmation before saving
             win.addstr(15, 2, f"""Run a backtest for the strategy '{selected_strategy['name']}' for {selected_strategy['symbol'].upper()}? (y/n): """)
             win.refresh()
-            confirmation = win.getch()
+            confirmation = wait_key(win)
             if confirmation in [ord('n'), ord('N')]:
                 win.addstr(16, 2, "Operation cancelled. Press any key to continue...")
                 win.refresh()
-                stdscr.nodelay(False) 
-                stdscr.getch()
-                stdscr.nodelay(True) 
+                wait_key(stdscr)
                 return  # Return without saving
             
             if confirmation in [ord('y'), ord('Y')]:
                 win.addstr(16, 2, "Calculating...please be patient")
                 win.refresh()
                 try:
-                    ib_client = connect_to_IB()
+                    ib_client = get_IB()  # reuses the live connection instead of opening another one
                     # Instantiate the strategy class and call create_bt_summary
                     if hasattr(strategy_module, 'Strategy'):
                         strategy_instance = strategy_module.Strategy(strategy_symbol, ib_client, symbol, exchange, currency,signal2)
                         if yf_symbol:
-                            strategy_instance.create_bt_summary(yf_symbol)
+                            stats = strategy_instance.create_bt_summary(yf_symbol)
+                        else:
+                            stats = strategy_instance.create_bt_summary()
+                        cached = " (unchanged inputs, taken from the backtest cache)" if getattr(strategy_instance, 'bt_cached', False) else ""
+                        # The results replace the form, so they fit a 24 row terminal
+                        win.erase()
+                        win.box()
+                        row = add_lines(win, 2, [f"Backtest of {strategy_instance.bt_symbol} was successful{cached}."])
+                        row = show_backtest_stats(win, stats, row + 1)
+                        row = add_lines(win, row, ["r. Render the full HTML report in the background, any other key to continue"])
+                        win.refresh()
+                        key = wait_key(stdscr)
+                        if key in [ord('r'), ord('R')]:
+                            def report_done(path, error):
+                                add_log(f"Backtest report ready: {path}" if error is None else f"Backtest report failed: {error}")
+                            if strategy_instance.render_report(report_done):
+                                message = f"Report copied from the backtest cache to {strategy_instance.bt_report}."
+                            else:
+                                message = f"Rendering {strategy_instance.bt_report}, the log shows when it is ready."
+                            add_lines(win, row, [message, "Press any key to continue."])
                         else:
-                            strategy_instance.create_bt_summary()
-                        win.addstr(16, 2, "Backtest was successful. Find the results in the reports folder. Press any key to continue.")
+                            win.clear()
+                            win.refresh()
+                            return
                 except Exception as e:
-                    error_msg = traceback.format_exc()
-                    win.addstr(17, 2, f"Error: {error_msg}")
-                    pass
+                    # The traceback goes to the log file; on screen only what fits below the form
+                    add_log(traceback.format_exc(), level='ERROR')
+                    add_lines(win, 17, [f"Error: {e}", "The traceback is in the log. Press any key to continue."])
                 
                 win.refresh()
 
-                stdscr.nodelay(False) 
-                stdscr.getch()  # Wait for user input before continuing
-                stdscr.nodelay(True)
+                wait_key(stdscr)  # Wait for user input before continuing
                 win.clear() # Clear the window and return to the main screen
                 win.refresh()
                 return
                 
 
+def add_lines(win, row, lines, attr=curses.A_NORMAL):
+    """ Write lines from row on inside the window's border, wrapped to its width; whatever doesn't fit is dropped. Returns the next free row. """
+    height, width = win.getmaxyx()
+    for line in lines:
+        for part in textwrap.wrap(line, max(width - 4, 1)) or ['']:
+            if row >= height - 1:
+                return row
+            win.addstr(row, 2, part, attr)
+            row += 1
+    return row
+
+def show_backtest_stats(win, stats, row):
+    """ Headline stats of a backtest (Strategy.create_bt_summary) as a table; returns the next free row. """
+    lines = [('CAGR', 'cagr', 100, '%'), ('Volatility', 'volatility', 100, '%'), ('Sharpe', 'sharpe', 1, ''),
+             ('Sortino', 'sortino', 1, ''), ('Max drawdown', 'max_drawdown', 100, '%'),
+             ('Exposure', 'exposure', 100, '%'), ('Turnover / year', 'turnover', 1, 'x')]
+
+    def cell(value, scale, unit):
+        return "-" if value is None or value != value else f"{value * scale:.2f}{unit}"
+
+    row = add_lines(win, row, [f"{'':<18}{'Strategy':>12}{'Benchmark':>12}"], curses.A_BOLD)
+    row = add_lines(win, row, [f"{label:<18}{cell(stats['strategy'].get(key), scale, unit):>12}"
+                               f"{cell(stats['benchmark'].get(key), scale, unit):>12}" for label, key, scale, unit in lines])
+    return row + 1
+
+
+def manage_universe_backtests(stdscr, width):
+    """ Starts a background backtest of one strategy over its symbols in the universe table. """
+    strategies = strategies_cache.rows()
+    stdscr.clear()
+    # header
+    stdscr.addstr(0, 0, "=" * width)
+    title = "Multi Strategy Automated Trading System by Lange Invest"
+    stdscr.addstr(1, (width - len(title)) // 2, title)
+    stdscr.addstr(2, 0, "=" * width)
+    header = "Backtest a Strategy over its Universe"
+    stdscr.addstr(5, (width // 2) - len(header) // 2, header)
+    stdscr.addstr(6, (width // 2) - len(header) // 2, "-" * len(header))
+
+    line = 8
+    for strat,i in zip(strategies,range(1,len(strategies)+1)):
+        stdscr.addstr(line, (width // 2) - len(header) // 2, f"{i}. {strat['name']} ({strat['symbol']})".ljust(40))
+        line += 1
+    stdscr.addstr(line + 5, (width // 2) - len(header) // 2, "b. back")
+    stdscr.refresh()
+
+    while True:
+        sub_choice = wait_key(stdscr)
+        if sub_choice == ord('b'):
+            return
+        elif sub_choice in [ord(str(i)) for i in range(1, len(strategies) + 1)]:
+            selected_strategy = strategies[int(chr(sub_choice)) - 1]
+            break
+
+    height, width = stdscr.getmaxyx()
+    win = curses.newwin(height, width, 0, 0)
+    win.box()
+    signal2 = prompt_yes_no(win, "Do you want to use the second signal to re-enter the market?", 5, 2, width)
+    restart = prompt_yes_no(win, "Start over instead of resuming the previous run?", 7, 2, width)
+
+    from batch_backtest import start_batch, BACKTESTS_CONFLICT, DEFAULT_STORE  # pulls in multiprocessing and the price store, only needed here
+    writer = UpsertBuffer(supabase, 'backtests', on_conflict=BACKTESTS_CONFLICT,  # closed by the batch when it ends
+                          log=lambda message: add_log(message, level='ERROR'))
+    start_batch(supabase, selected_strategy['filename'], selected_strategy['symbol'], add_log,
+                params=selected_strategy.get('params'), signal2=signal2, restart=restart, writer=writer)
+
+    win.addstr(9, 2, f"Universe backtest for {selected_strategy['name']} started. Progress is shown in the log panel.")
+    win.addstr(10, 2, f"Bars come from the {DEFAULT_STORE} store; symbols need at least 50 months of history.")
+    win.addstr(11, 2, "Press any key to continue.")
+    win.refresh()
+    wait_key(stdscr)
+
+def manage_performance(stdscr, width):
+    """ Timings of the hot paths from the instrumentation registry, refreshed every second. """
+    exported = ""
+    while True:
+        height, _ = stdscr.getmaxyx()
+        counters, histograms = registry.snapshot()
+        stdscr.erase()
+        # header
+        stdscr.addstr(0, 0, "=" * width)
+        title = "Multi Strategy Automated Trading System by Lange Invest"
+        stdscr.addstr(1, (width - len(title)) // 2, title)
+        stdscr.addstr(2, 0, "=" * width)
+        header = "Performance"
+        stdscr.addstr(4, (width // 2) - len(header) // 2, header)
+
+        line = 6
+        stdscr.addstr(line, 2, f"{'Timer':<52}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"[:width - 4])
+        line += 1
+        for name, labels, count, mean, p50, p95, maximum in histograms:
+            if line >= height - 4:
+                break
+            label = name + (" " + ",".join(f"{key}={value}" for key, value in labels.items()) if labels else "")
+            stdscr.addstr(line, 2, f"{label[:51]:<52}{count:>8}{mean * 1000:>10.1f}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}{maximum * 1000:>10.1f}"[:width - 4])
+            line += 1
+        if counters and line < height - 5:
+            line += 1
+            stdscr.addstr(line, 2, "Counters"[:width - 4])
+            line += 1
+            for name, labels, value in counters:
+                if line >= height - 4:
+                    break
+                label = name + (" " + ",".join(f"{key}={value}" for key, value in labels.items()) if labels else "")
+                stdscr.addstr(line, 2, f"{label[:51]:<52}{value:>8}"[:width - 4])
+                line += 1
+        if not histograms and not counters:
+            stdscr.addstr(line, 2, "Nothing recorded yet.")
+
+        stdscr.addstr(height - 2, 2, f"e. export to data/metrics.prom  b. back   {exported}"[:width - 4])
+        stdscr.refresh()
+
+        choice = wait_key(stdscr, timeout=1.0)
+        if choice == ord('b'):
+            break
+        elif choice == ord('e'):
+            try:
+                registry.export()
+                exported = "exported"
+            except OSError as e:
+                add_log(f"Could not export metrics: {e}", level='ERROR')
+                exported = "export failed, see the log"
+    stdscr.nodelay(True)
+
+
 def manage_reports(stdscr, width):
-    draw_menu(stdscr,width,menu_title="Reports",menu_options=["Strategy Reports","Account Information", "Back"])
+    draw_menu(stdscr,width,menu_title="Reports",menu_options=["Strategy Reports","Account Information", "Performance", "Back"])
     while True:
-        choice = stdscr.getch()
+        choice = wait_key(stdscr)
 
         if choice == ord('0'):
-            draw_menu(stdscr,width,"Strategy Reports",menu_options=["Strategy Backtests", "Strategy Live Reports","Back"])
+            draw_menu(stdscr,width,"Strategy Reports",menu_options=["Strategy Backtests", "Strategy Live Reports","Universe Backtests","Back"])
             while True:
-                sub_choice = stdscr.getch()
+                sub_choice = wait_key(stdscr)
                 if sub_choice == ord('0'):
                     manage_backtests(stdscr,width)
 
                 elif sub_choice == ord('1'):
                     # Strategy Live Reports
                     pass
+
+                elif sub_choice == ord('2'):
+                    manage_universe_backtests(stdscr,width)
+                    draw_menu(stdscr,width,"Strategy Reports",menu_options=["Strategy Backtests", "Strategy Live Reports","Universe Backtests","Back"])
                 elif sub_choice == ord('b'):
                     break
 
@@ -321,6 +495,10 @@ def manage_reports(stdscr, width):
             # Account Information here
             pass
 
+        elif choice == ord('2'):
+            manage_performance(stdscr, width)
+            draw_menu(stdscr,width,menu_title="Reports",menu_options=["Strategy Reports","Account Information", "Performance", "Back"])
+
         elif choice == ord('b'):
             break
 
@@ -329,13 +507,13 @@ def manage_settings(stdscr, width):
     # Display the settings menu
     draw_menu(stdscr,width,menu_title="Settings Menu",menu_options=["General Settings", "Strategy Settings", "Add a Strategy", "Back to Main Menu"])
     while True:
-        choice = stdscr.getch()
+        choice = wait_key(stdscr)
 
         # General Settings Option
         if choice == ord('0'):
             draw_menu(stdscr,width,"General Settings",menu_options=["Change Port for IBKR Connection", "Back to Settings Menu"])
             while True:  # Begin nested loop for the General Settings submenu
-                sub_choice = stdscr.getch()
+                sub_choice = wait_key(stdscr)
                 if sub_choice == ord('0'):
                     change_port(stdscr,width)
                     draw_menu(stdscr,width,menu_title="Settings Menu",menu_options=["General Settings", "Strategy Settings", "Add a Strategy", "Back to Main Menu"])
@@ -346,14 +524,14 @@ def manage_settings(stdscr, width):
         # Strategy Settings Option
         elif choice == ord('1'):
             # Fetch strategies from Supabase
-            strategies = supabase.table("strategies").select("*").execute()
+            strategies = strategies_cache.rows()
             stdscr.clear()
 
             # if no strategy in Supabase
-            if len(strategies.data) == 0:
+            if len(strategies) == 0:
                 draw_menu(stdscr,width,"Strategies",["Add a Strategy","Back to Settings"])
                 while True:  # Begin nested loop for the General Settings submenu
-                    sub_choice = stdscr.getch()
+                    sub_choice = wait_key(stdscr)
                     if sub_choice == ord('0'):
                         add_strategy(stdscr)
                         draw_menu(stdscr,width,"Strategies",["Add a Strategy","Back to Settings"])
@@ -370,7 +548,7 @@ def manage_settings(stdscr, width):
                 stdscr.addstr(6, (width // 2) - len(header) // 2, "-" * len(header))  # Underline the header
                 line = 8
 
-                for strat,i in zip(strategies.data,range(1,len(strategies.data)+1)):
+                for strat,i in zip(strategies,range(1,len(strategies)+1)):
                     name = strat['name']
                     symbol = strat['symbol']
                     target_weight = strat['target_weight']
@@ -383,15 +561,15 @@ def manage_settings(stdscr, width):
 
             # Sub Menu for individual Strategies
             while True:
-                sub_choice = stdscr.getch()
+                sub_choice = wait_key(stdscr)
                 if sub_choice == ord('b'):
                     break
-                elif sub_choice in [ord(str(i)) for i in range(1, len(strategies.data) + 1)]:
+                elif sub_choice in [ord(str(i)) for i in range(1, len(strategies) + 1)]:
                     strategy_num = int(chr(sub_choice))
-                    selected_strategy = strategies.data[strategy_num - 1]
+                    selected_strategy = strategies[strategy_num - 1]
                     manage_strategy(stdscr, selected_strategy, width)
                     # Re-fetch strategies in case of changes
-                    strategies_result = supabase.table("strategies").select("*").execute()
+                    strategies = strategies_cache.rows()
 
         # Add a Strategy Option
         elif choice == ord('2'):
@@ -440,7 +618,7 @@ def manage_strategy(stdscr, selected_strategy, width):
             stdscr.refresh()
             needs_update = False
 
-        param_choice = stdscr.getch()
+        param_choice = wait_key(stdscr)
         if param_choice in [ord(str(i)) for i in range(1, len(strategy_params) + 1)]:
             param_num = int(chr(param_choice))
             edit_param(stdscr, selected_strategy, param_num, width)
@@ -461,9 +639,6 @@ def edit_param(stdscr, selected_strategy, param_key, width):
     # Clear the screen before displaying anything new
     stdscr.clear()
 
-    # Disable nodelay to make sure getch() and getstr() block for input
-    stdscr.nodelay(False)
-
     # Retrieve the current value and description of the parameter
     param_name = selected_strategy['params'][str(param_key)]['name']
     current_value = selected_strategy['params'][str(param_key)]['value']
@@ -481,7 +656,7 @@ def edit_param(stdscr, selected_strategy, param_key, width):
     # Get the new value from the user
     # new_value = stdscr.getstr(6, len(f"Enter new value for {param_name}: ") + 2, 20).decode('utf-8')
     stdscr.move(6, len(f"Enter new value for {param_name}: ") + 2)
-    new_value = stdscr.getstr().decode('utf-8').strip()
+    new_value = read_line(stdscr, 6, len(f"Enter new value for {param_name}: ") + 2, 20).strip()
 
     # Disable echoing of input after getting the input
     curses.noecho()
@@ -491,8 +666,8 @@ def edit_param(stdscr, selected_strategy, param_key, width):
     try:
         # Convert the new value to the appropriate type and validate it
         new_value = int(new_value)  # Example: converting to integer
-        if new_value <= 0:
-            raise ValueError("The value must be positive.")
+        if new_value < 0:
+            raise ValueError("The value must not be negative.")
 
         # Update the parameter in the selected_strategy dictionary
         selected_strategy['params'][str(param_key)]['value'] = new_value
@@ -502,23 +677,20 @@ def edit_param(stdscr, selected_strategy, param_key, width):
         stdscr.addstr(8, 2, "Value updated successfully.")
     except ValueError as e:
         stdscr.addstr(8, 2, f"Invalid input: {e}")
+    finally:
+        strategies_cache.invalidate()
     # Refresh to show the update and then wait for a key press to return
     stdscr.refresh()
-    stdscr.getch()  # Now this should block since nodelay is set to False
-
-    # If necessary, re-enable nodelay after getting the input
-    stdscr.nodelay(True)
+    wait_key(stdscr)
 
 def edit_weight(stdscr, selected_strategy, width):
     stdscr.clear()
-    stdscr.nodelay(False)
     # Prompt the user to enter a new weight
     prompt = "Enter new weight (0-100): "
     stdscr.addstr(20, 2, prompt)
     stdscr.refresh()
     curses.echo()
-    new_weight = stdscr.getstr(20, 2 + len(prompt), 5).decode('utf-8')
-    stdscr.nodelay(True)
+    new_weight = read_line(stdscr, 20, 2 + len(prompt), 5)
     # Validate the new weight
     try:
         new_weight = int(new_weight)
@@ -527,52 +699,51 @@ def edit_weight(stdscr, selected_strategy, width):
     except ValueError:
         stdscr.addstr(22, 2, "Invalid weight. Please enter a number between 0 and 100.")
         stdscr.refresh()
-        curses.napms(2000)  # Wait 2 seconds
+        pause(2.0)  # Wait 2 seconds
         return
 
     # Update the new weight
     supabase.table("strategies").update({'target_weight':float(new_weight),'min_weight':new_weight*0.8,'max_weight':new_weight*1.2}).eq('symbol',selected_strategy['symbol']).execute()
+    strategies_cache.invalidate()
     
 def delete_strategy(stdscr, selected_strategy):
     stdscr.clear()
     # Confirm with the user
     stdscr.addstr(20, 2, f"Are you sure you want to delete the strategy '{selected_strategy['name']}'? (y/n): ")
     stdscr.refresh()
-    stdscr.nodelay(False)
-    confirmation = stdscr.getch()
+    confirmation = wait_key(stdscr)
     if confirmation in [ord('y'), ord('Y')]:
         # Delete the strategy from the 'strategies' table
         supabase.table("strategies").delete().eq("symbol", selected_strategy['symbol']).execute()
+        strategies_cache.invalidate()
         stdscr.addstr(22, 2, "Strategy deleted successfully.")
         stdscr.refresh()
-        curses.napms(2000)  # Wait 2 seconds
+        pause(2.0)  # Wait 2 seconds
     else:
         stdscr.addstr(22, 2, "Deletion canceled.")
         stdscr.refresh()
-        curses.napms(2000)  # Wait 2 seconds
-    stdscr.nodelay(True)
+        pause(2.0)  # Wait 2 seconds
 
 def load_and_initialize_strategy_params(selected_strategy):
+    """ The strategy's stored params, completed with the defaults of PARAMS entries added to the strategy file since. """
     try:
-        params = supabase.table("strategies").select("params").eq('symbol', selected_strategy['symbol']).execute().data[0]['params']
+        params = strategies_cache.get(selected_strategy['symbol'])['params']
     except:
         params = None
 
-    if params == None:
-        filename = selected_strategy['filename']
-        params = {}
-        module_name = os.path.splitext(filename)[0]
-        module_path = os.path.join('strategies', filename)
-        
-        spec = importlib.util.spec_from_file_location(module_name, module_path)
-        strategy_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(strategy_module)
-
-        if hasattr(strategy_module, 'PARAMS'):
-            params = strategy_module.PARAMS
-            supabase.table("strategies").update({'params': params}).eq('symbol', selected_strategy['symbol']).execute()
-        else:
-            raise ValueError(f"The strategy file {filename} does not contain a PARAMS dictionary.")
+    filename = selected_strategy['filename']
+    strategy_module = load_strategy(filename)
+    # Stored params have string keys (JSON); the PARAMS of the strategy file may have int keys
+    defaults = {str(key): details for key, details in getattr(strategy_module, 'PARAMS', {}).items()}
+    if params == None and not defaults:
+        raise ValueError(f"The strategy file {filename} does not contain a PARAMS dictionary.")
+
+    if params == None or any(key not in params for key in defaults):
+        params = {**defaults, **(params or {})}
+        supabase.table("strategies").update({'params': params}).eq('symbol', selected_strategy['symbol']).execute()
+        strategies_cache.invalidate()
+    # edit_param looks the entries up here
+    selected_strategy['params'] = params
     print(params)
     return params
 
@@ -586,7 +757,7 @@ def change_port(stdscr, width):
     while True:
         try:
             win.move(1, 28)  # Move cursor to the right of the prompt
-            new_port_str = win.getstr().decode().strip()
+            new_port_str = read_line(win, 1, 28, 4).strip()
             if len(new_port_str) == 4 and new_port_str.isdigit():
                 new_port = int(new_port_str)
                 try:
@@ -595,6 +766,7 @@ def change_port(stdscr, width):
                         update_result = supabase.table("settings").update({"setting_value": new_port}).eq('setting_key', 'port').execute()
                 except:
                     supabase.table("settings").insert({"setting_key": "port", "setting_value": new_port}).execute()
+                settings_cache.invalidate()
 
                 win.addstr(3, 2, "Port changed successfully.", curses.A_BOLD)
                 win.refresh()
@@ -609,6 +781,6 @@ def change_port(stdscr, width):
 
     curses.curs_set(0)  # Hide cursor
     curses.noecho()
-    win.getch()  # Wait for user input before closing the window
+    wait_key(win)  # Wait for user input before closing the window
     win.clear()
     win.refresh()
\ No newline at end of file
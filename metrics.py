@@ -0,0 +1,78 @@
+# metrics.py
+import numpy as np
+
+TRADING_DAYS = 252
+
+
+def _clean(returns):
+    returns = np.asarray(returns, dtype=float)
+    return returns[np.isfinite(returns)]
+
+
+def cagr(returns, periods=TRADING_DAYS):
+    """ Compound annual growth rate of a daily return series. """
+    returns = _clean(returns)
+    if len(returns) == 0:
+        return np.nan
+    growth = np.prod(1 + returns)
+    return growth ** (periods / len(returns)) - 1 if growth > 0 else -1.0
+
+
+def sharpe(returns, periods=TRADING_DAYS, rf=0.0):
+    """ Annualised Sharpe ratio; rf is the annual risk-free rate. """
+    returns = _clean(returns) - rf / periods
+    std = returns.std(ddof=1) if len(returns) > 1 else 0.0
+    return returns.mean() / std * np.sqrt(periods) if std > 0 else np.nan
+
+
+def max_drawdown(returns):
+    """ Largest peak-to-trough loss of the compounded equity curve (negative number). """
+    returns = _clean(returns)
+    if len(returns) == 0:
+        return np.nan
+    equity = np.cumprod(1 + returns)
+    peaks = np.maximum.accumulate(np.maximum(equity, 1.0))
+    return (equity / peaks - 1).min()
+
+
+def exposure(returns):
+    """ Share of days with a position, counted as days with a non-zero return like quantstats. """
+    returns = _clean(returns)
+    return np.count_nonzero(returns) / len(returns) if len(returns) else np.nan
+
+
+def volatility(returns, periods=TRADING_DAYS):
+    """ Annualised standard deviation of the daily returns. """
+    returns = _clean(returns)
+    return returns.std(ddof=1) * np.sqrt(periods) if len(returns) > 1 else np.nan
+
+
+def sortino(returns, periods=TRADING_DAYS, rf=0.0):
+    """ Annualised Sortino ratio: mean excess return over the downside deviation (quantstats' definition). """
+    returns = _clean(returns) - rf / periods
+    if len(returns) == 0:
+        return np.nan
+    downside = np.sqrt(np.sum(np.minimum(returns, 0.0) ** 2) / len(returns))
+    return returns.mean() / downside * np.sqrt(periods) if downside > 0 else np.nan
+
+
+def turnover(positions, periods=TRADING_DAYS):
+    """ Average yearly sum of absolute position changes; 2.0 means the full position was bought and sold once a year. """
+    positions = np.nan_to_num(np.asarray(positions, dtype=float))
+    if len(positions) == 0:
+        return np.nan
+    changes = np.abs(np.diff(positions, prepend=0.0)).sum()
+    return changes / len(positions) * periods
+
+
+def summary(returns, periods=TRADING_DAYS):
+    return {'cagr': cagr(returns, periods), 'sharpe': sharpe(returns, periods),
+            'max_drawdown': max_drawdown(returns), 'exposure': exposure(returns)}
+
+
+def headline(returns, positions=None, periods=TRADING_DAYS):
+    """ The stats shown right after a backtest; turnover needs the daily positions. """
+    stats = summary(returns, periods)
+    stats.update({'volatility': volatility(returns, periods), 'sortino': sortino(returns, periods),
+                  'turnover': turnover(positions, periods) if positions is not None else np.nan})
+    return stats
@@ -0,0 +1,176 @@
+# order_aggregator.py
+import asyncio, datetime as dt, threading
+from concurrent.futures import ThreadPoolExecutor
+from startup import lazy_import
+from supabase_client import supabase
+from helper_functions import strategies_cache, get_setting
+from shared_resources import add_log
+
+ib_insync = lazy_import('ib_insync')
+
+# Order states after which IB fills nothing more (Inactive: rejected); Filled is settled by the fills
+TERMINAL_STATUSES = ('Cancelled', 'ApiCancelled', 'Inactive')
+
+
+def split(quantity, weights):
+    """ Whole-share split of quantity proportional to weights (largest remainder), keyed like weights. """
+    total = sum(weights.values())
+    if not total:
+        return {key: 0 for key in weights}
+    exact = {key: quantity * weight / total for key, weight in weights.items()}
+    parts = {key: int(value) for key, value in exact.items()}
+    for key in sorted(exact, key=lambda k: exact[k] - parts[k], reverse=True)[:quantity - sum(parts.values())]:
+        parts[key] += 1
+    return parts
+
+
+def contract_key(contract):
+    return contract.conId or (contract.symbol, contract.exchange, contract.currency)
+
+
+class OrderAggregator:
+    """
+    Nets the trades of all strategies per contract before they reach IB.
+
+    submit() collects intended trades for `window` seconds (the netting_window setting). Opposite
+    intents for the same contract are crossed internally at the reference price the strategies
+    gave, and only the net quantity is sent as one market order. Its fills are split back over
+    the strategies on the net side in proportion to what each still needs. Every allocation
+    updates the strategy's position in the portfolio table (strategy_id, symbol, quantity,
+    entry_price) from a background thread. submit() must be called on the event loop thread.
+    """
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self.ib = None
+        self.pending = {}       # contract key -> {'contract': ..., 'intents': {strategy: [quantity, price]}}
+        self.working = {}       # orderId -> {strategy: shares still to fill}
+        self.positions = {}     # (strategy, symbol) -> [quantity, entry price]
+        self._flush_handle = None
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="portfolio-writer")
+
+    def attach(self, ib):
+        """ The system went live: load each strategy's positions and route orders to ib. """
+        self.ib = ib
+        self.window = get_setting('netting_window', self.window, float)
+        ids = {row['id']: row['symbol'] for row in strategies_cache.rows()}
+        try:
+            rows = supabase.table("portfolio").select("strategy_id,symbol,quantity,entry_price").execute().data
+        except Exception as e:
+            add_log(f"Could not load strategy positions: {e}")
+            rows = []
+        with self._lock:
+            self.positions = {(ids[row['strategy_id']], row['symbol']): [float(row['quantity'] or 0), float(row['entry_price'] or 0)]
+                              for row in rows if row['strategy_id'] in ids}
+
+    def detach(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self.pending.clear()
+        # Orders in flight are no longer followed; attach() reloads the positions
+        self.working.clear()
+        self.ib = None
+
+    def position(self, strategy_symbol, symbol):
+        """ Shares of symbol attributed to the strategy. """
+        with self._lock:
+            return self.positions.get((strategy_symbol, symbol), [0.0, 0.0])[0]
+
+    def submit(self, strategy_symbol, contract, quantity, reference_price):
+        """ Queue a trade of quantity shares (negative to sell) for the next netting window. """
+        batch = self.pending.setdefault(contract_key(contract), {'contract': contract, 'intents': {}})
+        intent = batch['intents'].setdefault(strategy_symbol, [0, reference_price])
+        intent[0] += quantity
+        intent[1] = reference_price
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_event_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        """ Cross opposite intents and send one net order per contract. """
+        self._flush_handle = None
+        pending, self.pending = self.pending, {}
+        for batch in pending.values():
+            contract, intents = batch['contract'], batch['intents']
+            buys = {strategy: quantity for strategy, (quantity, _) in intents.items() if quantity > 0}
+            sells = {strategy: -quantity for strategy, (quantity, _) in intents.items() if quantity < 0}
+            prices = [price for _, price in intents.values() if price]
+            reference_price = sum(prices) / len(prices) if prices else 0.0
+
+            # What one side sells, the other side buys, without going to the market
+            crossed = min(sum(buys.values()), sum(sells.values()))
+            for side, sign in ((buys, 1), (sells, -1)):
+                for strategy, shares in split(crossed, side).items():
+                    if shares:
+                        self._allocate(strategy, contract.symbol, sign * shares, reference_price)
+                        side[strategy] -= shares
+
+            net = sum(buys.values()) - sum(sells.values())
+            if crossed:
+                add_log(f"Orders: crossed {crossed} {contract.symbol} between strategies")
+            if not net:
+                continue
+            if self.ib is None:
+                add_log(f"Orders: not live, dropped the net {net} {contract.symbol}")
+                continue
+            remaining = buys if net > 0 else sells
+            order = ib_insync.MarketOrder('BUY' if net > 0 else 'SELL', abs(net))
+            trade = self.ib.placeOrder(contract, order)
+            self.working[trade.order.orderId] = {strategy: shares for strategy, shares in remaining.items() if shares}
+            trade.fillEvent += self._on_fill
+            trade.statusEvent += self._on_status
+            add_log(f"Orders: {order.action} {abs(net)} {contract.symbol} for {', '.join(self.working[trade.order.orderId])}")
+
+    def _on_fill(self, trade, fill):
+        remaining = self.working.get(trade.order.orderId)
+        if not remaining:
+            return
+        sign = 1 if trade.order.action == 'BUY' else -1
+        for strategy, shares in split(int(fill.execution.shares), remaining).items():
+            if shares:
+                self._allocate(strategy, trade.contract.symbol, sign * shares, fill.execution.price)
+                remaining[strategy] -= shares
+        if not any(remaining.values()):
+            del self.working[trade.order.orderId]
+
+    def _on_status(self, trade):
+        """ A cancelled or rejected order fills no further: forget what the strategies still expected from it. """
+        if trade.orderStatus.status not in TERMINAL_STATUSES:
+            return
+        remaining = self.working.pop(trade.order.orderId, None)
+        if remaining and any(remaining.values()):
+            add_log(f"Orders: {trade.order.action} {trade.contract.symbol} {trade.orderStatus.status}, "
+                    f"{sum(remaining.values())} shares not filled")
+
+    def _allocate(self, strategy_symbol, symbol, quantity, price):
+        """ Book quantity shares at price to the strategy and persist its new position. """
+        with self._lock:
+            held, entry_price = self.positions.get((strategy_symbol, symbol), [0.0, 0.0])
+            new_quantity = held + quantity
+            if not new_quantity:
+                entry_price = 0.0
+            elif held * quantity >= 0:       # opened or added to the position
+                entry_price = (held * entry_price + quantity * price) / new_quantity
+            elif held * new_quantity < 0:    # went through zero to the other side
+                entry_price = price
+            self.positions[(strategy_symbol, symbol)] = [new_quantity, entry_price]
+        self._writer.submit(self._store, strategy_symbol, symbol, new_quantity, entry_price, price)
+
+    @staticmethod
+    def _store(strategy_symbol, symbol, quantity, entry_price, price):
+        try:
+            strategy_id = strategies_cache.get(strategy_symbol)['id']
+            row = {'strategy_id': strategy_id, 'symbol': symbol, 'quantity': quantity, 'entry_price': entry_price,
+                   'current_value': quantity * price, 'date': dt.date.today().isoformat()}
+            existing = supabase.table("portfolio").select("id").eq("strategy_id", strategy_id).eq("symbol", symbol).execute().data
+            if existing:
+                supabase.table("portfolio").update(row).eq("id", existing[0]['id']).execute()
+            else:
+                supabase.table("portfolio").insert(row).execute()
+        except Exception as e:
+            add_log(f"Could not store the {strategy_symbol} position in {symbol}: {e}")
+
+
+# Shared by all strategies; attached by the UI when the system goes live
+orders = OrderAggregator()
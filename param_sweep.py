@@ -0,0 +1,116 @@
+# param_sweep.py
+import argparse, itertools, os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+import metrics
+from backtest_engine import signals_and_returns
+
+# Worker state, set once per process by _attach
+_shm = None
+_close = None
+_month_close = None
+_month_pos = None
+
+
+def _monthly_layout(dates, close):
+    """ Month-end closes and, for every day, the position of the previous calendar month end (-1 if none). """
+    daily = pd.Series(close, index=pd.DatetimeIndex(dates))
+    month_close = daily.resample('M').last()
+    month_pos = month_close.index.get_indexer(daily.index - pd.offsets.MonthEnd(1))
+    return month_close.to_numpy(), month_pos
+
+
+def _attach(shm_name, length):
+    """ Pool initializer: map the shared close/date arrays instead of receiving a pickled copy. """
+    global _shm, _close, _month_close, _month_pos
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _close = np.ndarray((length,), dtype=np.float64, buffer=_shm.buf, offset=0)
+    dates = np.ndarray((length,), dtype='datetime64[ns]', buffer=_shm.buf, offset=length * 8)
+    _month_close, _month_pos = _monthly_layout(dates, _close)
+
+
+def evaluate(params, close=None, month_close=None, month_pos=None):
+    """ Backtest one (trendfilter, structural, signal2) combination and return its metrics. """
+    trendfilter, structural, signal2 = params
+    close = _close if close is None else close
+    month_close = _month_close if month_close is None else month_close
+    month_pos = _month_pos if month_pos is None else month_pos
+
+    # Previous month end's MAs for every day, NaN where there is none
+    ma_trend = np.append(pd.Series(month_close).rolling(trendfilter).mean().to_numpy(), np.nan)[month_pos]
+    ma_struct = np.append(pd.Series(month_close).rolling(structural).mean().to_numpy(), np.nan)[month_pos]
+
+    # Drop Data before indicator is warmed-up, as Strategy.backtest does
+    keep = ~np.isnan(ma_trend)
+    _, signal, strategy, benchmark = signals_and_returns(close[keep], ma_trend[keep], ma_struct[keep], signal2)
+
+    result = {'trendfilter': trendfilter, 'structural': structural, 'signal2': signal2, 'days': int(keep.sum())}
+    result.update(metrics.summary(strategy))
+    result['turnover'] = np.abs(np.diff(signal)).sum() / max(len(signal), 1) * metrics.TRADING_DAYS
+    return result
+
+
+def run_sweep(close, trendfilters=(6, 8, 10, 12), structurals=(30, 40, 50, 60), signal2_options=(False, True),
+              processes=None, rank_by='sharpe'):
+    """
+    Backtest every parameter combination of Strategy1 on a daily close Series across a process pool.
+
+    The close prices and dates are copied once into shared memory; each task only sends its
+    parameter tuple. Monthly MAs use calendar month-end closes, as in the Yahoo Finance backtest.
+    Returns a DataFrame with one row of metrics per combination, best rank_by first.
+    """
+    close = close.dropna().sort_index()
+    grid = list(itertools.product(trendfilters, structurals, signal2_options))
+    length = len(close)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(length * 16, 1))
+    try:
+        np.ndarray((length,), dtype=np.float64, buffer=shm.buf, offset=0)[:] = close.to_numpy(dtype=float)
+        np.ndarray((length,), dtype='datetime64[ns]', buffer=shm.buf, offset=length * 8)[:] = \
+            close.index.to_numpy(dtype='datetime64[ns]')
+
+        processes = processes or os.cpu_count() or 1
+        chunksize = max(1, len(grid) // (processes * 4))
+        with ProcessPoolExecutor(max_workers=processes, initializer=_attach, initargs=(shm.name, length)) as pool:
+            results = list(pool.map(evaluate, grid, chunksize=chunksize))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    table = pd.DataFrame(results).sort_values(rank_by, ascending=False, na_position='last')
+    table.insert(0, 'rank', range(1, len(table) + 1))
+    return table.reset_index(drop=True)
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(',')]
+
+
+if __name__ == "__main__":
+    from price_store import get_store, IB_TRADES
+
+    parser = argparse.ArgumentParser(description="Parameter sweep for Strategy1 on bars from the local price store.")
+    parser.add_argument('symbol')
+    parser.add_argument('--store', default=IB_TRADES, help="price store to read from (ib_trades, ib_adjusted, yf)")
+    parser.add_argument('--trendfilters', type=_int_list, default=[6, 8, 10, 12])
+    parser.add_argument('--structurals', type=_int_list, default=[30, 40, 50, 60])
+    parser.add_argument('--signal2', choices=['off', 'on', 'both'], default='both')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--rank-by', default='sharpe')
+    args = parser.parse_args()
+
+    bars = get_store(args.store).read(args.symbol)
+    if bars is None:
+        raise SystemExit(f"No bars stored for {args.symbol} in {args.store}.")
+    close = bars['Adj Close'] if 'Adj Close' in bars else bars['close']
+    signal2_options = {'off': (False,), 'on': (True,), 'both': (False, True)}[args.signal2]
+
+    table = run_sweep(close, args.trendfilters, args.structurals, signal2_options, args.processes, args.rank_by)
+    os.makedirs(os.path.join('reports', 'sweeps'), exist_ok=True)
+    output = os.path.join('reports', 'sweeps', f"{args.symbol}_sweep.csv")
+    table.to_csv(output, index=False)
+    print(table.to_string(index=False))
+    print(f"Saved to {output}")
@@ -0,0 +1,82 @@
+# portfolio_state.py
+import threading
+
+EQUITY_TAG = "EquityWithLoanValue"
+
+
+class PortfolioState:
+    """
+    Market value per symbol and EquityWithLoanValue of the connected IB account, kept current
+    by ib_insync's updatePortfolioEvent and accountValueEvent instead of being re-scanned on
+    every lookup. Lookups are dictionary reads under a lock, safe from any strategy thread.
+    """
+
+    def __init__(self):
+        self.ib = None
+        self._lock = threading.Lock()
+        self._positions = {}       # symbol -> {(account, conId): market value}
+        self._equity = {}          # account -> EquityWithLoanValue
+
+    def attach(self, ib):
+        """ Seed from what the client already holds and subscribe to its updates. """
+        self.detach()
+        self.ib = ib
+        with self._lock:
+            self._positions.clear()
+            self._equity.clear()
+        for item in ib.portfolio():
+            self._on_portfolio(item)
+        for value in ib.accountValues():
+            self._on_account_value(value)
+        ib.updatePortfolioEvent += self._on_portfolio
+        ib.accountValueEvent += self._on_account_value
+
+    def detach(self):
+        if self.ib is not None:
+            self.ib.updatePortfolioEvent -= self._on_portfolio
+            self.ib.accountValueEvent -= self._on_account_value
+        self.ib = None
+
+    def _on_portfolio(self, item):
+        key = (item.account, item.contract.conId)
+        symbol = item.contract.symbol
+        with self._lock:
+            positions = self._positions.setdefault(symbol, {})
+            if item.position:
+                positions[key] = item.marketValue
+            else:
+                positions.pop(key, None)
+                if not positions:
+                    del self._positions[symbol]
+
+    def _on_account_value(self, value):
+        if value.tag != EQUITY_TAG:
+            return
+        try:
+            with self._lock:
+                self._equity[value.account] = float(value.value)
+        except ValueError:
+            pass
+
+    def market_value(self, symbol):
+        with self._lock:
+            return sum(self._positions.get(symbol, {}).values())
+
+    def equity_with_loan(self):
+        with self._lock:
+            return sum(self._equity.values())
+
+    def weight(self, symbol):
+        """ Investment weight of symbol in percent of EquityWithLoanValue; 0 if not held, None before the equity is known. """
+        with self._lock:
+            market_value = sum(self._positions.get(symbol, {}).values())
+            equity = sum(self._equity.values())
+        if not market_value:
+            return 0
+        if not equity:
+            return None
+        return market_value / equity * 100
+
+
+# Shared by all strategies; attached by the UI when the system goes live
+portfolio = PortfolioState()
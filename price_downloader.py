@@ -0,0 +1,200 @@
+# price_downloader.py
+import asyncio, time
+from instrumentation import registry
+from collections import deque
+from dataclasses import dataclass, field
+
+# IB's documented limits for historical data requests
+MAX_SIMULTANEOUS_REQUESTS = 50      # open historical requests at any time
+SMALL_BAR_WINDOW = (60, 600)        # 60 requests per 10 minutes for bars <= 30 secs
+IDENTICAL_REQUEST_GAP = 15          # seconds between identical requests
+SAME_CONTRACT_WINDOW = (6, 2)       # 6 requests per contract/exchange/tick type in 2 secs
+PACING_PENALTY = 60                 # seconds to back off after a pacing violation (error 162)
+
+SMALL_BAR_SIZES = {'1 secs', '5 secs', '10 secs', '15 secs', '30 secs'}
+
+
+class PacingLimiter:
+    """Token bucket in front of IB's historical data endpoint.
+
+    The bucket sets the steady request rate. For bar sizes of 30 secs or less the
+    hard pacing windows (60 per 10 min, no identical request within 15 secs,
+    max 6 per contract in 2 secs) are enforced on top of it.
+    """
+
+    def __init__(self, rate=10.0, burst=10, small_bars=False):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.small_bars = small_bars
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.total_wait = 0.0
+        self.window = deque()
+        self.last_identical = {}
+        self.per_contract = {}
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def _delay(self, now, request_key, contract_key):
+        """ Seconds until a request with these keys may be sent (0 if it can go now). """
+        delay = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            delay = max(delay, (1 - self.tokens) / self.rate)
+
+        if self.small_bars:
+            max_requests, period = SMALL_BAR_WINDOW
+            while self.window and now - self.window[0] >= period:
+                self.window.popleft()
+            if len(self.window) >= max_requests:
+                delay = max(delay, self.window[0] + period - now)
+
+            last = self.last_identical.get(request_key)
+            if last is not None:
+                delay = max(delay, last + IDENTICAL_REQUEST_GAP - now)
+
+            max_per_contract, contract_period = SAME_CONTRACT_WINDOW
+            sent = self.per_contract.setdefault(contract_key, deque())
+            while sent and now - sent[0] >= contract_period:
+                sent.popleft()
+            if len(sent) >= max_per_contract:
+                delay = max(delay, sent[0] + contract_period - now)
+        return delay
+
+    async def acquire(self, request_key=None, contract_key=None):
+        """ Wait for a free slot and return the seconds spent waiting. """
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self._delay(now, request_key, contract_key)
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+
+            self.tokens -= 1
+            if self.small_bars:
+                self.window.append(now)
+                self.last_identical[request_key] = now
+                self.per_contract[contract_key].append(now)
+
+        waited = time.monotonic() - started
+        self.total_wait += waited
+        return waited
+
+    def penalize(self, seconds=PACING_PENALTY):
+        """ Hold back every request after IB reported a pacing violation. """
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+@dataclass
+class DownloadStats:
+    requested: int = 0
+    completed: int = 0
+    empty: int = 0
+    failed: int = 0
+    retries: int = 0
+    pacing_violations: int = 0
+    limiter_wait: float = 0.0
+    started: float = field(default_factory=time.monotonic)
+    finished: float = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def symbols_per_sec(self):
+        return self.completed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.completed}/{self.requested} symbols in {self.elapsed:.1f}s "
+                f"({self.symbols_per_sec:.2f} symbols/sec), {self.empty} empty, {self.failed} failed, "
+                f"{self.retries} retries, {self.pacing_violations} pacing violations, "
+                f"limiter wait {self.limiter_wait:.1f}s")
+
+
+async def download_history(ib, contracts, on_bars, max_in_flight=32, limiter=None, max_retries=2,
+                           endDateTime='', durationStr='1 Y', barSizeSetting='1 day',
+                           whatToShow='ADJUSTED_LAST', useRTH=True, formatDate=1, timeout=60, on_failed=None):
+    """
+    Download historical bars for all contracts with up to max_in_flight requests open at once.
+
+    on_bars(contract, bars) is called as soon as each request completes; bars may be empty
+    (no data, a timeout, or pacing retries used up). If the request itself raises,
+    on_failed(contract, error) is called instead, if given.
+    A request is a dict of reqHistoricalData keyword arguments, so callers can vary the
+    duration per contract by passing (contract, request) tuples instead of plain contracts.
+    Returns a DownloadStats instance.
+    """
+    max_in_flight = max(1, min(int(max_in_flight), MAX_SIMULTANEOUS_REQUESTS))
+    if limiter is None:
+        limiter = PacingLimiter(small_bars=barSizeSetting in SMALL_BAR_SIZES)
+
+    default_request = dict(endDateTime=endDateTime, durationStr=durationStr, barSizeSetting=barSizeSetting,
+                           whatToShow=whatToShow, useRTH=useRTH, formatDate=formatDate)
+    stats = DownloadStats()
+    queue = asyncio.Queue()
+    for item in contracts:
+        contract, request = item if isinstance(item, tuple) else (item, {})
+        queue.put_nowait((contract, {**default_request, **request}, 0))
+        stats.requested += 1
+
+    paced = set()
+
+    def on_error(reqId, errorCode, errorString, contract):
+        if errorCode == 162 and 'pacing violation' in errorString.lower():
+            stats.pacing_violations += 1
+            limiter.penalize()
+            if contract is not None:
+                paced.add(contract.conId)
+
+    async def worker():
+        while True:
+            try:
+                contract, request, attempt = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            request_key = (contract.conId, request['endDateTime'], request['durationStr'],
+                           request['barSizeSetting'], request['whatToShow'])
+            contract_key = (contract.conId, contract.exchange, request['whatToShow'])
+            stats.limiter_wait += await limiter.acquire(request_key, contract_key)
+
+            try:
+                with registry.span('ib_historical_request', source='downloader'):
+                    bars = await ib.reqHistoricalDataAsync(contract, timeout=timeout, **request)
+            except Exception as e:
+                print(f"Error: {e} occurred while downloading {contract.symbol}")
+                stats.failed += 1
+                if on_failed is not None:
+                    on_failed(contract, e)
+                continue
+
+            if not bars and contract.conId in paced and attempt < max_retries:
+                paced.discard(contract.conId)
+                stats.retries += 1
+                queue.put_nowait((contract, request, attempt + 1))
+                continue
+
+            if not bars:
+                stats.empty += 1
+            try:
+                on_bars(contract, bars)
+                stats.completed += 1
+            except Exception as e:
+                print(f"Error: {e} occurred while updating {contract.symbol}")
+                stats.failed += 1
+
+    ib.errorEvent += on_error
+    try:
+        await asyncio.gather(*(worker() for _ in range(max_in_flight)))
+    finally:
+        ib.errorEvent -= on_error
+        stats.finished = time.monotonic()
+    return stats
@@ -0,0 +1,55 @@
+# price_index.py
+import json, os, threading
+
+DEFAULT_INDEX_PATH = os.path.join('data', 'price_index.json')
+
+# Relative tolerance when comparing a stored adjusted close with a fresh one
+ADJUSTMENT_TOLERANCE = 1e-6
+
+
+class HighWaterMarks:
+    """
+    Local index of the last stored bar per symbol: {'SYMBOL': {'date': 'YYYY-MM-DD', 'close': 123.4}}.
+    The stored close is used to detect corporate actions: if the adjusted close of that
+    date has changed on the next request, the symbol's adjusted history needs a full refetch.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.marks = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.marks = {}
+
+    def get(self, symbol):
+        with self.lock:
+            return self.marks.get(symbol)
+
+    def update(self, symbol, date, close):
+        with self.lock:
+            self.marks[symbol] = {'date': str(date), 'close': float(close)}
+
+    def drop(self, symbol):
+        with self.lock:
+            self.marks.pop(symbol, None)
+
+    def is_adjusted(self, symbol, date, close):
+        """ True if the close stored for date differs from close, i.e. the history was re-adjusted. """
+        mark = self.get(symbol)
+        if mark is None or mark['date'] != str(date):
+            return False
+        return abs(float(close) - mark['close']) > ADJUSTMENT_TOLERANCE * max(abs(mark['close']), 1.0)
+
+    def save(self):
+        """ Write the index atomically so a crash never leaves a truncated file. """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with self.lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.marks, f)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self.marks)
@@ -0,0 +1,127 @@
+# price_store.py
+import os, re, threading
+from startup import lazy_import
+from price_index import ADJUSTMENT_TOLERANCE
+
+# Imported on first use, so strategies can import this module without slowing start-up
+pd = lazy_import('pandas')
+pa = lazy_import('pyarrow')
+
+DEFAULT_ROOT = os.path.join('data', 'prices')
+
+# Stores used across the project; each keeps one file per symbol
+IB_TRADES = 'ib_trades'       # Strategy.fetch_data (whatToShow='TRADES')
+IB_ADJUSTED = 'ib_adjusted'   # update_prices.py (whatToShow='ADJUSTED_LAST')
+YAHOO = 'yf'                  # Yahoo Finance backtests
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(name, root=DEFAULT_ROOT):
+    """ Returns the shared PriceStore for name, e.g. get_store(IB_TRADES). """
+    path = os.path.join(root, name)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = PriceStore(path)
+        return _stores[path]
+
+
+class PriceStore:
+    """
+    Daily bars on disk, one uncompressed Arrow IPC (Feather v2) file per symbol.
+
+    Files are memory-mapped on read, so numeric columns are handed to pandas/numpy without
+    copying and decades of history load in milliseconds. Bars are indexed by 'date'.
+    Writes go to a temporary file that is renamed into place, so readers never see a
+    partial file and frames read earlier stay valid.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, symbol):
+        return os.path.join(self.root, re.sub(r'[^A-Za-z0-9._=^-]', '_', symbol) + '.arrow')
+
+    def has(self, symbol):
+        return os.path.exists(self.path(symbol))
+
+    def symbols(self):
+        return sorted(f[:-len('.arrow')] for f in os.listdir(self.root) if f.endswith('.arrow'))
+
+    def read_table(self, symbol, columns=None):
+        """ Returns the memory-mapped pyarrow Table for symbol, or None if nothing is stored. """
+        try:
+            source = pa.memory_map(self.path(symbol), 'r')
+        except FileNotFoundError:
+            return None
+        table = pa.ipc.open_file(source).read_all()
+        return table.select(['date'] + [c for c in columns if c != 'date']) if columns else table
+
+    def read(self, symbol, start=None, end=None, columns=None):
+        """ Returns the stored bars as a DataFrame indexed by date, or None if nothing is stored. """
+        table = self.read_table(symbol, columns)
+        if table is None:
+            return None
+        df = table.to_pandas(split_blocks=True, self_destruct=False).set_index('date')
+        if start is not None or end is not None:
+            df = df.loc[start:end]
+        return df
+
+    def read_arrays(self, symbol, columns=('close',)):
+        """ Returns {'date': ..., column: ...} numpy arrays, zero-copy where the column has no nulls. """
+        table = self.read_table(symbol, list(columns))
+        if table is None:
+            return None
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+
+    def last_date(self, symbol):
+        table = self.read_table(symbol, ['date'])
+        if table is None or table.num_rows == 0:
+            return None
+        return pd.Timestamp(table.column('date')[-1].as_py())
+
+    def is_adjusted(self, symbol, df):
+        """ True if df's close for the last stored date differs from the stored one: a split (or a
+            dividend, for adjusted bars) changed the history, so df must replace it rather than be appended. """
+        table = self.read_table(symbol, ['close'])
+        if table is None or table.num_rows == 0:
+            return False
+        date, stored = pd.Timestamp(table.column('date')[-1].as_py()), table.column('close')[-1].as_py()
+        df = self._normalize(df)
+        if date not in df.index:
+            return False
+        return abs(float(df.at[date, 'close']) - stored) > ADJUSTMENT_TOLERANCE * max(abs(stored), 1.0)
+
+    def write(self, symbol, df):
+        """ Replaces everything stored for symbol with df (indexed by date). """
+        df = self._normalize(df)
+        table = pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+        path = self.path(symbol)
+        tmp_path = path + '.tmp'
+        with self.lock:
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+
+    def append(self, symbol, df):
+        """ Merges df into the stored bars; rows for dates already stored are replaced. """
+        df = self._normalize(df)
+        existing = self.read(symbol)
+        if existing is not None and len(existing):
+            df = pd.concat([existing, df])
+            df = df[~df.index.duplicated(keep='last')].sort_index()
+        self.write(symbol, df)
+        return len(df)
+
+    @staticmethod
+    def _normalize(df):
+        if 'date' in df.columns:
+            df = df.set_index('date')
+        df = df.copy()
+        df.index = pd.to_datetime(df.index)
+        df.index.name = 'date'
+        return df.sort_index()
@@ -0,0 +1,33 @@
+# report_worker.py
+import multiprocessing, threading
+from concurrent.futures import ProcessPoolExecutor
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _render(returns, title, output):
+    """ Runs in the worker process: the full quantstats tear sheet of a backtest's return series. """
+    import quantstats as qs
+    qs.reports.html(returns['Strategy_Returns'], returns['Benchmark_Returns'], title=title, output=output)
+    return output
+
+
+def render_later(returns, title, output, on_done):
+    """
+    Render the quantstats HTML report of returns (Strategy_Returns / Benchmark_Returns) to
+    output in a background process, one report at a time, so neither the UI thread nor the
+    GIL is held up by quantstats. on_done(output, error) is called from a pool thread.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned like the batch backtests: the worker doesn't inherit curses or the IB connection
+            _pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+    future = _pool.submit(_render, returns, title, output)
+
+    def done(future):
+        error = future.exception()
+        on_done(None if error else future.result(), error)
+    future.add_done_callback(done)
+    return future
@@ -1,16 +1,9 @@
 # setup.py
 
 import curses
-from supabase import create_client
-from dotenv import load_dotenv
+from supabase_client import supabase
 import os
 
-load_dotenv()
-
-# Initialize Supabase client
-url = os.getenv("SUPABASE_URL")
-key = os.getenv("SUPABASE_KEY")
-supabase = create_client(url, key)
 
 def setup_database(stdscr):
     try:
@@ -96,6 +89,22 @@ and simply copy & paste the following sql commands:\n\n""")
             currency VARCHAR(255),
             tradingclass VARCHAR(255)
         );
+
+        CREATE TABLE backtests (
+            strategy TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            signal2 BOOLEAN NOT NULL DEFAULT FALSE,
+            params_hash TEXT NOT NULL DEFAULT '',
+            status TEXT,
+            cagr NUMERIC,
+            sharpe NUMERIC,
+            max_drawdown NUMERIC,
+            exposure NUMERIC,
+            start_date DATE,
+            end_date DATE,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (strategy, symbol, signal2, params_hash)
+        );
         """)
 
         stdscr.addstr("""
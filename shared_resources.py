@@ -1,42 +1,65 @@
-from collections import deque
-import threading, time, supabase
-from ib_insync import *
+import atexit, os, threading
+from dotenv import load_dotenv
+from helper_functions import get_setting
+from log_pipeline import LogPipeline
+from instrumentation import registry
 
-util.startLoop() # comment out for live environment
-
-# Initialize the log buffer and lock
-log_buffer = deque(maxlen=5)
-log_lock = threading.Lock()
+# Log records of all strategies: in-memory tails for the UI, a rotating file on disk
+log_pipeline = LogPipeline()
+atexit.register(log_pipeline.close)
 start_event = threading.Event()
 
-def add_log(message):
-    with log_lock:
-        log_buffer.append(f"{time.ctime()}: {message}")
+def add_log(message, source=None, level='INFO'):
+    """ Never blocks; source defaults to the logging strategy task or thread. """
+    log_pipeline.emit(message, source, level)
 
 # Declare ib as a global variable
 ib = None
+loop_started = False
+
+def create_ib():
+    """ A new ib_insync.IB, or the offline fake_ib.FakeIB when IB_BACKEND=fake is set in .env. """
+    load_dotenv()
+    if os.getenv('IB_BACKEND', '').lower() == 'fake':
+        from fake_ib import FakeIB
+        return FakeIB(latency=float(os.getenv('FAKE_IB_LATENCY', 0.05)),
+                      pacing_error_rate=float(os.getenv('FAKE_IB_PACING_ERROR_RATE', 0.0)),
+                      fill_latency=float(os.getenv('FAKE_IB_FILL_LATENCY', 0.05)),
+                      bar_update_interval=float(os.getenv('FAKE_IB_BAR_UPDATE_INTERVAL', 0)) or None)
+    # ib_insync is only imported once we go live, it is not needed to show the menu
+    from ib_insync import IB
+    return IB()
 
 def connect_to_IB():
-    global ib  # Use the global keyword to modify the global instance
-    ib = IB()
-    try:
-        port = supabase.table("settings").select("setting_value").eq('setting_key', 'port').execute().data[0]['setting_value']
-    except:
-        port = 7497
+    global ib, loop_started  # Use the global keyword to modify the global instance
+    if not loop_started:
+        from ib_insync import util
+        util.startLoop() # comment out for live environment
+        loop_started = True
+    ib = create_ib()
+    port = get_setting('port', 7497, int)
 
     try:
-        ib.connect('127.0.0.1', port, clientId=0)
+        with registry.span('ib_connect', client_id=0):
+            ib.connect('127.0.0.1', port, clientId=0)
         add_log('IB Connection established with ClientId=0')
         return ib
     except:
         try:
-            ib.connect('127.0.0.1', port, clientId=1)
+            with registry.span('ib_connect', client_id=1):
+                ib.connect('127.0.0.1', port, clientId=1)
             add_log('IB Connection established with clientId=1')
             return ib
         except:
             add_log('Connection failed. Start TWS or TWS Gateway and try again!')
             return None
 
+def get_IB():
+    """ The connected IB client, connecting first if there is none. """
+    if ib is not None and ib.isConnected():
+        return ib
+    return connect_to_IB()
+
 def disconnect_from_IB(ib):
     if ib.isConnected():
         ib.disconnect()
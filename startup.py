@@ -0,0 +1,136 @@
+# startup.py
+import builtins, json, os, sys, threading, time
+from contextlib import contextmanager
+
+DEFAULT_HISTORY_PATH = os.path.join('data', 'startup_times.jsonl')
+
+
+class LazyModule:
+    """ Stand-in for a module that is only imported when one of its attributes is first used. """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            # The import system's per-module locks make concurrent first uses safe
+            __import__(self._name)
+            self._module = sys.modules[self._name]
+        return getattr(self._module, attr)
+
+
+def lazy_import(name):
+    """ pd = lazy_import('pandas') keeps pandas out of start-up until pd is first used. """
+    return LazyModule(name)
+
+
+class StartupProfile:
+    """
+    Measures time-to-menu: the duration of each start-up phase and, once track_imports() was
+    called, how long every module imported during start-up took (self time excludes the
+    modules it imported in turn). finish() logs the summary and appends the profile to
+    data/startup_times.jsonl, so the number can be followed across releases
+    (python startup.py prints the history).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []     # (name, seconds)
+        self.imports = {}    # module -> [inclusive seconds, self seconds]
+        self.total = None
+        self._original_import = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def track_imports(self):
+        if self._original_import is not None:
+            return
+        self._original_import = original = builtins.__import__
+        local, imports, lock = self._local, self.imports, self._lock
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            stack = local.__dict__.setdefault('stack', [])
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with lock:
+                    imports[name] = [elapsed, elapsed - children]
+
+        builtins.__import__ = timed_import
+
+    def stop_imports(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def summary(self):
+        """ One log line: time-to-menu and its phases. """
+        total = self.total if self.total is not None else time.perf_counter() - self.started
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases)
+        return f"Time to menu: {total:.2f}s ({phases})"
+
+    def slowest_imports(self, top=5):
+        return sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)[:top]
+
+    def finish(self, log=print, path=DEFAULT_HISTORY_PATH):
+        """ Stop the clock once the menu is shown, log the summary and append the profile to the history file. """
+        if self.total is not None:
+            return
+        self.total = time.perf_counter() - self.started
+        self.stop_imports()
+        log(self.summary())
+        if self.imports:
+            log("Slowest imports: " + ", ".join(f"{name} {times[0]:.2f}s" for name, times in self.slowest_imports()))
+        record = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'time_to_menu': round(self.total, 4),
+                  'phases': {name: round(seconds, 4) for name, seconds in self.phases},
+                  'imports': {name: [round(t, 4) for t in times] for name, times in self.imports.items()}}
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            log(f"Could not save start-up profile: {e}")
+
+
+def print_history(path=DEFAULT_HISTORY_PATH, runs=10, top=15):
+    """ Time-to-menu of the last runs, and the import breakdown of the latest profiled one. """
+    try:
+        with open(path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        print(f"No start-up profiles in {path} yet. Run: python main.py --profile-startup")
+        return
+    for record in records[-runs:]:
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in record['phases'].items())
+        print(f"{record['timestamp']}  {record['time_to_menu']:.2f}s  ({phases})")
+    profiled = [record for record in records if record['imports']]
+    if profiled:
+        imports = sorted(profiled[-1]['imports'].items(), key=lambda item: item[1][0], reverse=True)[:top]
+        print(f"\nSlowest imports of {profiled[-1]['timestamp']} (inclusive / self):")
+        for name, (inclusive, own) in imports:
+            print(f"  {name:<40} {inclusive:8.3f}s {own:8.3f}s")
+
+
+# One profile per process, started when main.py first imports this module
+profile = StartupProfile()
+
+
+if __name__ == "__main__":
+    print_history()
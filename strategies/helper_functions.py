@@ -1,13 +1,7 @@
-from supabase import create_client
-from dotenv import load_dotenv
-import os
+# Share the cache the menu invalidates when strategies are edited
+from helper_functions import strategies_cache, get_universe
+from portfolio_state import portfolio
 
-load_dotenv()
-
-# Initialize Supabase client
-url = os.getenv("SUPABASE_URL")
-key = os.getenv("SUPABASE_KEY")
-supabase = create_client(url, key)
 
 def get_allocation_allowance(strategy_symbol):
     '''Function returns allocation allowance stored in Supabase:
@@ -15,14 +9,15 @@ def get_allocation_allowance(strategy_symbol):
        - min_weight
        - max_weight
     '''
-    strat_data = supabase.table("strategies").select("*").execute().data
-    target_weight = [s['target_weight'] for s in strat_data if s['symbol'] == strategy_symbol][0]
-    min_weight = [s['min_weight'] for s in strat_data if s['symbol'] == strategy_symbol][0]
-    max_weight = [s['max_weight'] for s in strat_data if s['symbol'] == strategy_symbol][0]
-    return target_weight, min_weight, max_weight
+    strategy = strategies_cache.get(strategy_symbol)
+    return strategy['target_weight'], strategy['min_weight'], strategy['max_weight']
 
 def get_investment_weight(ib,symbol):
     """ Returns the investment weight in percent for the given symbol. """
+    # Constant-time read once the shared portfolio state follows this client's events
+    if ib is not None and portfolio.ib is ib:
+        return portfolio.weight(symbol)
+
     try:
         positions = ib.portfolio()
 
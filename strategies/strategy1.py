@@ -1,65 +1,117 @@
-import time
-import numpy as np
-import pandas as pd
-import datetime as dt
-import yfinance as yf
-import quantstats as qs
-from ib_insync import *
-from shared_resources import ib, add_log, start_event
+import asyncio, datetime as dt, os
+from startup import lazy_import
+from shared_resources import ib, add_log
+from price_store import get_store, IB_TRADES, YAHOO
+import backtest_engine
+from backtest_engine import map_previous_month_end, signals_and_returns, backtest_panel
+from live_bars import LiveDailyBars
+from portfolio_state import portfolio
+from order_aggregator import orders
+from contract_cache import contract_cache
+from instrumentation import registry
+from backtest_cache import backtest_cache, cache_key, module_version
+from report_worker import render_later
 try:
     from . import helper_functions as hp
 except:
     import helper_functions as hp
 
+# Heavy dependencies are imported on first use, loading the strategy at start-up doesn't need them
+pd = lazy_import('pandas')
+yf = lazy_import('yfinance')
+metrics = lazy_import('metrics')
+ib_insync = lazy_import('ib_insync')
+
 PARAMS = {
     1:{'name':'Monthly Trendfilter','value': 10,
        'description':"The 10M SMA Trendfilter is used as a sell signal if the price drops below."},
     2:{'name':"Structural Trendfilter",'value':50,
-       'description':"""This filter is used to re-enter the market if the price is below the monthly trendfilter and was below the structural trend, but price just crossed this structural trendline from below."""},}
-#     3:{'name':'Equity Weight','value':30,'description':'Weight for equity allocation'},
-#     4:{'name':'Fixed Income Weight','value':90,'description':'Weight for FI allocation'},
+       'description':"""This filter is used to re-enter the market if the price is below the monthly trendfilter and was below the structural trend, but price just crossed this structural trendline from below."""},
+    3:{'name':"Signal2 Re-entry",'value':0,
+       'description':"1 uses the structural trendfilter to re-enter the market (Signal2) in live trading, 0 only follows the monthly trendfilter."},}
+#     4:{'name':'Equity Weight','value':30,'description':'Weight for equity allocation'},
+#     5:{'name':'Fixed Income Weight','value':90,'description':'Weight for FI allocation'},
 # }
 
+def param_value(params, key):
+    """ Value of a PARAMS entry; params loaded from Supabase have string keys and may predate the entry. """
+    return int((params.get(key) or params.get(str(key)) or PARAMS[key])['value'])
+
 class Strategy:
     def __init__(self,strategy_symbol,ib_client, symbol, exchange, currency,signal2 = False):
         self.strategy_symbol = strategy_symbol
         self.ib_client = ib_client
         self.symbol = symbol
         self.currency = currency
-        self.contract = Stock(symbol, exchange, currency)
+        self.contract = contract_cache.contract(symbol, exchange, currency)  # conId from the local index if known
         self.signal2 = signal2
 
         # check if invested - write a function that calls target_weight and checks if invested
         self.current_weight = hp.get_investment_weight(ib=ib_client,symbol=self.symbol)
         self.target_weight, self.min_weight, self.max_weight = hp.get_allocation_allowance(self.strategy_symbol)
 
+        params = (hp.strategies_cache.get(strategy_symbol) or {}).get('params') or PARAMS
+        self.trendfilter, self.structural = param_value(params, 1), param_value(params, 2)
+        self.live = None
+        self.allocation_share = 1.0  # share of the strategy's target weight this symbol may use
+
     @staticmethod
     def check_investment_weight(any_day):
         pass
 
+    @registry.timed('strategy_fetch_data')
     def fetch_data(self):
-        """ Fetch historical data from Interactive Brokers """
-        historical_data = self.ib_client.reqHistoricalData(
-            self.contract,
-            endDateTime='',
-            durationStr='30 Y',
-            barSizeSetting='1 day',
-            whatToShow='TRADES',
-            useRTH=True,
-            formatDate=1
-        )
-        self.df = pd.DataFrame(historical_data)
-        self.df['date'] = pd.to_datetime(self.df['date'])
-        self.df.set_index('date', inplace=True)
+        """ Load daily bars from the local price store, topping it up from Interactive Brokers """
+        store = get_store(IB_TRADES)
+        today = pd.Timestamp(dt.date.today())
+        last_date = store.last_date(self.symbol)
+
+        if self.ib_client is not None and self.ib_client.isConnected() and \
+                (last_date is None or (today - last_date).days > 1):
+            # Only request what is missing; the full 30 years are fetched once per symbol
+            duration = '30 Y' if last_date is None else f"{(today - last_date).days + 1} D"
+            contract_cache.qualify(self.ib_client, [self.contract])
+            bars = self.request_bars(duration)
+            if bars is not None and last_date is not None and store.is_adjusted(self.symbol, bars):
+                # A split changed the close of the last stored day: appending would leave a jump in
+                # the history, so the whole history is fetched again and replaces the stored bars
+                bars = self.request_bars('30 Y')
+                if bars is not None:
+                    store.write(self.symbol, bars[bars['date'] < today])
+            elif bars is not None:
+                # Today's bar is still forming, keep it out of the store
+                store.append(self.symbol, bars[bars['date'] < today])
+
+        self.df = store.read(self.symbol)
+        if self.df is None:
+            raise ValueError(f"No price data stored for {self.symbol} and no IB connection to fetch it.")
 
         # Calculate 50 Day MA
         self.df["50D_MA"] = self.df['close'].rolling(window=50).mean()
 
-        # Identify and calculate 10M SMA for last trading day of each month
+        # Identify and calculate the monthly SMAs (trendfilter / structural, 10M / 50M by default) for last trading day of each month
         self.df['month'] = self.df.index.to_period('M')
         self.month_end_df = self.df[self.df.index.day == self.df.index.map(self.last_day_of_month)].copy()
-        self.month_end_df['10M_MA'] = self.month_end_df['close'].rolling(window=10).mean()
-        self.month_end_df['50M_MA'] = self.month_end_df['close'].rolling(window=50).mean()
+        self.month_end_df['10M_MA'] = self.month_end_df['close'].rolling(window=self.trendfilter).mean()
+        self.month_end_df['50M_MA'] = self.month_end_df['close'].rolling(window=self.structural).mean()
+
+    def request_bars(self, duration):
+        """ Daily TRADES bars of the last duration from IB as a DataFrame, or None if none came back """
+        with registry.span('ib_historical_request', source='fetch_data'):
+            historical_data = self.ib_client.reqHistoricalData(
+                self.contract,
+                endDateTime='',
+                durationStr=duration,
+                barSizeSetting='1 day',
+                whatToShow='TRADES',
+                useRTH=True,
+                formatDate=1
+            )
+        if not historical_data:
+            return None
+        bars = ib_insync.util.df(historical_data)
+        bars['date'] = pd.to_datetime(bars['date'])
+        return bars
 
     @staticmethod
     def last_day_of_month(any_day):
@@ -67,101 +119,187 @@ class Strategy:
         next_month = any_day.replace(day=28) + pd.Timedelta(days=4)
         return (next_month - pd.Timedelta(days=next_month.day)).day
 
+    async def start_live(self):
+        """ Warm the monthly MAs from the local price store and subscribe to live daily bars """
+        self.live = LiveDailyBars(self.symbol, self.contract, store_name=IB_TRADES,
+                                  windows=(self.trendfilter, self.structural))
+        self.live.hydrate()
+        return await self.live.subscribe(self.ib_client)
+
     def check_conditions_and_trade(self):
-            """ Check the trading conditions and execute trades """
-            today = dt.date.today().isoformat()
-            last_data = df[df.index < today].iloc[-1]
-            last_close = last_data['close']
+            """ Check the trading conditions on the last completed daily bar and execute trades: enter and
+                exit on the trendfilters, otherwise keep the position within its min / max weight """
+            last_close = self.live.last_close
+            latest_10m_ma = self.live.monthly.value(self.trendfilter)
+            latest_50m_ma = self.live.monthly.value(self.structural)
 
-            latest_10m_ma = self.month_end_df['10M_MA'].iloc[-1]
-            latest_50m_ma = self.month_end_df['50M_MA'].iloc[-1]
+            invested = orders.position(self.strategy_symbol, self.symbol) > 0
 
-            if self.invested and last_close < latest_10m_ma:
+            if invested and last_close < latest_10m_ma:
                 self.execute_trade('SELL')
-            elif not self.invested and last_close > latest_10m_ma:
+            elif not invested and last_close > latest_10m_ma:
                 self.execute_trade('BUY')
-            elif not self.invested and last_close > latest_50m_ma and last_close < latest_10m_ma:
+            elif self.signal2 and not invested and last_close > latest_50m_ma and last_close < latest_10m_ma:
                 self.execute_trade('BUY')
+            elif invested:
+                self.execute_trade('REBALANCE')
+
+    def execute_trade(self, action):
+        """ Hand the trade to the order aggregator, which nets it with the other strategies.
+            BUY sizes the position to the target weight (kept within min / max weight); REBALANCE
+            does the same, but only once the position's weight has left the min / max band.
+            The weights are the strategy's, split over its symbols by allocation_share. """
+        price = self.live.current_close
+        held = orders.position(self.strategy_symbol, self.symbol)
+        if action == 'SELL':
+            quantity = -int(held)
+        else:
+            equity = portfolio.equity_with_loan()
+            if not price or not equity:
+                return
+            if action == 'REBALANCE':
+                weight = held * price / equity * 100
+                if self.min_weight * self.allocation_share <= weight <= self.max_weight * self.allocation_share:
+                    return
+            target_weight = min(max(self.target_weight, self.min_weight), self.max_weight)
+            quantity = int(equity * target_weight / 100 * self.allocation_share / price - held)
+        add_log(f"{self.strategy_symbol}: {action} signal for {self.symbol} at {price:.2f}, {quantity} shares")
+        if quantity:
+            orders.submit(self.strategy_symbol, self.contract, quantity, price)
 
     
     def backtest(self,yf_symbol = None,start_dt=None,end_dt=None,period=None):
         '''Backtest for the strategy. yf_symbol: Provide a Yahoo Finance Symbol if backtest should'''
+        self.load_backtest_data(yf_symbol, start_dt=start_dt, end_dt=end_dt, period=period)
+        return self.run_loaded_backtest()
+
+    def load_backtest_data(self,yf_symbol = None,start_dt=None,end_dt=None,period=None):
+        ''' Sets bt_data (daily bars) and bt_monthly_data (month ends with the trendfilter / structural MAs
+            in the 10M_MA / 50M_MA columns) '''
+        with registry.span('backtest_phase', phase='data'):
+            # Check if month_end_df attribute exists, if not, fetch the data (Yahoo backtests don't need it)
+            if not yf_symbol and not hasattr(self, 'df'):
+                self.fetch_data()
+
+            if yf_symbol: # Condition for using Yahoo Finance's historical data
+                self.bt_symbol = yf_symbol
+                self.bt_data = self.load_yf_data(yf_symbol, start_dt=start_dt, end_dt=end_dt, period=period)
+                self.bt_data.rename(columns={'Adj Close': "close"}, inplace=True)
 
-        # Check if month_end_df attribute exists, if not, fetch the data
-        if not hasattr(self, 'df'):
-            self.fetch_data()
+                self.bt_monthly_data = self.bt_data.resample('M').last()
 
-        if yf_symbol: # Condition for using Yahoo Finance's historical data
-            self.bt_symbol = yf_symbol
-            if start_dt and end_dt:
-                self.bt_data = yf.download(yf_symbol, start=start_dt, end=end_dt)
-                self.bt_data.rename(columns={'Adj Close': "close"}, inplace=True)
-            else:
-                if period:
-                    self.bt_data = yf.download(yf_symbol, period=period) 
-                    self.bt_data.rename(columns={'Adj Close': "close"}, inplace=True)
-                else: 
-                    self.bt_data = yf.download(yf_symbol)
-                    self.bt_data.rename(columns={'Adj Close': "close"}, inplace=True)
-
-            self.bt_monthly_data = self.bt_data.resample('M').last()
-
-            #Calculate the 10M / 50M Moving Average
-            self.bt_monthly_data["10M_MA"] = self.bt_monthly_data['close'].rolling(window=10).mean()
-            self.bt_monthly_data["50M_MA"] = self.bt_monthly_data['close'].rolling(window=50).mean()
-
-        else:   # Condition for using IBKR's historical data
-            self.bt_symbol = self.symbol
-            self.bt_data = self.df.copy()
-            self.bt_monthly_data = self.month_end_df.copy()
-        
-        # Proceed to map monthly MAs to bt_data
-        
-        for i in range(len(self.bt_data)):
-            current_date = self.bt_data.index[i]
-            prev_month_end = current_date - pd.offsets.MonthEnd(1)
-            try:
-                self.bt_data.at[current_date, "10M_MA"] = self.bt_monthly_data.at[prev_month_end, "10M_MA"]
-                self.bt_data.at[current_date, "50M_MA"] = self.bt_monthly_data.at[prev_month_end, "50M_MA"]
-            except KeyError:
-                pass
+                #Calculate the trendfilter / structural Moving Average (10M / 50M by default)
+                self.bt_monthly_data["10M_MA"] = self.bt_monthly_data['close'].rolling(window=self.trendfilter).mean()
+                self.bt_monthly_data["50M_MA"] = self.bt_monthly_data['close'].rolling(window=self.structural).mean()
 
-        # Drop Data before indicator is warmed-up
-        self.bt_data = self.bt_data.dropna(subset=['10M_MA'])
+            else:   # Condition for using IBKR's historical data
+                self.bt_symbol = self.symbol
+                self.bt_data = self.df.copy()
+                self.bt_monthly_data = self.month_end_df.copy()
 
-        # Signal1 is set to 1 if the previous day's adjusted close price is greater than the previous day's 10M MA, indicating a bullish condition.
-        self.bt_data['Signal1'] = np.where(self.bt_data['close'].shift(1) > self.bt_data['10M_MA'].shift(1),1,0)
+    def run_loaded_backtest(self):
+        ''' Signals and daily returns on the data set by load_backtest_data '''
+        with registry.span('backtest_phase', phase='indicators'):
+            # Map the previous month end's MAs onto every daily row (NaN where that month end is missing)
+            monthly_mas = map_previous_month_end(self.bt_data.index, self.bt_monthly_data[["10M_MA", "50M_MA"]])
+            self.bt_data["10M_MA"] = monthly_mas["10M_MA"].to_numpy()
+            self.bt_data["50M_MA"] = monthly_mas["50M_MA"].to_numpy()
+
+            # Drop Data before indicator is warmed-up
+            self.bt_data = self.bt_data.dropna(subset=['10M_MA'])
 
+        # Signal1 is set to 1 if the previous day's adjusted close price is greater than the previous day's 10M MA, indicating a bullish condition.
+        # Signal2 (optional) is set to 1 if
         # 1. A crossover occurs where the previous day's adjusted close price is above the previous day's 50M MA and
         #    the adjusted close price from two days ago is below the 50M MA from two days ago. This indicates a bullish crossover.
         # 2. Signal1 is already set to 1, which implies that the market is bullish based on the 10M MA, so we carry over the bullish sentiment to Signal2
-        if self.signal2:
-            self.bt_data['Signal2'] = np.where( (self.bt_data['close'].shift(1) > self.bt_data['50M_MA'].shift(1)) & 
-                                                (self.bt_data['close'].shift(2) < self.bt_data['50M_MA'].shift(2)) &
-                                                (self.bt_data['Signal1'] ==0)                                       |
-                                                (self.bt_data['Signal1'] ==1),1, 0)
-            self.bt_data['Strategy_Returns'] = self.bt_data['Signal2'].shift(1)*self.bt_data["close"].pct_change().fillna(0)
-        else:
-            self.bt_data['Strategy_Returns'] = self.bt_data['Signal1'].shift(1)*self.bt_data["close"].pct_change().fillna(0)
-            
-        self.bt_data['Benchmark_Returns'] = self.bt_data["close"].pct_change().fillna(0)
+        with registry.span('backtest_phase', phase='signals'):
+            signal1, signal, strategy_returns, benchmark_returns = signals_and_returns(
+                self.bt_data['close'], self.bt_data['10M_MA'], self.bt_data['50M_MA'], signal2=self.signal2)
+
+            self.bt_data['Signal1'] = signal1
+            if self.signal2:
+                self.bt_data['Signal2'] = signal
+            self.bt_data['Strategy_Returns'] = strategy_returns
+            self.bt_data['Benchmark_Returns'] = benchmark_returns
         
         return self.bt_data
 
+    @staticmethod
+    def load_yf_data(yf_symbol, start_dt=None, end_dt=None, period=None):
+        """ Yahoo Finance bars through the local price store; downloaded at most once per day """
+        store = get_store(YAHOO)
+        last_date = store.last_date(yf_symbol)
+        if last_date is None or (pd.Timestamp(dt.date.today()) - last_date).days > 1:
+            try:
+                # Adjusted closes change with every dividend, so the whole history is replaced
+                store.write(yf_symbol, yf.download(yf_symbol))
+            except Exception:
+                if last_date is None:
+                    raise
+        data = store.read(yf_symbol)
+
+        if start_dt and end_dt:
+            return data[(data.index >= pd.Timestamp(start_dt)) & (data.index < pd.Timestamp(end_dt))]
+        if period and period != 'max':
+            if period == 'ytd':
+                start = pd.Timestamp(data.index[-1].year, 1, 1)
+            else:
+                number, unit = int(period.rstrip('dmoy')), period.lstrip('0123456789')
+                offset = {'d': pd.DateOffset(days=number), 'mo': pd.DateOffset(months=number), 'y': pd.DateOffset(years=number)}[unit]
+                start = data.index[-1] - offset
+            return data[data.index > start]
+        return data
+
     def create_bt_summary(self,yf_symbol = None,start_dt=None,end_dt=None,period=None):
-        if not hasattr(self, 'bt_data'):
-            self.bt_data = self.backtest(yf_symbol = None,start_dt=None,end_dt=None,period=None)
+        ''' Backtest and return the headline stats (metrics.headline) of the strategy and the benchmark.
+            Results are cached by the input bars, parameters and the source of the strategy, the
+            backtest engine and the metrics. The quantstats
+            report is only rendered on request, see render_report. '''
+        self.load_backtest_data(yf_symbol, start_dt=start_dt, end_dt=end_dt, period=period)
+        self.bt_report = f'reports/backtests/{self.bt_symbol}_{self.strategy_symbol}_BT.html'
+        self.bt_key = cache_key(self.bt_data, module=module_version(__file__),
+                                engine=module_version(backtest_engine.__file__),
+                                metrics=module_version(metrics.__file__), trendfilter=self.trendfilter,
+                                structural=self.structural, signal2=self.signal2, source=yf_symbol or 'ib',
+                                start_dt=start_dt, end_dt=end_dt, period=period)
 
-            qs.reports.html(self.bt_data['Strategy_Returns'],
-                        self.bt_data['Benchmark_Returns'],
-                        title=f"{yf_symbol}_{self.strategy_symbol} vs. {yf_symbol}",
-                        output=f'reports/backtests/{yf_symbol}_{self.strategy_symbol}_BT.html')
+        returns = backtest_cache.get(self.bt_key, report=False)
+        self.bt_cached = returns is not None
+        if not self.bt_cached:
+            self.run_loaded_backtest()
+            returns = self.bt_data[['Strategy_Returns', 'Benchmark_Returns']].copy()
+            # The position held on each day, for the turnover
+            returns['Position'] = self.bt_data['Signal2' if self.signal2 else 'Signal1'].shift(1).fillna(0)
+            backtest_cache.put(self.bt_key, returns, symbol=self.bt_symbol, strategy=self.strategy_symbol)
+        self.bt_returns = returns
 
-        else:
-            qs.reports.html(self.bt_data['Strategy_Returns'],
-                            self.bt_data['Benchmark_Returns'],
-                            title=f"{self.bt_symbol}_{self.strategy_symbol} vs. {self.bt_symbol}",
-                            output=f'reports/backtests/{self.bt_symbol}_{self.strategy_symbol}_BT.html')
+        with registry.span('backtest_phase', phase='metrics'):
+            self.bt_stats = {'strategy': metrics.headline(returns['Strategy_Returns'], returns['Position']),
+                             'benchmark': metrics.headline(returns['Benchmark_Returns'])}
+        return self.bt_stats
+
+    def render_report(self, on_done=None):
+        ''' Write the quantstats report of the last create_bt_summary to reports/backtests: copied from
+            the cache if it was rendered before (returns True), otherwise rendered by the background
+            report worker, which calls on_done(path, error) when the file is there. '''
+        key, output = self.bt_key, self.bt_report
+        if backtest_cache.has_report(key):
+            backtest_cache.copy_report(key, output)
+            return True
+
+        def done(rendered, error):
+            if error is None:
+                backtest_cache.add_report(key, rendered)
+                backtest_cache.copy_report(key, output)
+            if on_done is not None:
+                on_done(output, error)
+
+        os.makedirs(backtest_cache.root, exist_ok=True)
+        render_later(self.bt_returns[['Strategy_Returns', 'Benchmark_Returns']],
+                     f"{self.bt_symbol}_{self.strategy_symbol} vs. {self.bt_symbol}",
+                     os.path.abspath(backtest_cache.report_path(key) + '.tmp'), done)
+        return False
 
 
 
@@ -310,12 +448,56 @@ class Strategy:
 #             self.execute_position_adjustments()
 #             time.sleep(10)  # Wait for 10 seconds before checking again
 
-def run():
-    start_event.wait()
-    add_log("Strategy1 Thread Started")
+def run_backtest(bars, params=PARAMS, signal2=False):
+    """ Backtest a bar DataFrame without IB or Supabase (used by the universe batch runner).
+        Monthly MAs use calendar month-end closes; params may come from Supabase with string keys. """
+    trendfilter, structural = param_value(params, 1), param_value(params, 2)
+    close = bars['Adj Close'] if 'Adj Close' in bars else bars['close']
+    strategy_returns, benchmark_returns = backtest_panel(close.to_frame(), trendfilter, structural, signal2)
+    return pd.DataFrame({'Strategy_Returns': strategy_returns.iloc[:, 0],
+                         'Benchmark_Returns': benchmark_returns.iloc[:, 0]}).dropna()
+
+async def run(ctx):
+    """ Runs on the strategy runtime's event loop, woken by every completed daily bar of its universe. """
     while True:
-        time.sleep(2)
-        add_log("S1: Placing a Buy Order in AAPL")
-        #strategy.running = False  # Set running to False to stop the loop
+        await ctx.wait_live()
+        add_log("Strategy1 Started")
+        params = (hp.strategies_cache.get(ctx.name) or {}).get('params') or PARAMS
+        signal2 = bool(param_value(params, 3))
+        # get_universe is a blocking Supabase call, keep it off the event loop
+        rows = await asyncio.get_running_loop().run_in_executor(None, hp.get_universe, ctx.name)
+        universe = []
+        for row in rows:
+            try:
+                universe.append(Strategy(ctx.name, ctx.ib, row['symbol'], row.get('exchange') or 'SMART',
+                                         row.get('currency') or 'USD', signal2))
+            except Exception as e:
+                add_log(f"S1: {row.get('symbol')} skipped: {e}")
+        # Only symbols missing from the contract cache (or expired) are qualified with IB
+        await contract_cache.qualify_async(ctx.ib, [strategy.contract for strategy in universe])
+        strategies = {}
+        for strategy in universe:
+            try:
+                bars = await strategy.start_live()
+                ctx.subscribe_bars(bars)
+                strategies[id(bars)] = strategy
+            except Exception as e:
+                add_log(f"S1: live bars for {strategy.symbol} unavailable: {e}")
+        for strategy in strategies.values():
+            strategy.allocation_share = 1 / len(strategies)
+        add_log(f"S1: following {len(strategies)} symbols")
+
+        async for event in ctx:
+            if event[0] == 'offline':
+                for strategy in strategies.values():
+                    try:
+                        strategy.live.cancel(strategy.ib_client)  # ctx.ib is already cleared
+                    except Exception as e:
+                        add_log(f"S1: could not cancel live bars for {strategy.symbol}: {e}")
+                break
+            if event[0] == 'bar':
+                strategy = strategies.get(id(event[1]))
+                if strategy is not None and strategy.live.on_bar_update(event[2]):
+                    strategy.check_conditions_and_trade()
 
 
@@ -1,5 +1,4 @@
-import time
-from shared_resources import add_log, start_event
+from shared_resources import add_log
 
 PARAMS = {
     1:{'name':'BOGUS1','value': 111,
@@ -11,12 +10,13 @@ PARAMS = {
     4:{'name':'Fixed Income Weight','value':90,'description':'Weight for FI allocation'},
 }
 
-def run():
-    add_log("Strategy2 Thread Started")
-    start_event.wait()
+async def run(ctx):
+    add_log("Strategy2 Started")
+    await ctx.wait_live()
     add_log("Executing Strategy 2")
-    while True:
-        time.sleep(1)
-        add_log("S2: DOING NOTHING")
+    ctx.every(1)
+    async for event in ctx:
+        if event[0] == 'timer' and ctx.is_live:
+            add_log("S2: DOING NOTHING")
 
     
\ No newline at end of file
@@ -0,0 +1,213 @@
+# strategy_runtime.py
+import asyncio, threading, time, traceback
+from shared_resources import add_log, log_pipeline
+from instrumentation import registry
+
+# The runtime the UI pumps, for idle()
+active = None
+
+
+class StrategyContext:
+    """
+    What a strategy coroutine receives from the runtime: a queue of the events it is woken by.
+
+    Events are tuples whose first item is the kind:
+        ('timer', timestamp)               from every(seconds)
+        ('bar', bars, has_new_bar)         for bar lists registered with subscribe_bars
+        ('fill', trade, fill)              for every execution of the connected IB client
+        ('live', ib) / ('offline', None)   when the system goes live or disconnects
+    """
+
+    def __init__(self, runtime, name):
+        self.runtime = runtime
+        self.name = name
+        self.queue = asyncio.Queue()
+        self.timers = []
+        self._handling = None     # (kind, perf_counter) of the event the strategy is working on
+
+    @property
+    def ib(self):
+        return self.runtime.ib
+
+    @property
+    def is_live(self):
+        return self.runtime.live.is_set()
+
+    async def wait_live(self):
+        """ Returns once the system is live (connected to IB). """
+        await self.runtime.live.wait()
+
+    def every(self, seconds):
+        """ Wake the strategy with a timer event every seconds. """
+        async def tick():
+            while True:
+                await asyncio.sleep(seconds)
+                self.queue.put_nowait(('timer', time.time()))
+        self.timers.append(self.runtime.loop.create_task(tick()))
+
+    def subscribe_bars(self, bars):
+        """ Wake the strategy whenever a keepUpToDate bar list updates. """
+        self.runtime.bar_subscribers.setdefault(id(bars), []).append(self)
+
+    async def next_event(self):
+        # Asking for the next event ends the handling of the previous one: that is one loop iteration
+        if self._handling is not None:
+            kind, started = self._handling
+            registry.observe('strategy_iteration', time.perf_counter() - started, strategy=self.name, event=kind)
+            self._handling = None
+        event = await self.queue.get()
+        self._handling = (event[0], time.perf_counter())
+        return event
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.next_event()
+
+
+class StrategyRuntime:
+    """
+    Runs strategy modules as coroutines on one asyncio event loop, the loop ib_insync uses.
+
+    A strategy module defines `async def run(ctx)` and awaits events from its StrategyContext
+    instead of sleeping in a thread. The UI drives the loop with pump(), which replaces its
+    sleep between redraws; prompts and sub menus wait for keys through idle(). Inside a
+    coroutine, IB calls must use the *Async variants (reqHistoricalDataAsync, ...), as the
+    blocking ones would try to re-enter the running loop.
+    Modules that still define a plain run() are started in a daemon thread, as before.
+    """
+
+    def __init__(self):
+        # One loop in the UI thread; ib_insync picks it up through asyncio.get_event_loop()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.live = asyncio.Event()
+        self.ib = None
+        self.contexts = {}
+        self.tasks = {}
+        self.threads = {}
+        self.bar_subscribers = {}
+        self.wake = asyncio.Event()
+        self._wake_pending = False
+        self._input_fd = None
+        global active
+        active = self
+
+    def start(self, name, module):
+        if asyncio.iscoroutinefunction(module.run):
+            ctx = self.contexts[name] = StrategyContext(self, name)
+            task = self.tasks[name] = self.loop.create_task(module.run(ctx), name=name)
+            task.add_done_callback(self._task_done)
+        else:
+            thread = self.threads[name] = threading.Thread(target=module.run, name=name, daemon=True)
+            thread.start()
+
+    def _task_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            add_log(f"Strategy {task.get_name()} stopped: {error}", source=task.get_name(), level='ERROR')
+            # The full traceback goes to the log file; printing it would draw over the curses screen
+            add_log("".join(traceback.format_exception(type(error), error, error.__traceback__)),
+                    source=task.get_name(), level='ERROR')
+
+    def publish(self, event, names=None):
+        """ Put event in the queue of every strategy, or only those in names. """
+        for name, ctx in self.contexts.items():
+            if names is None or name in names:
+                ctx.queue.put_nowait(event)
+
+    def _on_fill(self, trade, fill):
+        self.publish(('fill', trade, fill))
+
+    def _on_bar_update(self, bars, has_new_bar):
+        for ctx in self.bar_subscribers.get(id(bars), ()):
+            ctx.queue.put_nowait(('bar', bars, has_new_bar))
+
+    def attach(self, ib):
+        """ The system went live: route the client's events to the strategies and wake them. """
+        self.ib = ib
+        ib.execDetailsEvent += self._on_fill
+        ib.barUpdateEvent += self._on_bar_update
+        self.live.set()
+        self.publish(('live', ib))
+
+    def detach(self):
+        if self.ib is not None:
+            self.ib.execDetailsEvent -= self._on_fill
+            self.ib.barUpdateEvent -= self._on_bar_update
+        self.ib = None
+        self.live.clear()
+        self.bar_subscribers.clear()
+        self.publish(('offline', None))
+
+    def wake_up(self):
+        """ End the current pump() early, e.g. because a log record arrived. Safe from any thread, also after stop(). """
+        if not self._wake_pending and not self.loop.is_closed():
+            self._wake_pending = True
+            try:
+                self.loop.call_soon_threadsafe(self.wake.set)
+            except RuntimeError:
+                pass  # closed in the meantime
+
+    def watch_input(self, fd):
+        """ Also end pump() when the file descriptor (the terminal) has input to read. Loops without
+            add_reader (the Windows proactor loop) keep ending pump() on its timeout only. """
+        try:
+            self.loop.add_reader(fd, lambda: None)
+            self.loop.remove_reader(fd)
+        except NotImplementedError:
+            return
+        self._input_fd = fd
+
+    def _input_ready(self):
+        self.loop.remove_reader(self._input_fd)
+        self.wake.set()
+
+    def pump(self, timeout=0.1, min_wait=0.0):
+        """
+        Run the event loop (IB messages, timers and strategy coroutines) for at least min_wait and
+        at most timeout seconds, returning early once wake_up() was called or input is ready.
+        """
+        async def wait():
+            if self._input_fd is not None:
+                self.loop.add_reader(self._input_fd, self._input_ready)
+            try:
+                if min_wait:
+                    await asyncio.sleep(min_wait)
+                await asyncio.wait_for(self.wake.wait(), max(timeout - min_wait, 0))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if self._input_fd is not None:
+                    self.loop.remove_reader(self._input_fd)
+                self.wake.clear()
+                self._wake_pending = False
+        self.loop.run_until_complete(wait())
+
+    def stop(self):
+        """ Cancel the strategy coroutines and their timers and close the loop. """
+        pending = list(self.tasks.values()) + [timer for ctx in self.contexts.values() for timer in ctx.timers]
+        for task in pending:
+            task.cancel()
+        if pending:
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self.loop.close()
+        if log_pipeline.listener == self.wake_up:
+            log_pipeline.listener = None
+        global active
+        if active is self:
+            active = None
+
+
+def idle(seconds, wake_on_input=True):
+    """
+    Wait up to seconds while the active runtime's loop keeps handling IB messages, timers and
+    strategies; for the UI whenever it waits outside the main menu. With wake_on_input it may
+    return as soon as the terminal has input. Without a runtime (e.g. during setup) it sleeps.
+    """
+    runtime = active
+    if runtime is None or runtime.loop.is_closed() or runtime.loop.is_running():
+        time.sleep(min(seconds, 0.05) if wake_on_input else seconds)
+    else:
+        runtime.pump(timeout=seconds, min_wait=0.0 if wake_on_input else seconds)
@@ -0,0 +1,73 @@
+# supabase_client.py
+import os, threading
+from dotenv import load_dotenv
+from instrumentation import registry
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the process-wide Supabase client, creating it on first use.
+
+    All modules share this one client, and with it one postgrest HTTP session whose
+    keep-alive connection pool is reused by every query. The session is thread-safe,
+    so strategy threads and background writers can query through it concurrently.
+    With SUPABASE_BACKEND=sqlite in .env it is a local SQLite fake instead.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                load_dotenv()
+                if os.getenv("SUPABASE_BACKEND", "").lower() == "sqlite":
+                    # Offline stand-in for load tests, see fake_supabase.py
+                    from fake_supabase import FakeSupabase
+                    path = os.getenv("SUPABASE_SQLITE_PATH", os.path.join("data", "fake_supabase.db"))
+                    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                    _client = FakeSupabase(path)
+                else:
+                    from supabase import create_client
+                    _client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+    return _client
+
+
+OPERATIONS = {'select', 'insert', 'update', 'upsert', 'delete'}
+
+
+class TimedQuery:
+    """ Passes a query builder chain through and times its execute() per table and operation. """
+
+    def __init__(self, query, table, operation=None):
+        self._query = query
+        self._table = table
+        self._operation = operation
+
+    def __getattr__(self, name):
+        attribute = getattr(self._query, name)
+        if not callable(attribute):
+            return attribute
+        operation = name if self._operation is None and name in OPERATIONS else self._operation
+
+        def call(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            return TimedQuery(result, self._table, operation) if hasattr(result, 'execute') else result
+        return call
+
+    def execute(self, *args, **kwargs):
+        with registry.span('supabase_query', table=self._table, operation=self._operation or 'select'):
+            return self._query.execute(*args, **kwargs)
+
+
+class LazyClient:
+    """ Module-level stand-in for the client, so importing a module doesn't open connections. """
+
+    def table(self, name):
+        return TimedQuery(get_client().table(name), name)
+
+    def __getattr__(self, name):
+        return getattr(get_client(), name)
+
+
+supabase = LazyClient()
@@ -0,0 +1,150 @@
+# supabase_writer.py
+import queue, random, threading, time
+from startup import lazy_import
+
+np = lazy_import('numpy')
+
+_FLUSH = object()
+_STOP = object()
+
+
+def frame_to_records(df):
+    """ Rows of a date-indexed DataFrame as JSON-ready dicts: ISO dates and None for NaN. """
+    # Reset index to turn the 'date' back into a column and format it as a string
+    df = df.reset_index()
+    df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+
+    # Replace NaN values with None before converting to a dictionary
+    df = df.replace({np.nan: None})
+    return df.to_dict(orient='records')
+
+
+class _Batch:
+    """ Rows handed over in one add() call; on_written fires once all of them are stored. """
+    __slots__ = ('remaining', 'failed', 'on_written')
+
+    def __init__(self, size, on_written):
+        self.remaining = size
+        self.failed = False
+        self.on_written = on_written
+
+
+class UpsertBuffer:
+    """
+    Write-behind buffer for Supabase upserts.
+
+    add() only enqueues rows and returns immediately. A background thread collects rows
+    across symbols and upserts them in chunks of at most chunk_size rows, either when a
+    full chunk is pending or flush_interval seconds after the oldest pending row arrived.
+    Failed chunks are retried with exponential backoff. Errors are reported through
+    log(message), e.g. add_log in the UI where printing would corrupt the screen.
+    """
+
+    def __init__(self, client, table, chunk_size=500, flush_interval=2.0, max_retries=5, backoff=0.5, on_conflict=None,
+                 log=print):
+        self.client = client
+        self.table = table
+        self.chunk_size = max(1, int(chunk_size))
+        self.flush_interval = float(flush_interval)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.on_conflict = on_conflict
+        self.log = log
+
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.chunks_written = 0
+        self.retries = 0
+        self.write_time = 0.0
+        self.started = time.monotonic()
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"{table}-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, rows, on_written=None):
+        """ Queue rows for upserting; on_written() is called from the writer thread once they are stored. """
+        if rows:
+            self._queue.put((rows, _Batch(len(rows), on_written)))
+
+    def flush(self, timeout=None):
+        """ Block until every row queued so far has been written (or given up on). """
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        self.flush(timeout)
+        self._queue.put((_STOP, None))
+        self._thread.join(timeout)
+
+    @property
+    def rows_per_sec(self):
+        elapsed = time.monotonic() - self.started
+        return self.rows_written / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.rows_written} rows in {self.chunks_written} chunks ({self.rows_per_sec:.0f} rows/sec, "
+                f"{self.write_time:.1f}s in upserts), {self.retries} retries, {self.rows_failed} rows failed")
+
+    def _run(self):
+        pending = []  # (row, batch) pairs in arrival order
+        oldest = None
+        while True:
+            timeout = None if oldest is None else max(0.0, oldest + self.flush_interval - time.monotonic())
+            try:
+                item, arg = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                return
+            if item is _FLUSH:
+                self._write(pending, flush_all=True)
+                oldest = None
+                arg.set()
+                continue
+
+            if item is not None:
+                pending.extend((row, arg) for row in item)
+                oldest = oldest or time.monotonic()
+
+            if item is None or len(pending) >= self.chunk_size:
+                self._write(pending, flush_all=item is None)
+                oldest = time.monotonic() if pending else None
+
+    def _write(self, pending, flush_all):
+        """ Upsert full chunks from pending (and the remainder if flush_all), removing them in place. """
+        while pending and (flush_all or len(pending) >= self.chunk_size):
+            chunk = pending[:self.chunk_size]
+            del pending[:self.chunk_size]
+            ok = self._upsert([row for row, _ in chunk])
+
+            for _, batch in chunk:
+                batch.remaining -= 1
+                batch.failed = batch.failed or not ok
+                if batch.remaining == 0 and not batch.failed and batch.on_written:
+                    try:
+                        batch.on_written()
+                    except Exception as e:
+                        self.log(f"Error: {e} occurred in {self.table} write callback")
+
+    def _upsert(self, rows):
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                query = self.client.table(self.table)
+                query = query.upsert(rows, on_conflict=self.on_conflict) if self.on_conflict else query.upsert(rows)
+                query.execute()
+                self.write_time += time.monotonic() - started
+                self.rows_written += len(rows)
+                self.chunks_written += 1
+                return True
+            except Exception as e:
+                self.write_time += time.monotonic() - started
+                if attempt == self.max_retries:
+                    self.log(f"Error: {e} occurred while upserting {len(rows)} rows into {self.table}")
+                    self.rows_failed += len(rows)
+                    return False
+                self.retries += 1
+                time.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
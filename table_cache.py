@@ -0,0 +1,65 @@
+# table_cache.py
+import copy, threading, time
+from instrumentation import registry
+
+
+class TableCache:
+    """
+    Read-through cache of a small Supabase table, indexed by one column.
+
+    The whole table is loaded on the first lookup and reused until ttl seconds have passed
+    or invalidate() is called; every function that writes the table must invalidate it.
+    Callers get copies of the rows, so changing them never changes the cache. Hits and
+    misses are also counted in the instrumentation registry (Reports > Performance).
+    """
+
+    def __init__(self, client, table, key, ttl=60.0):
+        self.client = client
+        self.table = table
+        self.key = key
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._rows = None
+        self._index = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fresh(self):
+        return self._rows is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def _snapshot(self):
+        """ (rows, index) of one load, taken under the lock so invalidate() can't interleave. """
+        with self._lock:
+            if self._fresh():
+                self.hits += 1
+                result = 'hit'
+            else:
+                self.misses += 1
+                result = 'miss'
+                rows = self.client.table(self.table).select("*").execute().data
+                self._rows = rows
+                self._index = {row[self.key]: row for row in rows}
+                self._loaded_at = time.monotonic()
+            rows, index = self._rows, self._index
+        registry.inc('table_cache', table=self.table, result=result)
+        return rows, index
+
+    def rows(self):
+        """ All rows of the table, in the order Supabase returned them. """
+        return copy.deepcopy(self._snapshot()[0])
+
+    def get(self, key, default=None):
+        """ The row whose key column equals key, or default. """
+        row = self._snapshot()[1].get(key)
+        return default if row is None else copy.deepcopy(row)
+
+    def invalidate(self):
+        with self._lock:
+            self._rows = None
+            self._index = {}
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'table': self.table, 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,124 @@
+# tests/test_backtest_engine.py
+""" The vectorized Strategy1 backtest must reproduce the per-row loop it replaced. """
+import importlib.util, os, sys, warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from backtest_engine import backtest_panel
+
+
+@pytest.fixture(scope='module')
+def strategy1():
+    """ strategies/strategy1.py, loaded the way the UI loads strategy modules. """
+    spec = importlib.util.spec_from_file_location('strategy1', os.path.join(ROOT, 'strategies', 'strategy1.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_backtest(bt_data, bt_monthly_data, signal2=False):
+    """ Strategy.backtest before the vectorization, after the data was loaded. """
+    bt_data = bt_data.copy()
+    for i in range(len(bt_data)):
+        current_date = bt_data.index[i]
+        prev_month_end = current_date - pd.offsets.MonthEnd(1)
+        try:
+            bt_data.at[current_date, "10M_MA"] = bt_monthly_data.at[prev_month_end, "10M_MA"]
+            bt_data.at[current_date, "50M_MA"] = bt_monthly_data.at[prev_month_end, "50M_MA"]
+        except KeyError:
+            pass
+
+    bt_data = bt_data.dropna(subset=['10M_MA'])
+    bt_data['Signal1'] = np.where(bt_data['close'].shift(1) > bt_data['10M_MA'].shift(1), 1, 0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)  # pct_change pads missing closes
+        returns = bt_data["close"].pct_change().fillna(0)
+    if signal2:
+        bt_data['Signal2'] = np.where((bt_data['close'].shift(1) > bt_data['50M_MA'].shift(1)) &
+                                      (bt_data['close'].shift(2) < bt_data['50M_MA'].shift(2)) &
+                                      (bt_data['Signal1'] == 0) |
+                                      (bt_data['Signal1'] == 1), 1, 0)
+        bt_data['Strategy_Returns'] = bt_data['Signal2'].shift(1) * returns
+    else:
+        bt_data['Strategy_Returns'] = bt_data['Signal1'].shift(1) * returns
+    bt_data['Benchmark_Returns'] = returns
+    return bt_data
+
+
+def vectorized_backtest(strategy1, bt_data, bt_monthly_data, signal2=False):
+    """ Strategy.run_loaded_backtest itself on the same inputs, as load_backtest_data leaves them. """
+    strategy = strategy1.Strategy.__new__(strategy1.Strategy)  # without the IB and Supabase lookups of __init__
+    strategy.signal2 = signal2
+    strategy.bt_data, strategy.bt_monthly_data = bt_data.copy(), bt_monthly_data.copy()
+    return strategy.run_loaded_backtest()
+
+
+def closes(days=3000, seed=0, start='2005-01-03'):
+    """ A geometric random walk with enough swings to cross both moving averages. """
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(start, periods=days, name='date')
+    return pd.Series(100 * np.exp(np.cumsum(rng.normal(0.0002, 0.015, days))), index=index, name='close')
+
+
+def monthly(bars):
+    """ Calendar month-end closes with the 10M / 50M MAs, as in the Yahoo Finance backtest. """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)  # 'M' is spelled 'ME' in newer pandas
+        month_end = bars[['close']].resample('M').last()
+    month_end['10M_MA'] = month_end['close'].rolling(window=10).mean()
+    month_end['50M_MA'] = month_end['close'].rolling(window=50).mean()
+    return month_end
+
+
+def assert_same(legacy, vectorized, signal2):
+    columns = ['Signal1', 'Strategy_Returns', 'Benchmark_Returns'] + (['Signal2'] if signal2 else [])
+    assert list(vectorized.index) == list(legacy.index)
+    for column in columns:
+        np.testing.assert_allclose(vectorized[column].to_numpy(dtype=float), legacy[column].to_numpy(dtype=float),
+                                   rtol=1e-12, atol=1e-15, equal_nan=True, err_msg=column)
+
+
+@pytest.mark.parametrize('signal2', [False, True])
+def test_calendar_month_ends(strategy1, signal2):
+    bars = closes().to_frame()
+    month_end = monthly(bars)
+    assert_same(legacy_backtest(bars, month_end, signal2), vectorized_backtest(strategy1, bars, month_end, signal2), signal2)
+
+
+@pytest.mark.parametrize('signal2', [False, True])
+def test_missing_and_nan_month_ends(strategy1, signal2):
+    """ IB month ends are the last trading day, so some previous-month-end keys are missing (NaN rows dropped). """
+    bars = closes(seed=1).to_frame()
+    bars.iloc[1500, 0] = np.nan                      # a missing close is padded by pct_change
+    month_end = monthly(bars)
+    month_end = month_end.drop(month_end.index[[70, 71, 90]])
+    month_end.iloc[100, month_end.columns.get_loc('50M_MA')] = np.nan
+    # The last trading day of each month, like Strategy.fetch_data's month_end_df
+    last_trading_days = bars.groupby(bars.index.to_period('M')).tail(1)
+    ib_month_end = last_trading_days.assign(**{'10M_MA': last_trading_days['close'].rolling(10).mean(),
+                                               '50M_MA': last_trading_days['close'].rolling(50).mean()})
+
+    for month_end_data in (month_end, ib_month_end):
+        legacy = legacy_backtest(bars, month_end_data, signal2)
+        assert len(legacy)  # the rules ran on something
+        assert_same(legacy, vectorized_backtest(strategy1, bars, month_end_data, signal2), signal2)
+
+
+@pytest.mark.parametrize('signal2', [False, True])
+def test_panel_matches_single_symbol(signal2):
+    """ backtest_panel on a 2D close panel, symbols starting at different dates, against the loop per column. """
+    panel = pd.concat({'A': closes(seed=2), 'B': closes(seed=3).iloc[400:], 'C': closes(seed=4).iloc[:2500]}, axis=1)
+    strategy_returns, benchmark_returns = backtest_panel(panel, signal2=signal2)
+
+    for symbol in panel.columns:
+        bars = panel[[symbol]].dropna().rename(columns={symbol: 'close'})
+        legacy = legacy_backtest(bars, monthly(bars), signal2)
+        np.testing.assert_allclose(strategy_returns[symbol].dropna().to_numpy(),
+                                   legacy['Strategy_Returns'].dropna().to_numpy(), rtol=1e-12, atol=1e-15)
+        np.testing.assert_allclose(benchmark_returns[symbol].dropna().to_numpy(),
+                                   legacy['Benchmark_Returns'].to_numpy(), rtol=1e-12, atol=1e-15)
+        assert strategy_returns[symbol].first_valid_index() == legacy['Strategy_Returns'].first_valid_index()
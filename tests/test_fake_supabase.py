@@ -0,0 +1,27 @@
+# tests/test_fake_supabase.py
+""" The SQLite fake must behave like Supabase for the writes the load tests make. """
+import os, sqlite3, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_supabase import FakeSupabase
+
+
+def test_upsert_inserts_an_id_that_is_not_stored_yet():
+    client = FakeSupabase()
+    client.table('t').upsert({'id': 5, 'a': 1}).execute()
+    client.table('t').upsert({'id': 5, 'b': 2}).execute()
+    assert client.table('t').select('*').execute().data == [{'id': 5, 'a': 1, 'b': 2}]
+
+
+def test_failed_write_rolls_back_and_later_writes_succeed():
+    client = FakeSupabase()
+    client.table('t').insert({'id': 1, 'a': 1}).execute()
+    with pytest.raises(sqlite3.IntegrityError):
+        client.table('t').insert([{'id': 2, 'a': 2}, {'id': 1, 'a': 3}]).execute()
+
+    # The failed batch left nothing behind and no transaction open
+    client.table('t').insert({'id': 3, 'a': 4}).execute()
+    client.table('t').update({'a': 5}).eq('id', 1).execute()
+    assert client.table('t').select('*').order('id').execute().data == [{'id': 1, 'a': 5}, {'id': 3, 'a': 4}]
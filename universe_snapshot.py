@@ -0,0 +1,132 @@
+# universe_snapshot.py
+import datetime as dt, json, os
+from startup import lazy_import
+
+pd = lazy_import('pandas')
+pa = lazy_import('pyarrow')
+feather = lazy_import('pyarrow.feather')
+
+DEFAULT_SNAPSHOT_DIR = os.path.join('data', 'universe')
+
+# Bump when the selection or columns below change, so existing snapshots are rebuilt
+SNAPSHOT_VERSION = 1
+COLUMNS = ['name', 'sector', 'industry', 'market_cap', 'isin', 'cusip']
+
+# Columns of the universe table kept in line with the snapshot; strategies, exchange and
+# currency are maintained by hand and only set when a symbol is first inserted
+SYNCED_COLUMNS = ('name', 'sector')
+PAGE_SIZE = 1000
+
+
+def select_us_equities():
+    """ Domestic US stocks listed on US exchanges with an ISIN and CUSIP, indexed by symbol (slow: loads financedatabase). """
+    import financedatabase as fd
+    # Initialize the Equities database
+    equities = fd.Equities()
+    # Find all US stocks
+    us_stocks = equities.select(country="United States", exclude_exchanges=False)
+    # Filter to domestic stocks & US Exchange Listings only with active ISINs
+    us_stocks = us_stocks[(us_stocks['currency']=='USD') & (~us_stocks.index.str.contains('\\.'))].dropna(subset=['isin']).dropna(subset=['cusip'])
+    us_stocks = us_stocks[~us_stocks.index.duplicated()]
+    return us_stocks[[column for column in COLUMNS if column in us_stocks.columns]].rename_axis('symbol').sort_index()
+
+
+class UniverseSnapshot:
+    """
+    The filtered financedatabase selection, kept as one Feather file (data/universe/<name>.arrow)
+    with a JSON sidecar recording its version, build date and whether it was synced into the
+    universe table. load() reuses the file until SNAPSHOT_VERSION changes or it is older than
+    ttl_days; only then is financedatabase loaded and filtered again.
+    """
+
+    def __init__(self, name='us_equities', select=select_us_equities, ttl_days=7, root=DEFAULT_SNAPSHOT_DIR):
+        self.name = name
+        self.select = select
+        self.ttl_days = ttl_days
+        self.path = os.path.join(root, f"{name}.arrow")
+        self.meta_path = os.path.join(root, f"{name}.json")
+
+    def _meta(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_meta(self, meta):
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def is_fresh(self, meta=None):
+        meta = meta if meta is not None else self._meta()
+        if meta.get('version') != SNAPSHOT_VERSION or not os.path.exists(self.path):
+            return False
+        return (dt.date.today() - dt.date.fromisoformat(meta['built'])).days < self.ttl_days
+
+    def load(self, refresh=False):
+        """ The snapshot DataFrame indexed by symbol, rebuilt first if it is missing, outdated or refresh is set. """
+        if not refresh and self.is_fresh():
+            return feather.read_table(self.path, memory_map=True).to_pandas().set_index('symbol')
+        return self.rebuild()
+
+    def rebuild(self):
+        df = self.select()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        feather.write_feather(pa.Table.from_pandas(df.reset_index(), preserve_index=False), tmp_path, compression='zstd')
+        os.replace(tmp_path, self.path)
+        self._save_meta({'version': SNAPSHOT_VERSION, 'built': dt.date.today().isoformat(), 'symbols': len(df), 'synced': False})
+        return df
+
+    def sync(self, client, df=None, force=False, asset_type='Equity'):
+        """
+        Bring the universe table in line with the snapshot with as few writes as possible:
+        new symbols are inserted, rows whose synced columns differ are upserted by id and
+        everything else is left alone. Rows missing from the snapshot are kept, they may be
+        tagged for strategies. Skipped if this snapshot was synced already. Returns (inserted, updated).
+        """
+        meta = self._meta()
+        if meta.get('synced') and not force:
+            return 0, 0
+        df = df if df is not None else self.load()
+
+        existing = {}
+        start = 0
+        while True:
+            page = client.table("universe").select("id,symbol,asset_type," + ",".join(SYNCED_COLUMNS)) \
+                         .order("id").range(start, start + PAGE_SIZE - 1).execute().data
+            for row in page:
+                existing.setdefault(row['symbol'], row)
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+
+        inserts, updates = [], []
+        for symbol, values in zip(df.index, df[list(SYNCED_COLUMNS)].itertuples(index=False)):
+            values = {column: (None if pd.isna(value) else value) for column, value in zip(SYNCED_COLUMNS, values)}
+            row = existing.get(symbol)
+            if row is None:
+                inserts.append({'asset_type': asset_type, 'symbol': symbol, 'exchange': 'SMART', 'currency': 'USD', **values})
+            elif any(row.get(column) != value for column, value in values.items()):
+                # asset_type is NOT NULL, so it has to be part of the upserted rows
+                updates.append({'id': row['id'], 'symbol': symbol, 'asset_type': row.get('asset_type') or asset_type, **values})
+
+        for i in range(0, len(inserts), PAGE_SIZE):
+            client.table("universe").insert(inserts[i:i + PAGE_SIZE]).execute()
+        for i in range(0, len(updates), PAGE_SIZE):
+            client.table("universe").upsert(updates[i:i + PAGE_SIZE]).execute()
+
+        meta['synced'] = True
+        self._save_meta(meta)
+        return len(inserts), len(updates)
+
+
+if __name__ == "__main__":
+    import sys
+    from supabase_client import supabase
+    snapshot = UniverseSnapshot()
+    df = snapshot.load(refresh='--refresh' in sys.argv)
+    inserted, updated = snapshot.sync(supabase, df, force='--force' in sys.argv)
+    print(f"{len(df)} symbols in the snapshot, {inserted} inserted and {updated} updated in the universe table.")
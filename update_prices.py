@@ -1,10 +1,7 @@
-from supabase import create_client
-from dotenv import load_dotenv
-import os, time
+from supabase_client import supabase
+import os, sys, time
 import matplotlib as plt
 from ib_insync import *
-import financedatabase as fd
-import talib
 
 import pandas as pd
 import numpy as np
@@ -12,18 +9,23 @@ import datetime as dt
 
 import logging
 
+from helper_functions import get_setting
+from shared_resources import create_ib
+from price_downloader import PacingLimiter, download_history
+from indicators import IndicatorEngine
+from price_index import HighWaterMarks
+from price_store import get_store, IB_ADJUSTED
+from contract_cache import contract_cache
+from job_runner import JobRun, DONE, SKIPPED, FAILED
+from universe_snapshot import UniverseSnapshot
+from supabase_writer import UpsertBuffer, frame_to_records
+
 # Set the logging level to WARNING to suppress INFO logs
 logging.getLogger("httpx").setLevel(logging.WARNING)
 
 
-load_dotenv()
-
-# Initialize Supabase client
-url = os.getenv("SUPABASE_URL")
-key = os.getenv("SUPABASE_KEY")
-supabase = create_client(url, key)
-
-ib = IB()
+# IB_BACKEND=fake and SUPABASE_BACKEND=sqlite in .env run this offline against fake_ib / fake_supabase
+ib = create_ib()
 ib.connect('127.0.0.1', 7497, clientId=0)
 
 
@@ -40,58 +42,184 @@ def get__last_trading_day():
     return trading_day
 
 
-# Initialize the Equities database
-equities = fd.Equities()
-# Find all US stocks
-us_stocks = equities.select(country="United States", exclude_exchanges=False)
-# Filter to domestic stocks & US Exchange Listings only with active ISINs
-us_stocks = us_stocks[(us_stocks['currency']=='USD') & (~us_stocks.index.str.contains('\\.'))].dropna(subset=['isin']).dropna(subset=['cusip'])
+# "--synthetic N" updates N made-up tickers instead of the US universe, for load tests against the fakes
+if '--synthetic' in sys.argv:
+    symbols = pd.Index([f"SYN{n:05d}" for n in range(int(sys.argv[sys.argv.index('--synthetic') + 1]))])
+else:
+    # The filtered financedatabase selection is reused until it expires; "--refresh-universe" rebuilds it
+    universe = UniverseSnapshot(ttl_days=get_setting('universe_ttl_days', 7, int))
+    us_stocks = universe.load(refresh='--refresh-universe' in sys.argv)
+    inserted, updated = universe.sync(supabase, us_stocks)
+    if inserted or updated:
+        print(f"Universe table: {inserted} symbols added, {updated} updated.")
 
-symbols = us_stocks.index.unique()
+    symbols = us_stocks.index
 contracts = [Stock(con,'SMART','USD') for con in symbols]
-contracts = ib.qualifyContracts(*contracts)
+# conIds come from the local contract index; only new or expired symbols are qualified with IB
+contracts = contract_cache.qualify(ib, contracts)
 
-print(dt.datetime.now())
-for con in contracts[:]:
-    
+# Incremental mode is the default; run "python update_prices.py --full" to refetch the whole year
+FULL_REFRESH = '--full' in sys.argv
+# An interrupted run resumes from its checkpoint; "--restart" ignores it
+RESTART = '--restart' in sys.argv
+INDICATOR_LOOKBACK = 52*5  # Stored bars needed to rebuild lost indicator state (52W High window)
+
+hwm = HighWaterMarks()
+indicators = IndicatorEngine()
+store = get_store(IB_ADJUSTED)
+last_trading_day = get__last_trading_day().date()
+incremental = set()  # conIds requested with only the missing range
+refetch = []         # contracts whose adjusted history changed since the last run
+
+def save_state():
+    hwm.save()
+    indicators.save()
+
+# Per-symbol progress is checkpointed, so a crashed run for the same trading day continues where it stopped
+job = JobRun('update_prices', f"{last_trading_day}{' full' if FULL_REFRESH else ''}", restart=RESTART,
+             checkpoint_interval=get_setting('update_checkpoint_interval', 30.0, float), on_checkpoint=save_state)
+contracts = job.pending(contracts, key=lambda con: con.symbol)
+if job.resumed:
+    print(f"Resuming {job.target}: {job.resumed} symbols already done, {len(contracts)} to go.")
+
+def build_request(con):
+    """ Returns the contract with the duration to request, or None if the symbol is up to date. """
+    mark = None if FULL_REFRESH else hwm.get(con.symbol)
+    if mark is None:
+        return con
+    missing_days = (last_trading_day - dt.date.fromisoformat(mark['date'])).days
+    if missing_days <= 0:
+        return None
+    if missing_days > 300:
+        return con
+    # Reaching back one extra day returns the last stored bar, so we can check it was not re-adjusted
+    incremental.add(con.conId)
+    return (con, {'durationStr': f"{missing_days + 1} D"})
+
+def bars_to_frame(bars, symbol):
+    df = util.df(bars)
+    df = df.drop(columns=['average','barCount'])
+    df['symbol'] = symbol
+
+    # Ensure the 'date' column is in datetime format and set as the DataFrame index
+    df['date'] = pd.to_datetime(df['date'])
+    df.set_index('date', inplace=True)
+    return df
+
+def load_stored_history(symbol, until_date):
+    """ Returns the last INDICATOR_LOOKBACK stored bars up to and including until_date. """
+    history = store.read(symbol, end=until_date)
+    if history is not None and len(history) and history.index[-1] == pd.Timestamp(until_date):
+        history = history[['open','high','low','close','volume']].iloc[-INDICATOR_LOOKBACK:].copy()
+        history['symbol'] = symbol
+        return history
+
+    # Fall back to the prices table if the local store is behind the high-water mark
+    rows = supabase.table('prices').select('date,open,high,low,close,volume').eq('symbol', symbol) \
+                   .lte('date', until_date).order('date', desc=True).limit(INDICATOR_LOOKBACK).execute().data
+    if not rows:
+        return None
+    history = pd.DataFrame(rows[::-1])
+    history['symbol'] = symbol
+    history['date'] = pd.to_datetime(history['date'])
+    return history.set_index('date')
+
+def update_symbol(con, bars):
+    if not bars:
+        # No answer (a timeout, or pacing retries used up): a resumed run tries the symbol again
+        job.mark(con.symbol, FAILED)
+    elif bars[-1].date == last_trading_day: # checks if stock is actively traded
+        df = bars_to_frame(bars, con.symbol)
+
+        if con.conId in incremental:
+            mark = hwm.get(con.symbol)
+            mark_date = pd.Timestamp(mark['date'])
+            if mark_date not in df.index or hwm.is_adjusted(con.symbol, mark['date'], df.at[mark_date, 'close']):
+                refetch.append(con)  # a dividend or split changed the adjusted history
+                return
+            new_bars = df[df.index > mark_date]
+            store.append(con.symbol, new_bars[['open','high','low','close','volume']])
+
+            state = indicators.get(con.symbol)
+            if state is None or state.last_date != mark['date']:
+                # No saved indicator state for this mark: replay the stored tail to rebuild it
+                history = load_stored_history(con.symbol, mark['date'])
+                if history is None:
+                    refetch.append(con)
+                    return
+                indicators.reset(con.symbol)
+                indicators.update(con.symbol, history)
+            # Only the new bars go through the indicators and get upserted
+            df = indicators.update(con.symbol, new_bars)
+        else:
+            # Re-adjusted or new symbols replace the local history, which no longer matches
+            store.write(con.symbol, df[['open','high','low','close','volume']])
+            indicators.reset(con.symbol)
+            df = indicators.update(con.symbol, df)
+
+        # Hand the rows to the write-behind buffer; the high-water mark moves and the symbol is done once they are stored
+        last_date, last_close = df.index[-1].date(), df['close'].iloc[-1]
+        def written():
+            hwm.update(con.symbol, last_date, last_close)
+            job.mark(con.symbol, DONE)
+        writer.add(frame_to_records(df), on_written=written)
+        print(f"Updated: {con.symbol}. {job.progress()} symbols done.")
+    else:
+        job.mark(con.symbol, SKIPPED)  # no bar for the last trading day, not actively traded
+
+def on_bars(con, bars):
     try:
-        # Initialize your data collection
-        all_insert_data = []
-        bars = ib.reqHistoricalData(contract=con,endDateTime='',durationStr='1 Y',barSizeSetting='1 day',whatToShow='ADJUSTED_LAST',useRTH=True)
-        
-        if [bar.date for bar in bars[-1:]] == [get__last_trading_day().date()]: # checks if stock is actively traded
-            # Convert to DataFrame
-            df = util.df(bars)
-            df = df.drop(columns=['average','barCount'])
-            df['symbol'] = con.symbol
-
-            # Ensure the 'date' column is in datetime format and set as the DataFrame index
-            df['date'] = pd.to_datetime(df['date'])
-            df.set_index('date', inplace=True)
-
-            # Calculate Moving Averages and other technical indicators
-            df['50D_MA'] = talib.SMA(df['close'], timeperiod=50)
-            df['200D_MA'] = talib.SMA(df['close'], timeperiod=200)
-            #df['10M_MA'] = talib.SMA(df['close'], timeperiod=10*30)  # Approximating 30 days per month
-            df['ATR'] = talib.ATR(df['high'], df['low'], df['close'], timeperiod=14)  # Using 14-day ATR by convention
-            df['52W_High'] = df['close'].rolling(window=52*5, min_periods=1).max()  # Assuming 5 trading days in a week
-            
-            # Reset index to turn the 'date' back into a column and format it as a string
-            df.reset_index(inplace=True)
-            df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+        update_symbol(con, bars)
+    except Exception:
+        job.mark(con.symbol, FAILED)
+        raise
+    finally:
+        job.maybe_checkpoint()
+
+def on_failed(con, error):
+    job.mark(con.symbol, FAILED)
+    job.maybe_checkpoint()
+
+requests = []
+for con in contracts:
+    request = build_request(con)
+    if request is None:
+        job.mark(con.symbol, SKIPPED)  # already up to date
+    else:
+        requests.append(request)
+print(f"{len(incremental)} incremental, {len(requests) - len(incremental)} full, {len(contracts) - len(requests)} up to date.")
+
+print(dt.datetime.now())
 
-            # Replace NaN values with None before converting to a dictionary
-            df = df.replace({np.nan: None})
+# Rows from many symbols are collected and upserted in chunks on a background thread
+writer = UpsertBuffer(supabase, 'prices', chunk_size=get_setting('upsert_chunk_size', 500, int),
+                      flush_interval=get_setting('upsert_flush_interval', 2.0, float))
 
-            # Prepare data for insert
-            all_insert_data = df.to_dict(orient='records')
+# Download concurrently; the limiter keeps us within IB's historical data pacing rules
+limiter = PacingLimiter(rate=get_setting('hist_requests_per_sec', 10, float), burst=get_setting('hist_burst', 10, int))
+max_in_flight = get_setting('hist_max_in_flight', 32, int)
+stats = ib.run(download_history(ib, requests, on_bars, max_in_flight=max_in_flight, limiter=limiter,
+                                durationStr='1 Y', barSizeSetting='1 day', whatToShow='ADJUSTED_LAST', useRTH=True,
+                                on_failed=on_failed))
+job.retried(stats.retries)
+print(stats.summary())
 
-            # Perform bulk insert
-            response = supabase.table('prices').upsert(all_insert_data).execute()
-            print(f"Updated: {con.symbol}. {symbols.tolist().index(con.symbol) + 1} out of {len(symbols)} symbols updated.")
+# Symbols with corporate actions get their full adjusted year again
+if refetch:
+    for con in refetch:
+        incremental.discard(con.conId)
+        hwm.drop(con.symbol)
+    stats = ib.run(download_history(ib, refetch, on_bars, max_in_flight=max_in_flight, limiter=limiter,
+                                    durationStr='1 Y', barSizeSetting='1 day', whatToShow='ADJUSTED_LAST', useRTH=True,
+                                    on_failed=on_failed))
+    job.retried(stats.retries)
+    print(f"Refetched after corporate actions: {stats.summary()}")
 
-    except Exception as e:
-        print(f"Error: {e} occurred while updating {con.symbol}")
+writer.close()
+job.retried(writer.retries)
+print(f"Supabase writes: {writer.summary()}")
+# Saves the high-water marks and indicator state with the final checkpoint
+print(job.finish())
 
 print(dt.datetime.now())
            